@@ -0,0 +1,118 @@
+# Optimal Control 1: Cellular Level
+# Symbolic adjoint systems and control laws, check against scripts 01-11
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+import numpy as np
+
+from optcon import models
+
+np.random.seed(0)
+
+
+# Hand-derived adjoint systems and control laws (scripts 01, 05 and 08)
+
+def glambdaDeno(x, u, l, p):
+    x1, x2, x3 = x
+    uD = u[0]
+    l1, l2, l3 = l
+    a1, a2, a3, b1, b2, b3 = p['a1'], p['a2'], p['a3'], p['b1'], p['b2'], p['b3']
+    c1, c2, c3, c4, g1, g2, K = p['c1'], p['c2'], p['c3'], p['c4'], p['g1'], p['g2'], p['K']
+
+    dl1 = -( l1*( a1*x2**g1*(1.0 - uD) - b1 + c1*x3 ) + l2*( a2*g2*x1**(g2-1.0)*x2 ) + l3*( c3*g2*x1**(g2-1.0)*x3 ))
+    dl2 = -( l1*( a1*g1*x1*x2**(g1-1.0)*(1-uD) ) + l2*( a2*x1**g2 - b2 + c2*x3 ) + l3*( c4*g1*x2**(g1-1.0)*x3))
+    dl3 = -( 2.0*x3 + l1*( c1*x1 ) + l2*( c2*x2 ) + l3*( a3 - 2.0*a3*x3/K - b3 + c3*x1**g2 + c4*x2**g1 ))
+
+    return np.array([dl1, dl2, dl3])
+
+
+def controlDeno(x, l, p):
+    x1, x2, x3 = x
+    l1 = l[0]
+    uNew1 = np.minimum(p['uDMax']*np.ones_like(l1), (0.5*p['a1']*l1*x1*(x2**p['g1']))/p['wD'])
+    return np.array([np.maximum(np.zeros_like(uNew1), uNew1)])
+
+
+def glambdaRadio(x, u, l, p):
+    x1, x2, x3 = x
+    uR = u[0]
+    l1, l2, l3 = l
+    a1, a2, a3, b1, b2, b3 = p['a1'], p['a2'], p['a3'], p['b1'], p['b2'], p['b3']
+    c1, c2, c3, c4, g1, g2, K = p['c1'], p['c2'], p['c3'], p['c4'], p['g1'], p['g2'], p['K']
+    u1, u2 = p['u1'], p['u2']
+
+    dl1 = l1*(b1 + u1*uR - c1*x3 - a1*x2**g1) - a2*g2*l2*x1**(g2 - 1.0)*x2 - c3*g2*l3*x1**(g2 - 1.0)*x3
+    dl2 = l2*(b2 + u2*uR - c2*x3 - a2*x1**g2) - a1*g1*l1*x1*x2**(g1 - 1.0) - c4*g1*l3*x2**(g1 - 1.0)*x3
+    dl3 = l3*(b3 + uR - c3*x1**g2 - c4*x2**g1 + a3*(x3/K - 1.0) + (a3*x3)/K) - 2.0*x3 - c1*l1*x1 - c2*l2*x2
+
+    return np.array([dl1, dl2, dl3])
+
+
+def controlRadio(x, l, p):
+    x1, x2, x3 = x
+    l1, l2, l3 = l
+    uNew1 = np.minimum(p['uRMax']*np.ones_like(l1), (p['u1']*l1*x1 + p['u2']*l2*x2 + l3*x3)/(2.0*p['wR']))
+    return np.array([np.maximum(np.zeros_like(uNew1), uNew1)])
+
+
+def glambdaMixed(x, u, l, p):
+    x1, x2, x3 = x
+    uD, uR = u
+    l1, l2, l3 = l
+    a1, a2, a3, b1, b2, b3 = p['a1'], p['a2'], p['a3'], p['b1'], p['b2'], p['b3']
+    c1, c2, c3, c4, g1, g2, K = p['c1'], p['c2'], p['c3'], p['c4'], p['g1'], p['g2'], p['K']
+    u1, u2 = p['u1'], p['u2']
+
+    dl1 = -a2*g2*l2*x1**g2*x2/x1 - c3*g2*l3*x1**g2*x3/x1 - l1*(a1*x2**g1*(-uD + 1.0) - b1 + c1*x3 - u1*uR)
+    dl2 = -a1*g1*l1*x1*x2**g1*(-uD + 1.0)/x2 - c4*g1*l3*x2**g1*x3/x2 - l2*(a2*x1**g2 - b2 + c2*x3 - u2*uR)
+    dl3 = -c1*l1*x1 - c2*l2*x2 - l3*(a3*(1.0 - x3/K) - a3*x3/K - b3 + c3*x1**g2 + c4*x2**g1 - uR) - 2.0*x3
+
+    return np.array([dl1, dl2, dl3])
+
+
+def controlMixed(x, l, p):
+    return np.array([controlDeno(x, l, p)[0], controlRadio(x, l, p)[0]])
+
+
+hand = {
+    'denosumab':    (glambdaDeno,  controlDeno),
+    'radiotherapy': (glambdaRadio, controlRadio),
+    'mixed':        (glambdaMixed, controlMixed),
+}
+
+# random points around the scenario trajectories
+M = 10000
+x = np.array([10**np.random.uniform(-7, 0, M),
+              10**np.random.uniform(-1, 1.5, M),
+              10**np.random.uniform(0, 4, M)])
+l = np.random.uniform(-1.e4, 1.e4, (3, M))
+uRandom = {'uD': np.random.uniform(0.0, models.uDMax, M),
+           'uR': np.random.uniform(0.0, models.uRMax, M)}
+
+for name in ['denosumab', 'radiotherapy', 'mixed']:
+    glambdaHand, controlHand = hand[name]
+    weights = models.WEIGHTS[name][0]
+
+    for scenario in [1, 2, 3]:
+        kernels = models.therapy(name, scenario, **weights)
+        p = models.parameters(scenario, **weights)
+
+        u = np.array([uRandom[str(c)] for c in kernels.controls])
+
+        dl    = kernels.glambda(x, 0, u, l)
+        dlRef = glambdaHand(x, u, l, p)
+        errorL = np.max(np.abs(dl - dlRef)/(1.0 + np.abs(dlRef)))
+
+        # spread the adjoint over scales so that not every control saturates
+        lScaled = l*min(weights.values())*10**np.random.uniform(-8, 0, M)
+        c    = kernels.control_law(x, lScaled)
+        cRef = controlHand(x, lScaled, p)
+        errorC = np.max(np.abs(c - cRef))
+
+        print("%-12s scenario %d: adjoint error %.2e, control error %.2e"
+              % (name, scenario, errorL, errorC))
+
+print('')
+print(models.therapy('mixed').source)
@@ -0,0 +1,102 @@
+# Optimal Control 1: Cellular Level
+# Denosumab treatment, Scenario 1, mesh-sequenced FBSM
+#
+# Same experiments as 01-optConDeno-sc1.py, solved coarse-to-fine up to
+# N = T*100 time points instead of N = T*10.
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+from matplotlib import pyplot as plt
+import time
+
+from optcon import models, fbsm
+
+plt.rc('text', usetex=True)
+plt.rc('font', family='sans-serif')
+plt.rcParams['text.usetex'] = True
+plt.rcParams['text.latex.preamble'] = [
+       r'\usepackage{siunitx}',
+       r'\sisetup{detect-all}',
+       r'\usepackage{helvet}',
+       r'\usepackage{sansmath}',
+       r'\sansmath'
+]
+
+plt.close('all')
+
+# Temporal parameters
+T = models.T             # Final Time
+N = int(T*100)           # points of the finest grid
+
+# Optimal control parameters
+convx     = models.CONVX['denosumab']
+tolerance = 0.0001
+uMax      = models.uDMax
+
+solutions = []
+
+for weights in models.WEIGHTS['denosumab']:
+    print("Calculating optimal solution for wD=%f" % weights['wD'])
+    kernels = models.therapy('denosumab', 1, **weights)
+
+    start = time.time()
+    sol = fbsm.FBSM_multilevel(kernels, N, T, convx=convx, tolerance=tolerance, verbose=False)
+    print("  %.1f s, %d iterations" % (time.time() - start, sol.iterations))
+    for n, iterations, change in sol.levels:
+        print("  N=%6d: %4d iterations, control change %.2e" % (n, iterations, change))
+
+    solutions.append(sol)
+
+#--- no control
+kernels = models.therapy('denosumab', 1, wD=1.0)
+t, h = fbsm.grid(T, N)
+StateVar0, Controls0, l_vec0 = fbsm.initial(kernels, N)
+StateVar0 = fbsm.runge_forward(kernels.model, StateVar0, Controls0, h)
+
+
+# plots
+
+plt.figure(figsize=(8,5))
+alphas = [0.3, 0.6, 1.0]
+labels = [r"$\mathsf{w_D=1e6}$", r"$\mathsf{w_D=1e7}$", r"$\mathsf{w_D=1e8}$"]
+
+plt.subplot(2,2,1)
+plt.plot(t, StateVar0[0], color='black', linestyle='dashed', linewidth=1, label=r"\textsf{no control}")
+for sol, alpha in zip(solutions, alphas):
+    plt.plot(sol.t, sol.StateVar[0], color='blue', linestyle='solid', linewidth=2, alpha=alpha)
+plt.xlim([0.,T])
+plt.ylabel(r"Osteoclast $C$",fontsize=16)
+plt.xlabel(r"Time $t$",fontsize=16)
+plt.tight_layout()
+
+plt.subplot(2,2,2)
+plt.plot(t, StateVar0[1], color='black', linestyle='dashed', linewidth=1)
+for sol, alpha in zip(solutions, alphas):
+    plt.plot(sol.t, sol.StateVar[1], color='green', linestyle='solid', linewidth=2, alpha=alpha)
+plt.xlim([0.,T])
+plt.ylabel(r"Osteoblast $B$",fontsize=16)
+plt.xlabel(r"Time $t$",fontsize=16)
+plt.tight_layout()
+
+plt.subplot(2,2,3)
+plt.plot(t, StateVar0[2], color='black', linestyle='dashed', linewidth=1, label=r"\textsf{no control}")
+for sol, alpha, label in zip(solutions, alphas, labels):
+    plt.plot(sol.t, sol.StateVar[2], color='red', linestyle='solid', linewidth=2, alpha=alpha, label=label)
+leg = plt.legend(loc='best', fancybox=True, framealpha=0.25,fontsize=10)
+plt.xlim([0.,T])
+plt.ylabel(r"Cancer Cells $T$",fontsize=16)
+plt.xlabel(r"Time $t$",fontsize=16)
+plt.tight_layout()
+
+plt.subplot(2,2,4)
+for sol, alpha in zip(solutions, alphas):
+    plt.plot(sol.t, sol.Controls[0]/uMax, color='black', linestyle='solid', linewidth=2, alpha=alpha)
+plt.xlim([0.,T])
+plt.ylim([0., 1.05])
+plt.ylabel(r"Norm. Control $u_D$",fontsize=16)
+plt.xlabel(r"Time $t$",fontsize=16)
+plt.tight_layout()
+
+plt.show()
@@ -0,0 +1,65 @@
+# Optimal Control 1: Cellular Level
+# Mixed therapy, Scenario 1, trade-off surface over (wD, wR)
+#
+# The sweep is stored in ./pareto-mixed-sc1/ and resumed from there if
+# the script is interrupted and run again.
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+from matplotlib import pyplot as plt
+import numpy as np
+
+from optcon import models, pareto
+
+plt.rc('text', usetex=True)
+plt.rc('font', family='sans-serif')
+plt.rcParams['text.usetex'] = True
+plt.rcParams['text.latex.preamble'] = [
+       r'\usepackage{siunitx}',
+       r'\sisetup{detect-all}',
+       r'\usepackage{helvet}',
+       r'\usepackage{sansmath}',
+       r'\sansmath'
+]
+
+if __name__ == '__main__':
+    plt.close('all')
+
+    # weights around the experiments of 08-optConMixed-sc1.py. The FBSM
+    # oscillates with convx = CONVX['mixed'] in a band of wR/wD ~ 1e4-1e5,
+    # and below wD = 1e6 even with convx = 0.98, so the grid starts there
+    wD = np.logspace(6, 8, 5)
+    wR = np.logspace(9, 12, 7)
+
+    store = pareto.sweep(wD, wR, './pareto-mixed-sc1/', scenario=1,
+                         N=int(models.T*10), tolerance=0.0001, convx=0.98)
+    if not np.all(store['converged']):
+        print('Not converged: %d points, left out of the front' % np.sum(~store['converged']))
+    mask = pareto.front(store)
+
+    print('')
+    print('Points on the front: %d of %d' % (mask.sum(), len(mask)))
+
+    # plots
+
+    plt.figure(figsize=(8,3.5))
+
+    plt.subplot(1,2,1)
+    sc = plt.scatter(store['costD'], store['tumour'], c=np.log10(store['wR']), cmap='viridis', s=20)
+    plt.scatter(store['costD'][mask], store['tumour'][mask], facecolors='none', edgecolors='red', s=60)
+    plt.colorbar(sc, label=r"$\log_{10} w_R$")
+    plt.xlabel(r"$\int u_D^2\,dt$",fontsize=14)
+    plt.ylabel(r"$\int T^2\,dt$",fontsize=14)
+    plt.tight_layout()
+
+    plt.subplot(1,2,2)
+    sc = plt.scatter(store['costR'], store['tumour'], c=np.log10(store['wD']), cmap='viridis', s=20)
+    plt.scatter(store['costR'][mask], store['tumour'][mask], facecolors='none', edgecolors='red', s=60)
+    plt.colorbar(sc, label=r"$\log_{10} w_D$")
+    plt.xlabel(r"$\int u_R^2\,dt$",fontsize=14)
+    plt.ylabel(r"$\int T^2\,dt$",fontsize=14)
+    plt.tight_layout()
+
+    plt.show()
@@ -0,0 +1,109 @@
+# Optimal Control 1: Cellular Level
+# Mixed therapy, Scenario 1, parareal sweeps
+#
+# The sweeps are timed on a long horizon, T = 1000, where a serial sweep
+# is long enough to be worth splitting. The FBSM does not converge there
+# with convx = CONVX['mixed'] (the control update oscillates), so the
+# optimal control is solved on the horizon of 08-optConMixed-sc1.py.
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+from matplotlib import pyplot as plt
+import numpy as np
+import multiprocessing
+import time
+
+from optcon import models, fbsm, parareal
+
+plt.rc('text', usetex=True)
+plt.rc('font', family='sans-serif')
+plt.rcParams['text.usetex'] = True
+plt.rcParams['text.latex.preamble'] = [
+       r'\usepackage{siunitx}',
+       r'\sisetup{detect-all}',
+       r'\usepackage{helvet}',
+       r'\usepackage{sansmath}',
+       r'\sansmath'
+]
+
+if __name__ == '__main__':
+    plt.close('all')
+
+    # Temporal parameters
+    TSweep = 1000.           # horizon of the timed sweeps
+    T = models.T             # Final Time of the optimal control
+    N = int(T*10)            # points of the grid
+
+    wD = 1.e6
+    wR = 1.e10
+
+    kernels = models.therapy('mixed', 1, wD=wD, wR=wR)
+    processes = multiprocessing.cpu_count()
+
+    #--- one sweep, serial against parareal
+    NSweep = int(TSweep*10)
+    t, h = fbsm.grid(TSweep, NSweep)
+    StateVar0, Controls0, l_vec0 = fbsm.initial(kernels, NSweep)
+    Controls0[0] = 0.5*models.uDMax
+    Controls0[1] = 0.5*models.uRMax
+
+    start = time.time()
+    x = fbsm.runge_forward(kernels.model, StateVar0.copy(), Controls0, h)
+    l = fbsm.runge_backward(kernels.glambda, x, Controls0, l_vec0.copy(), h)
+    print("Serial sweeps:   %.2f s" % (time.time() - start))
+
+    with parareal.Parareal(kernels, processes=processes) as sweeps:
+        start = time.time()
+        xP = sweeps.forward(StateVar0.copy(), Controls0, h)
+        lP = sweeps.backward(x, Controls0, l_vec0.copy(), h)
+        print("Parareal sweeps: %.2f s on %d processes, %d iterations"
+              % (time.time() - start, processes, sweeps.iterations))
+        print("Relative difference: state %.2e, adjoint %.2e"
+              % (np.abs(xP - x).max()/np.abs(x).max(), np.abs(lP - l).max()/np.abs(l).max()))
+
+        #--- optimal control
+        print("Calculating optimal solution for wD=%f, wR=%f" % (wD, wR))
+        sol = fbsm.FBSM_multilevel(kernels, N, T, convx=models.CONVX['mixed'], sweeps=sweeps)
+
+    if not sol.converged:
+        raise RuntimeError('FBSM did not converge (error %.2e after %d iterations)'
+                           % (sol.error, sol.iterations))
+
+    # plots
+
+    plt.figure(figsize=(8,5))
+
+    plt.subplot(2,2,1)
+    plt.plot(sol.t, sol.StateVar[0], color='blue', linestyle='solid', linewidth=2)
+    plt.xlim([0.,T])
+    plt.ylabel(r"Osteoclast $C$",fontsize=16)
+    plt.xlabel(r"Time $t$",fontsize=16)
+    plt.tight_layout()
+
+    plt.subplot(2,2,2)
+    plt.plot(sol.t, sol.StateVar[1], color='green', linestyle='solid', linewidth=2)
+    plt.xlim([0.,T])
+    plt.ylabel(r"Osteoblast $B$",fontsize=16)
+    plt.xlabel(r"Time $t$",fontsize=16)
+    plt.tight_layout()
+
+    plt.subplot(2,2,3)
+    plt.plot(sol.t, sol.StateVar[2], color='red', linestyle='solid', linewidth=2)
+    plt.xlim([0.,T])
+    plt.ylabel(r"Cancer Cells $T$",fontsize=16)
+    plt.xlabel(r"Time $t$",fontsize=16)
+    plt.tight_layout()
+
+    plt.subplot(2,2,4)
+    plt.plot(sol.t, sol.Controls[0]/models.uDMax, color='magenta', linestyle='solid', linewidth=2.5, label=r"$u_D$")
+    plt.plot(sol.t, sol.Controls[1]/models.uRMax, color='orange', linestyle='solid', linewidth=2.5, label=r"$u_R$")
+    leg = plt.legend(loc='best', fancybox=True, framealpha=0.25,fontsize=10)
+    plt.xlim([0.,T])
+    plt.ylim([-0.05,1.05])
+    plt.ylabel(r"Optimal Controls",fontsize=16)
+    plt.xlabel(r"Time $t$",fontsize=16)
+    plt.tight_layout()
+
+    plt.show()
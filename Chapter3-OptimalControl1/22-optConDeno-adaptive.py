@@ -0,0 +1,93 @@
+# Optimal Control 1: Cellular Level
+# Denosumab therapy, Scenario 1, adaptive-step sweeps
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+from matplotlib import pyplot as plt
+import numpy as np
+import time
+
+from optcon import models, fbsm, adaptive
+
+plt.rc('text', usetex=True)
+plt.rc('font', family='sans-serif')
+plt.rcParams['text.usetex'] = True
+plt.rcParams['text.latex.preamble'] = [
+       r'\usepackage{siunitx}',
+       r'\sisetup{detect-all}',
+       r'\usepackage{helvet}',
+       r'\usepackage{sansmath}',
+       r'\sansmath'
+]
+
+plt.close('all')
+
+# Temporal parameters
+T = models.T             # Final Time
+N = int(T*10)            # points of the grid
+
+wD = 1.e6
+
+kernels = models.therapy('denosumab', 1, wD=wD)
+
+#--- one sweep, fixed-step RK4 against the adaptive integrators
+t, h = fbsm.grid(T, N)
+StateVar0, Controls0, l_vec0 = fbsm.initial(kernels, N)
+Controls0[0] = models.uDMax*(t < T/2)
+
+start = time.time()
+x = fbsm.runge_forward(kernels.model, StateVar0.copy(), Controls0, h)
+l = fbsm.runge_backward(kernels.glambda, x, Controls0, l_vec0.copy(), h)
+print("RK4:   %.3f s, %d RHS evaluations" % (time.time() - start, 8*(N-1)))
+
+for method in ['RK45', 'LSODA', 'Radau']:
+    sweeps = adaptive.Adaptive(kernels, method=method)
+    start = time.time()
+    xA = sweeps.forward(StateVar0.copy(), Controls0, h)
+    lA = sweeps.backward(xA, Controls0, l_vec0.copy(), h)
+    print("%-6s %.3f s, %d RHS evaluations, relative difference: state %.2e, adjoint %.2e"
+          % (method + ':', time.time() - start, sweeps.nfev,
+             np.abs(xA - x).max()/np.abs(x).max(), np.abs(lA - l).max()/np.abs(l).max()))
+
+#--- optimal control
+print("Calculating optimal solution for wD=%f" % wD)
+sweeps = adaptive.Adaptive(kernels, method='LSODA')
+sol = fbsm.FBSM(kernels, N, T, convx=models.CONVX['denosumab'], sweeps=sweeps)
+print("RHS evaluations per sweep: %.0f" % (sweeps.nfev/sweeps.count))
+
+# plots
+
+plt.figure(figsize=(8,5))
+
+plt.subplot(2,2,1)
+plt.plot(sol.t, sol.StateVar[0], color='blue', linestyle='solid', linewidth=2)
+plt.xlim([0.,T])
+plt.ylabel(r"Osteoclast $C$",fontsize=16)
+plt.xlabel(r"Time $t$",fontsize=16)
+plt.tight_layout()
+
+plt.subplot(2,2,2)
+plt.plot(sol.t, sol.StateVar[1], color='green', linestyle='solid', linewidth=2)
+plt.xlim([0.,T])
+plt.ylabel(r"Osteoblast $B$",fontsize=16)
+plt.xlabel(r"Time $t$",fontsize=16)
+plt.tight_layout()
+
+plt.subplot(2,2,3)
+plt.plot(sol.t, sol.StateVar[2], color='red', linestyle='solid', linewidth=2)
+plt.xlim([0.,T])
+plt.ylabel(r"Cancer Cells $T$",fontsize=16)
+plt.xlabel(r"Time $t$",fontsize=16)
+plt.tight_layout()
+
+plt.subplot(2,2,4)
+plt.plot(sol.t, sol.Controls[0]/models.uDMax, color='magenta', linestyle='solid', linewidth=2.5)
+plt.xlim([0.,T])
+plt.ylim([-0.05,1.05])
+plt.ylabel(r"Optimal Control $u_D$",fontsize=16)
+plt.xlabel(r"Time $t$",fontsize=16)
+plt.tight_layout()
+
+plt.show()
@@ -0,0 +1,85 @@
+# Optimal Control 1: Cellular Level
+# Radiotherapy, Scenario 1, discrete dose fractions
+#
+# The continuous optimal control of 05-optConRadio-sc1.py (wR=1e10) is
+# compared with the best schedule of daily fractions delivering at most
+# the same total dose, each fraction at most the dose of one day of the
+# control at its bound.
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+from matplotlib import pyplot as plt
+import numpy as np
+
+from optcon import models, fbsm, fractions
+
+plt.rc('text', usetex=True)
+plt.rc('font', family='sans-serif')
+plt.rcParams['text.usetex'] = True
+plt.rcParams['text.latex.preamble'] = [
+       r'\usepackage{siunitx}',
+       r'\sisetup{detect-all}',
+       r'\usepackage{helvet}',
+       r'\usepackage{sansmath}',
+       r'\sansmath'
+]
+
+if __name__ == '__main__':
+    plt.close('all')
+
+    # Temporal parameters
+    T = models.T             # Final Time
+    N = int(T*10)            # points of the grid
+
+    wR = 1.e10
+
+    kernels = models.therapy('radiotherapy', 1, wR=wR)
+
+    #--- continuous optimal control
+    print("Calculating optimal solution for wR=%f" % wR)
+    sol = fbsm.FBSM_multilevel(kernels, N, T, convx=models.CONVX['radiotherapy'])
+    JOpt = fbsm.integral(kernels.running_cost(sol.StateVar, sol.Controls), sol.h)
+    totalDose = fbsm.integral(sol.Controls[0], sol.h)
+
+    #--- fractions with the same total dose
+    n = int(np.ceil(totalDose/models.uRMax))    # number of fractions
+    minGap = 1.0                                # days between fractions
+
+    guess = fractions.quantize(sol.t, sol.Controls[0], n)
+    days, doses, J = fractions.optimize(kernels, n, totalDose, T, N, minGap=minGap,
+                                        population=96, generations=60, guess=guess,
+                                        seed=0)
+    _, X = fractions.simulate(kernels, days, doses, T, N, trajectories=True)
+    _, XNo = fractions.simulate(kernels, [[0.]], [[0.]], T, N, trajectories=True)
+
+    print('')
+    print("Continuous control: J=%.6e, int T^2 dt=%.6e, total dose %.4f"
+          % (JOpt, fbsm.integral(sol.StateVar[2]**2, sol.h), totalDose))
+    print("%d fractions:       J=%.6e, int T^2 dt=%.6e, total dose %.4f"
+          % (n, J, fbsm.integral(X[0,2]**2, sol.h), doses.sum()))
+
+    # plots
+
+    plt.figure(figsize=(8,3.5))
+
+    plt.subplot(1,2,1)
+    plt.plot(sol.t, XNo[0,2], color='black', linestyle='dashed', linewidth=1, label=r"\textsf{no control}")
+    plt.plot(sol.t, sol.StateVar[2], color='red', linestyle='solid', linewidth=2, alpha=0.5, label=r"\textsf{continuous}")
+    plt.plot(sol.t, X[0,2], color='red', linestyle='solid', linewidth=2, label=r"\textsf{fractions}")
+    plt.legend(loc='best', fancybox=True, framealpha=0.25, fontsize=10)
+    plt.xlim([0.,T])
+    plt.ylabel(r"Cancer Cells $T$",fontsize=16)
+    plt.xlabel(r"Time $t$",fontsize=16)
+    plt.tight_layout()
+
+    plt.subplot(1,2,2)
+    plt.plot(sol.t, sol.Controls[0], color='black', linestyle='solid', linewidth=2, alpha=0.5)
+    plt.vlines(days, 0., doses, color='orange', linewidth=2.5)
+    plt.xlim([0.,T])
+    plt.ylabel(r"$u_R$, \textsf{fraction dose}",fontsize=16)
+    plt.xlabel(r"Time $t$",fontsize=16)
+    plt.tight_layout()
+
+    plt.show()
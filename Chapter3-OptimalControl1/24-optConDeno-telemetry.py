@@ -0,0 +1,78 @@
+# Optimal Control 1: Cellular Level
+# Denosumab therapy, Scenario 1, FBSM telemetry
+#
+# Objective, convergence error and cost of every iteration of the
+# multilevel FBSM, written to telemetry-deno-sc1.jsonl. The objective
+# against the accumulated sweep time shows what the last iterations buy
+# before tolerance and maxIterations are chosen.
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+from matplotlib import pyplot as plt
+import numpy as np
+
+from optcon import models, fbsm, telemetry
+
+plt.rc('text', usetex=True)
+plt.rc('font', family='sans-serif')
+plt.rcParams['text.usetex'] = True
+plt.rcParams['text.latex.preamble'] = [
+       r'\usepackage{siunitx}',
+       r'\sisetup{detect-all}',
+       r'\usepackage{helvet}',
+       r'\usepackage{sansmath}',
+       r'\sansmath'
+]
+
+plt.close('all')
+
+# Temporal parameters
+T = models.T             # Final Time
+N = int(T*10)            # points of the grid
+
+wD = 1.e6
+
+kernels = models.therapy('denosumab', 1, wD=wD)
+
+log = telemetry.Telemetry()
+sol = fbsm.FBSM_multilevel(kernels, N, T, convx=models.CONVX['denosumab'],
+                           tolerance=1.e-6, telemetry=log)
+log.write('telemetry-deno-sc1.jsonl')
+
+c = log.columns()
+elapsed = np.cumsum(c['forward'] + c['backward'] + c['update'])
+J = fbsm.objective(kernels, sol.StateVar, sol.Controls, sol.h)
+
+print('')
+print("Objective J=%.6e after %d iterations, %.2f s in sweeps, %d RHS evaluations"
+      % (J, len(elapsed), elapsed[-1], np.nansum(c['rhs'])))
+for tolerance in [1.e-3, 1.e-4, 1.e-5]:
+    i = np.flatnonzero((c['N'] == N) & (c['error'] < tolerance))
+    if len(i) > 0:
+        print("tolerance %.0e: J=%.6e (relative gap %.1e), %.2f s"
+              % (tolerance, c['objective'][i[0]], abs(c['objective'][i[0]] - J)/J, elapsed[i[0]]))
+
+# plots
+
+plt.figure(figsize=(8,3.5))
+
+plt.subplot(1,2,1)
+for n in np.unique(c['N']):
+    level = c['N'] == n
+    plt.semilogy(elapsed[level], c['objective'][level] - J + 1.e-12*J, linewidth=2, label=r"$N=%d$" % n)
+plt.legend(loc='best', fancybox=True, framealpha=0.25, fontsize=10)
+plt.ylabel(r"$J_k - J$",fontsize=16)
+plt.xlabel(r"Time (\si{\second})",fontsize=16)
+plt.tight_layout()
+
+plt.subplot(1,2,2)
+for n in np.unique(c['N']):
+    level = c['N'] == n
+    plt.semilogy(elapsed[level], c['error'][level], linewidth=2, label=r"$N=%d$" % n)
+plt.ylabel(r"\textsf{Error}",fontsize=16)
+plt.xlabel(r"Time (\si{\second})",fontsize=16)
+plt.tight_layout()
+
+plt.show()
@@ -0,0 +1,74 @@
+# Optimal Control 1: Cellular Level
+# Mixed therapy, Scenario 1, multiple shooting against the FBSM
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+from matplotlib import pyplot as plt
+import time
+
+from optcon import models, fbsm, bvp
+
+plt.rc('text', usetex=True)
+plt.rc('font', family='sans-serif')
+plt.rcParams['text.usetex'] = True
+plt.rcParams['text.latex.preamble'] = [
+       r'\usepackage{siunitx}',
+       r'\sisetup{detect-all}',
+       r'\usepackage{helvet}',
+       r'\usepackage{sansmath}',
+       r'\sansmath'
+]
+
+plt.close('all')
+
+# Temporal parameters
+T = models.T             # Final Time
+N = int(T*10)            # points of the grid
+
+wD = 1.e6
+wR = 1.e10
+
+kernels = models.therapy('mixed', 1, wD=wD, wR=wR)
+
+print("Calculating optimal solution for wD=%f, wR=%f" % (wD, wR))
+start = time.time()
+sol = bvp.shooting(kernels, N, T, segments=50)
+tShooting = time.time() - start
+
+start = time.time()
+solFBSM = fbsm.FBSM_multilevel(kernels, N, T, convx=models.CONVX['mixed'],
+                               tolerance=1.e-6, verbose=False)
+tFBSM = time.time() - start
+
+print('')
+print("Multiple shooting: J=%.8e, %.2f s" % (fbsm.objective(kernels, sol.StateVar, sol.Controls, sol.h), tShooting))
+print("FBSM:              J=%.8e, %.2f s" % (fbsm.objective(kernels, solFBSM.StateVar, solFBSM.Controls, solFBSM.h), tFBSM))
+print("Relative control difference: %.2e" % fbsm.relative(sol.Controls, solFBSM.Controls, sol.h))
+
+# plots
+
+plt.figure(figsize=(8,3.5))
+
+plt.subplot(1,2,1)
+plt.plot(sol.t, sol.StateVar[2], color='red', linestyle='solid', linewidth=2)
+plt.plot(solFBSM.t, solFBSM.StateVar[2], color='black', linestyle='dashed', linewidth=1)
+plt.xlim([0.,T])
+plt.ylabel(r"Cancer Cells $T$",fontsize=16)
+plt.xlabel(r"Time $t$",fontsize=16)
+plt.tight_layout()
+
+plt.subplot(1,2,2)
+plt.plot(sol.t, sol.Controls[0]/models.uDMax, color='magenta', linestyle='solid', linewidth=2.5, label=r"$u_D$")
+plt.plot(sol.t, sol.Controls[1]/models.uRMax, color='orange', linestyle='solid', linewidth=2.5, label=r"$u_R$")
+plt.plot(solFBSM.t, solFBSM.Controls[0]/models.uDMax, color='black', linestyle='dashed', linewidth=1)
+plt.plot(solFBSM.t, solFBSM.Controls[1]/models.uRMax, color='black', linestyle='dashed', linewidth=1)
+plt.legend(loc='best', fancybox=True, framealpha=0.25, fontsize=10)
+plt.xlim([0.,T])
+plt.ylim([-0.05,1.05])
+plt.ylabel(r"Optimal Controls",fontsize=16)
+plt.xlabel(r"Time $t$",fontsize=16)
+plt.tight_layout()
+
+plt.show()
@@ -0,0 +1,76 @@
+# Optimal Control 1: Cellular Level
+# Radiotherapy, Scenario 1, robust control over uncertain a3, c1, c3
+#
+# One radiotherapy schedule for 32 parameter sets around scenario 1,
+# optimized for the expected cost and for the worst case, compared with
+# the optimal control of the nominal parameters.
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+from matplotlib import pyplot as plt
+
+from optcon import models, fbsm, robust
+
+plt.rc('text', usetex=True)
+plt.rc('font', family='sans-serif')
+plt.rcParams['text.usetex'] = True
+plt.rcParams['text.latex.preamble'] = [
+       r'\usepackage{siunitx}',
+       r'\sisetup{detect-all}',
+       r'\usepackage{helvet}',
+       r'\usepackage{sansmath}',
+       r'\sansmath'
+]
+
+plt.close('all')
+
+# Temporal parameters
+T = models.T             # Final Time
+N = int(T*10)            # points of the grid
+
+wR = 1.e10
+convx = models.CONVX['radiotherapy']
+
+samples = robust.sample(1, 32, spread=0.25, seed=0)
+kernels = models.therapy('radiotherapy', 1, wR=wR, **samples)
+
+print("Nominal parameters")
+solNominal = fbsm.FBSM_multilevel(models.therapy('radiotherapy', 1, wR=wR), N, T,
+                                  convx=convx, verbose=False)
+print("Expected cost over %d samples" % len(samples['a3']))
+solExpected, rExpected = robust.FBSM(kernels, N, T, convx=convx, verbose=False)
+print("Worst case over %d samples" % len(samples['a3']))
+solWorst, rWorst = robust.FBSM(kernels, N, T, mode='worst', sharpness=100.,
+                               convx=convx, verbose=False)
+
+print('')
+for name, sol in [('nominal', solNominal), ('expected', solExpected), ('worst case', solWorst)]:
+    J = rExpected.costs(sol.t, sol.Controls)
+    print("%-10s control: mean J=%.4e, max J=%.4e" % (name, J.mean(), J.max()))
+
+# plots
+
+plt.figure(figsize=(8,3.5))
+
+plt.subplot(1,2,1)
+plt.plot(solExpected.t, solExpected.StateVar[2], color='red', linestyle='solid', linewidth=1, alpha=0.2)
+plt.plot(solExpected.t, solExpected.StateVar[2].mean(axis=1), color='red', linestyle='solid', linewidth=2)
+plt.xlim([0.,T])
+plt.ylabel(r"Cancer Cells $T$",fontsize=16)
+plt.xlabel(r"Time $t$",fontsize=16)
+plt.tight_layout()
+
+plt.subplot(1,2,2)
+plt.plot(solNominal.t, solNominal.Controls[0]/models.uRMax, color='black', linestyle='dashed', linewidth=1.5, label=r"\textsf{nominal}")
+plt.plot(solExpected.t, solExpected.Controls[0]/models.uRMax, color='orange', linestyle='solid', linewidth=2.5, label=r"\textsf{expected}")
+plt.plot(solWorst.t, solWorst.Controls[0]/models.uRMax, color='purple', linestyle='solid', linewidth=2.5, label=r"\textsf{worst case}")
+plt.legend(loc='best', fancybox=True, framealpha=0.25, fontsize=10)
+plt.xlim([0.,T])
+plt.ylim([-0.05,1.05])
+plt.ylabel(r"Norm. Control $u_R$",fontsize=16)
+plt.xlabel(r"Time $t$",fontsize=16)
+plt.tight_layout()
+
+plt.show()
@@ -0,0 +1,80 @@
+# Optimal Control 1: Cellular Level
+# Radiotherapy, Scenario 1, receding-horizon control of a mismatched plant
+#
+# The plan is made with the nominal parameters of scenario 1 while the
+# plant grows faster (a3 30% higher) and measurements carry 5% noise.
+# The open-loop optimal control is compared with replanning every 10 days,
+# each re-solve a multiple shooting warm started from the previous plan.
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+from matplotlib import pyplot as plt
+import numpy as np
+import time
+
+from optcon import models, fbsm, mpc
+
+plt.rc('text', usetex=True)
+plt.rc('font', family='sans-serif')
+plt.rcParams['text.usetex'] = True
+plt.rcParams['text.latex.preamble'] = [
+       r'\usepackage{siunitx}',
+       r'\sisetup{detect-all}',
+       r'\usepackage{helvet}',
+       r'\usepackage{sansmath}',
+       r'\sansmath'
+]
+
+plt.close('all')
+
+# Temporal parameters
+T = models.T             # Final Time
+N = int(T*10)            # points of the grid
+
+wR = 1.e10
+
+kernels = models.therapy('radiotherapy', 1, wR=wR)
+plant = models.therapy('radiotherapy', 1, wR=wR, a3=1.3*models.SCENARIOS[1]['a3'])
+
+#--- open loop: nominal optimal control applied to the plant
+sol = fbsm.FBSM_multilevel(kernels, N, T, convx=models.CONVX['radiotherapy'], verbose=False)
+StateVarOpen, _, _ = fbsm.initial(plant, N)
+StateVarOpen = fbsm.runge_forward(plant.model, StateVarOpen, sol.Controls, sol.h)
+
+#--- closed loop
+controller = mpc.MPC(kernels, replan=10., T=T, plant=plant, noise=0.05, seed=0,
+                     method='shooting')
+start = time.time()
+t, StateVar, Controls = controller.run(dt=sol.h)
+seconds = np.array([s for _, _, s in controller.log])
+
+print("Open loop:   J=%.4e" % fbsm.objective(plant, StateVarOpen, sol.Controls, sol.h))
+print("Closed loop: J=%.4e, %d solves in %.2f s (first %.0f ms, then %.0f ms on average)"
+      % (fbsm.objective(plant, StateVar, Controls, t[1]-t[0]), len(seconds),
+         time.time() - start, 1000*seconds[0], 1000*seconds[1:].mean()))
+
+# plots
+
+plt.figure(figsize=(8,3.5))
+
+plt.subplot(1,2,1)
+plt.plot(sol.t, StateVarOpen[2], color='black', linestyle='dashed', linewidth=1.5, label=r"\textsf{open loop}")
+plt.plot(t, StateVar[2], color='red', linestyle='solid', linewidth=2, label=r"\textsf{MPC}")
+plt.legend(loc='best', fancybox=True, framealpha=0.25, fontsize=10)
+plt.xlim([0.,T])
+plt.ylabel(r"Cancer Cells $T$",fontsize=16)
+plt.xlabel(r"Time $t$",fontsize=16)
+plt.tight_layout()
+
+plt.subplot(1,2,2)
+plt.plot(sol.t, sol.Controls[0]/models.uRMax, color='black', linestyle='dashed', linewidth=1.5)
+plt.plot(t, Controls[0]/models.uRMax, color='orange', linestyle='solid', linewidth=2.5)
+plt.xlim([0.,T])
+plt.ylim([-0.05,1.05])
+plt.ylabel(r"Norm. Control $u_R$",fontsize=16)
+plt.xlabel(r"Time $t$",fontsize=16)
+plt.tight_layout()
+
+plt.show()
@@ -0,0 +1,91 @@
+# Optimal Control 1: Cellular Level
+# Mixed therapy, Scenario 1, direct optimization with reverse-mode gradients
+#
+# The discretized objective is minimized over the control values with
+# gradients through the RK4 forward sweep (optcon.autodiff), without the
+# adjoint system, and compared with the FBSM solution.
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+from matplotlib import pyplot as plt
+import numpy as np
+import time
+
+from optcon import models, fbsm, autodiff
+
+plt.rc('text', usetex=True)
+plt.rc('font', family='sans-serif')
+plt.rcParams['text.usetex'] = True
+plt.rcParams['text.latex.preamble'] = [
+       r'\usepackage{siunitx}',
+       r'\sisetup{detect-all}',
+       r'\usepackage{helvet}',
+       r'\usepackage{sansmath}',
+       r'\sansmath'
+]
+
+plt.close('all')
+
+# Temporal parameters
+T = models.T             # Final Time
+N = int(T*10)            # points of the grid
+
+wD = 1.e6
+wR = 1.e10
+
+kernels = models.therapy('mixed', 1, wD=wD, wR=wR)
+
+#--- cost of one gradient against one forward sweep
+t, h = fbsm.grid(T, N)
+StateVar0, Controls0, _ = fbsm.initial(kernels, N)
+start = time.time()
+fbsm.runge_forward(kernels.model, StateVar0, Controls0, h)
+tForward = time.time() - start
+start = time.time()
+autodiff.gradient(kernels, Controls0, h)
+print("Gradient: %.1f forward sweeps, %d checkpoints"
+      % ((time.time() - start)/tForward, int(np.ceil((N-1)/np.ceil(np.sqrt(N))))))
+
+#--- optimal control
+print("Calculating optimal solution for wD=%f, wR=%f" % (wD, wR))
+start = time.time()
+sol = autodiff.optimize(kernels, N, T)
+tDirect = time.time() - start
+
+start = time.time()
+solFBSM = fbsm.FBSM_multilevel(kernels, N, T, convx=models.CONVX['mixed'],
+                               tolerance=1.e-6, verbose=False)
+tFBSM = time.time() - start
+
+print('')
+print("Reverse-mode gradients: J=%.8e, %.2f s" % (fbsm.objective(kernels, sol.StateVar, sol.Controls, sol.h), tDirect))
+print("FBSM:                   J=%.8e, %.2f s" % (fbsm.objective(kernels, solFBSM.StateVar, solFBSM.Controls, solFBSM.h), tFBSM))
+
+# plots
+
+plt.figure(figsize=(8,3.5))
+
+plt.subplot(1,2,1)
+plt.plot(sol.t, sol.l_vec[2], color='red', linestyle='solid', linewidth=2, label=r"\textsf{discrete adjoint}")
+plt.plot(solFBSM.t, solFBSM.l_vec[2], color='black', linestyle='dashed', linewidth=1, label=r"\textsf{FBSM}")
+plt.legend(loc='best', fancybox=True, framealpha=0.25, fontsize=10)
+plt.xlim([0.,T])
+plt.ylabel(r"Adjoint $\lambda_3$",fontsize=16)
+plt.xlabel(r"Time $t$",fontsize=16)
+plt.tight_layout()
+
+plt.subplot(1,2,2)
+plt.plot(sol.t, sol.Controls[0]/models.uDMax, color='magenta', linestyle='solid', linewidth=2.5, label=r"$u_D$")
+plt.plot(sol.t, sol.Controls[1]/models.uRMax, color='orange', linestyle='solid', linewidth=2.5, label=r"$u_R$")
+plt.plot(solFBSM.t, solFBSM.Controls[0]/models.uDMax, color='black', linestyle='dashed', linewidth=1)
+plt.plot(solFBSM.t, solFBSM.Controls[1]/models.uRMax, color='black', linestyle='dashed', linewidth=1)
+plt.legend(loc='best', fancybox=True, framealpha=0.25, fontsize=10)
+plt.xlim([0.,T])
+plt.ylim([-0.05,1.05])
+plt.ylabel(r"Optimal Controls",fontsize=16)
+plt.xlabel(r"Time $t$",fontsize=16)
+plt.tight_layout()
+
+plt.show()
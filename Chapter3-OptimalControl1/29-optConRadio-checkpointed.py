@@ -0,0 +1,85 @@
+# Optimal Control 1: Cellular Level
+# Radiotherapy, Scenario 1, robust control over 64 samples with checkpoints
+#
+# The state and adjoint of a batch of 64 parameter sets on the grid of
+# the optCon scripts take about 4 MB per buffer, four buffers in the FBSM;
+# the checkpointed FBSM keeps them in about 0.2 MB and only the shared
+# control on the whole grid.
+#
+# The 'worst' mode reweights the samples from the costs of the whole
+# horizon; the checkpointed FBSM must reproduce fbsm.FBSM there too, which
+# is checked on a smaller batch.
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+from matplotlib import pyplot as plt
+import numpy as np
+import time
+
+from optcon import models, robust, checkpoint, fbsm
+
+plt.rc('text', usetex=True)
+plt.rc('font', family='sans-serif')
+plt.rcParams['text.usetex'] = True
+plt.rcParams['text.latex.preamble'] = [
+       r'\usepackage{siunitx}',
+       r'\sisetup{detect-all}',
+       r'\usepackage{helvet}',
+       r'\usepackage{sansmath}',
+       r'\sansmath'
+]
+
+plt.close('all')
+
+# Temporal parameters
+T = models.T             # Final Time
+N = int(T*10)            # points of the grid
+
+wR = 1.e10
+S = 64                   # parameter samples
+
+samples = robust.sample(1, S, seed=0)
+kernels = robust.Robust(models.therapy('radiotherapy', 1, wR=wR, **samples))
+
+column = 8*kernels.n*S
+s = checkpoint.stride(N, column)
+print("Full trajectory: %.1f MB per buffer, checkpoints: %.2f MB (stride %d)"
+      % (N*column/1.e6, (np.ceil((N-1)/float(s)) + 2*(s+1))*column/1.e6, s))
+
+print("Calculating robust solution for wR=%f over %d samples" % (wR, S))
+start = time.time()
+sol = checkpoint.FBSM_checkpointed(kernels, N, T, convx=models.CONVX['radiotherapy'],
+                                   trajectories=False)
+print("%.2f s" % (time.time() - start))
+
+J = kernels.costs(sol.t, sol.Controls)
+print("Expected J=%.4e, worst J=%.4e" % (J.mean(), J.max()))
+
+# check of the 'worst' mode against the FBSM
+SCheck = 8
+worst = models.therapy('radiotherapy', 1, wR=wR, **robust.sample(1, SCheck, seed=0))
+plain = robust.Robust(worst, 'worst')
+kept = robust.Robust(worst, 'worst')
+solPlain = fbsm.FBSM(plain, N, T, convx=models.CONVX['radiotherapy'], verbose=False)
+solKept = checkpoint.FBSM_checkpointed(kept, N, T, convx=models.CONVX['radiotherapy'],
+                                       trajectories=False, verbose=False)
+difference = np.abs(solKept.Controls - solPlain.Controls).max()/np.abs(solPlain.Controls).max()
+print("Worst mode over %d samples, weights FBSM:" % SCheck, np.round(plain.weights, 2))
+print("Weights checkpointed:", np.round(kept.weights, 2))
+print("Control difference: %.2e" % difference)
+if np.abs(kept.weights - plain.weights).max() > 1.e-3 or difference > 1.e-2:
+    raise RuntimeError('the checkpointed FBSM does not reproduce the FBSM in worst mode')
+
+# plots
+
+plt.figure(figsize=(5,3.5))
+plt.plot(sol.t, sol.Controls[0]/models.uRMax, color='orange', linestyle='solid', linewidth=2.5)
+plt.xlim([0.,T])
+plt.ylim([-0.05,1.05])
+plt.ylabel(r"Norm. Control $u_R$",fontsize=16)
+plt.xlabel(r"Time $t$",fontsize=16)
+plt.tight_layout()
+
+plt.show()
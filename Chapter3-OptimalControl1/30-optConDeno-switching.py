@@ -0,0 +1,86 @@
+# Optimal Control 1: Cellular Level
+# Denosumab, Scenario 3, switching-structure re-optimization
+#
+# The arc structure of the optimal control for one weight is detected and
+# kept for a larger weight, where only the switching times are optimized
+# (optcon.switching), and compared with a full FBSM for the new weight.
+# A bang-bang stationary control with a known switching time checks the
+# detection first.
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+from matplotlib import pyplot as plt
+import numpy as np
+import time
+
+from optcon import models, fbsm, switching
+
+plt.rc('text', usetex=True)
+plt.rc('font', family='sans-serif')
+plt.rcParams['text.usetex'] = True
+plt.rcParams['text.latex.preamble'] = [
+       r'\usepackage{siunitx}',
+       r'\sisetup{detect-all}',
+       r'\usepackage{helvet}',
+       r'\usepackage{sansmath}',
+       r'\sansmath'
+]
+
+plt.close('all')
+
+# Temporal parameters
+T = models.T             # Final Time
+N = int(T*10)            # points of the grid
+
+# check: stationary control jumping from the lower to the upper bound
+# [0, 1] between two grid points, the midpoint is crossed at tCheck
+tCheck = 5.03
+tGrid = np.linspace(0., 10., 101)
+kinds, times = switching.arcs(tGrid, 25.*(tGrid - tCheck) + 0.5, 0., 1.)
+print("Bang-bang check: %s, switching time %.4f (exact %.4f)"
+      % ([switching.KINDS[k] for k in kinds], times[0], tCheck))
+if kinds != [switching.LOWER, switching.UPPER] or abs(times[0] - tCheck) > 1.e-9:
+    raise RuntimeError('bang-bang switching time not detected')
+
+wD = 1.e7                # weight of the reference solution
+wDNew = 1.3e7            # nearby problem
+
+kernels = models.therapy('denosumab', 3, wD=wD)
+print("Calculating reference solution for wD=%f" % wD)
+ref = fbsm.FBSM_multilevel(kernels, N, T, convx=models.CONVX['denosumab'], verbose=False)
+structure = switching.detect(kernels, ref)
+print(structure)
+
+kernelsNew = models.therapy('denosumab', 3, wD=wDNew)
+
+print("Re-optimizing switching times for wD=%f" % wDNew)
+start = time.time()
+sol, tau = switching.reoptimize(kernelsNew, structure, N, T)
+tSwitch = time.time() - start
+
+start = time.time()
+solFBSM = fbsm.FBSM_multilevel(kernelsNew, N, T, convx=models.CONVX['denosumab'], verbose=False)
+tFBSM = time.time() - start
+
+print('')
+print("Switching times: J=%.8e, %.2f s" % (fbsm.objective(kernelsNew, sol.StateVar, sol.Controls, sol.h), tSwitch))
+print("FBSM:            J=%.8e, %.2f s" % (fbsm.objective(kernelsNew, solFBSM.StateVar, solFBSM.Controls, solFBSM.h), tFBSM))
+print(switching.detect(kernelsNew, solFBSM))
+
+# plots
+
+plt.figure(figsize=(5,3.5))
+plt.plot(sol.t, sol.Controls[0]/models.uDMax, color='magenta', linestyle='solid', linewidth=2.5, label=r"\textsf{switching times}")
+plt.plot(solFBSM.t, solFBSM.Controls[0]/models.uDMax, color='black', linestyle='dashed', linewidth=1, label=r"\textsf{FBSM}")
+for s in tau:
+    plt.axvline(s, color='gray', linestyle='dotted', linewidth=1)
+plt.legend(loc='best', fancybox=True, framealpha=0.25, fontsize=10)
+plt.xlim([0.,T])
+plt.ylim([-0.05,1.05])
+plt.ylabel(r"Norm. Control $u_D$",fontsize=16)
+plt.xlabel(r"Time $t$",fontsize=16)
+plt.tight_layout()
+
+plt.show()
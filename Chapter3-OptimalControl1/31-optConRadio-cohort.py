@@ -0,0 +1,70 @@
+# Optimal Control 1: Cellular Level
+# Radiotherapy, Scenario 1, optimal schedule applied to a virtual cohort
+#
+# The optimal control of the nominal patient is applied to 40000 patients
+# with perturbed parameters and initial conditions (optcon.cohort); only
+# streaming statistics of x3 are kept, not the trajectories.
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+from matplotlib import pyplot as plt
+import time
+
+from optcon import models, fbsm, cohort
+
+plt.rc('text', usetex=True)
+plt.rc('font', family='sans-serif')
+plt.rcParams['text.usetex'] = True
+plt.rcParams['text.latex.preamble'] = [
+       r'\usepackage{siunitx}',
+       r'\sisetup{detect-all}',
+       r'\usepackage{helvet}',
+       r'\usepackage{sansmath}',
+       r'\sansmath'
+]
+
+plt.close('all')
+
+# Temporal parameters
+T = models.T             # Final Time
+N = int(T*10)            # points of the grid
+
+wR = 1.e9
+S = 40000                # patients
+fraction = 0.5           # control: x3 below this fraction of x3(0)
+
+kernels = models.therapy('radiotherapy', 1, wR=wR)
+print("Calculating nominal solution for wR=%f" % wR)
+sol = fbsm.FBSM_multilevel(kernels, N, T, convx=models.CONVX['radiotherapy'], verbose=False)
+
+pars, y0 = cohort.patients(1, S, y0spread=0.1, seed=0)
+kernelsCohort = models.therapy('radiotherapy', 1, wR=wR, **pars)
+
+print("Simulating %d patients" % S)
+start = time.time()
+summary = cohort.simulate(kernelsCohort, sol.Controls, T, y0, fraction=fraction)
+print("%.2f s" % (time.time() - start))
+
+q5, q50, q95 = summary.quantiles()
+print("x3(T): median %.1f, 90%% interval [%.1f, %.1f]" % (q50, q5, q95))
+reached, times = summary.controlled()
+print("Controlled: %.1f%% of the cohort, median time %.1f days" % (100*reached, times[1]))
+
+# plots
+
+bands = summary.bands()
+
+plt.figure(figsize=(5,3.5))
+plt.fill_between(summary.t, bands[0], bands[2], color='orange', alpha=0.3, label=r"\textsf{90\% band}")
+plt.plot(summary.t, bands[1], color='orange', linestyle='solid', linewidth=2.5, label=r"\textsf{median}")
+plt.plot(summary.t, summary.mean, color='black', linestyle='dashed', linewidth=1, label=r"\textsf{mean}")
+plt.legend(loc='best', fancybox=True, framealpha=0.25, fontsize=10)
+plt.xlim([0.,T])
+plt.yscale('log')
+plt.ylabel(r"Cancer cells $x_3$",fontsize=16)
+plt.xlabel(r"Time $t$",fontsize=16)
+plt.tight_layout()
+
+plt.show()
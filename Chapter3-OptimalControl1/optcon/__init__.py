@@ -0,0 +1,9 @@
+# Optimal Control 1: Cellular Level
+# Shared tools for the optCon scripts
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+from .symbolic import generate, Kernels
+from .models import therapy, parameters
@@ -0,0 +1,85 @@
+# Optimal Control 1: Cellular Level
+# Adaptive-step state and adjoint sweeps
+#
+# Error-controlled integration (scipy.integrate.solve_ivp) of the state
+# and adjoint systems, with the control interpolated piecewise linearly
+# between the points of the control grid (c_medio of the fixed-step
+# sweeps is the midpoint value of the same interpolant). The solution is
+# resampled onto the control grid, so these sweeps are a drop-in for the
+# fixed RK4 ones:
+#
+#     FBSM(kernels, N, sweeps=Adaptive(kernels))
+#
+# 'RK45' (Dormand-Prince) suits the non-stiff scenarios; 'Radau', 'BDF'
+# or 'LSODA' handle the stiff regime of cancer near the capacity K. The
+# backward sweep evaluates the state from the dense output of the last
+# forward sweep instead of interpolating the grid values.
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+import numpy as np
+from scipy.integrate import solve_ivp
+
+
+def _at(v, s, h):
+    # value at time s of the piecewise linear interpolant of the columns of v
+    i = min(max(int(s/h), 0), v.shape[1]-2)
+    w = s/h - i
+    return v[:,i]*(1.0 - w) + v[:,i+1]*w
+
+
+class Adaptive(object):
+
+    def __init__(self, kernels, method='RK45', rtol=1.e-6, atol=1.e-12):
+        self.kernels = kernels
+        self.method  = method
+        self.rtol    = rtol
+        self.atol    = atol
+        self.nfev    = 0       # RHS evaluations of all sweeps
+        self.count   = 0       # number of sweeps
+        self._dense  = None    # (state array, dense output) of the last forward sweep
+
+    def _solve(self, rhs, span, y0, t):
+        sol = solve_ivp(rhs, span, y0, method=self.method, t_eval=t,
+                        dense_output=True, rtol=self.rtol, atol=self.atol)
+        if not sol.success:
+            raise RuntimeError('adaptive sweep failed: %s' % sol.message)
+        self.nfev  += sol.nfev
+        self.count += 1
+        return sol
+
+    def forward(self, StateVar, Controls, h):
+        x = StateVar
+        c = Controls
+        model = self.kernels.model
+        t = h*np.arange(x.shape[1])
+
+        def rhs(s, y):
+            return model(y, s, _at(c, s, h))
+
+        sol = self._solve(rhs, (t[0], t[-1]), x[:,0], t)
+        x[:,1:] = sol.y[:,1:]
+        self._dense = (x, sol.sol)
+        return x
+
+    def backward(self, StateVar, Controls, l_vec, h):
+        x = StateVar
+        c = Controls
+        l = l_vec
+        glambda = self.kernels.glambda
+        t = h*np.arange(x.shape[1])
+
+        if self._dense is not None and self._dense[0] is x:
+            state = self._dense[1]
+        else:
+            def state(s):
+                return _at(x, s, h)
+
+        def rhs(s, y):
+            return glambda(state(s), s, _at(c, s, h), y)
+
+        sol = self._solve(rhs, (t[-1], t[0]), l[:,-1], t[::-1])
+        l[:,:-1] = sol.y[:,:0:-1]
+        return l
@@ -0,0 +1,152 @@
+# Optimal Control 1: Cellular Level
+# Reverse-mode gradient of the discretized objective
+#
+# The objective is discretized as in the FBSM, the trapezoidal rule of
+# L(x_i, u_i) with the states x_i of runge_forward, and differentiated
+# exactly with respect to the control values u_i by running the RK4 steps
+# backwards (discrete adjoint). Only the vector-Jacobian products w^T df/dx,
+# w^T df/du and the gradient of L are needed, and they are generated from
+# the state system and the cost (Kernels.vjp, Kernels.cost_gradient), so
+# no adjoint system has to be derived by hand.
+#
+# Memory is bounded by checkpointing: the forward pass keeps the state
+# every `stride` steps only. In the reverse pass each segment is recomputed
+# from its checkpoint, keeping the RK4 stages of that segment, and then
+# traversed backwards. Storage is about N/stride + 4*stride states
+# (stride ~ sqrt(N) by default), and the gradient costs two forward
+# sweeps plus four vector-Jacobian products per step.
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+import numpy as np
+from scipy.optimize import minimize
+
+from . import models, fbsm
+
+
+def _stages(model, x, c0, c1, h):
+    # RK4 stages of one step of runge_forward
+    cm = 0.5*(c0 + c1)
+    k1 = model( x,          0, c0 )
+    y2 = x + h*0.5*k1
+    k2 = model( y2,         0, cm )
+    y3 = x + h*0.5*k2
+    k3 = model( y3,         0, cm )
+    y4 = x + h*k3
+    k4 = model( y4,         0, c1 )
+    return (y2, y3, y4), x + h*(k1+2.0*k2+2.0*k3+k4)/6.0
+
+
+def gradient(kernels, Controls, h, y0=None, stride=None):
+    # J and dJ/dControls of the discretized problem, with the discrete
+    # adjoint dJ/dx_i (the costate on the grid, up to O(h))
+    if y0 is None:
+        y0 = models.Y0
+    model = kernels.model
+    vjp = kernels.vjp
+    n = kernels.n
+    c = Controls
+    N = c.shape[1]
+    if stride is None:
+        stride = int(np.ceil(np.sqrt(N)))
+    weights = np.full(N, h)
+    weights[[0, -1]] *= 0.5
+
+    # forward pass, objective and checkpoints
+    starts = np.arange(0, N-1, stride)
+    checkpoints = np.empty((len(starts), n) + np.shape(y0)[1:])
+    x = np.array(y0, dtype=float)
+    J = weights[0]*kernels.running_cost(x, c[:,0])
+    for i in range(N-1):
+        if i % stride == 0:
+            checkpoints[i//stride] = x
+        _, x = _stages(model, x, c[:,i], c[:,i+1], h)
+        J = J + weights[i+1]*kernels.running_cost(x, c[:,i+1])
+
+    # reverse pass, one segment at a time
+    grad = np.zeros_like(c)
+    adjoint = np.empty((n, N) + np.shape(x)[1:])
+    g = kernels.cost_gradient(x, c[:,-1])
+    a = weights[-1]*g[:n]
+    grad[:,-1] += weights[-1]*g[n:]
+    adjoint[:,-1] = a
+
+    for k in range(len(starts)-1, -1, -1):
+        i0 = starts[k]
+        i1 = min(i0 + stride, N-1)
+        xs = [checkpoints[k]]
+        ys = []
+        for i in range(i0, i1):
+            y, x = _stages(model, xs[-1], c[:,i], c[:,i+1], h)
+            xs.append(x)
+            ys.append(y)
+
+        for i in range(i1-1, i0-1, -1):
+            x = xs[i-i0]
+            y2, y3, y4 = ys[i-i0]
+            c0, c1 = c[:,i], c[:,i+1]
+            cm = 0.5*(c0 + c1)
+
+            d4 = vjp(y4, c1, h/6.0*a)
+            d3 = vjp(y3, cm, h/3.0*a + h*d4[:n])
+            d2 = vjp(y2, cm, h/3.0*a + 0.5*h*d3[:n])
+            d1 = vjp(x,  c0, h/6.0*a + 0.5*h*d2[:n])
+
+            g = kernels.cost_gradient(x, c0)
+            a = a + d1[:n] + d2[:n] + d3[:n] + d4[:n] + weights[i]*g[:n]
+            dm = d2[n:] + d3[n:]
+            grad[:,i]   += d1[n:] + 0.5*dm + weights[i]*g[n:]
+            grad[:,i+1] += d4[n:] + 0.5*dm
+            adjoint[:,i] = a
+
+    return J, grad, adjoint
+
+
+def optimize(kernels, N, T=models.T, y0=None, guess=None, tolerance=1.e-10,
+             maxIterations=500, stride=None, verbose=True):
+    # Direct minimization of the discretized objective over the control
+    # values (L-BFGS-B with the control bounds), gradients by gradient().
+    # guess: initial Controls on this grid, zero by default
+    if y0 is None:
+        y0 = models.Y0
+    t, h = fbsm.grid(T, N)
+    m = kernels.m
+    lower = kernels.project(np.full((m, N), -np.inf))
+    upper = kernels.project(np.full((m, N), np.inf))
+    width = np.where(np.isfinite(upper - lower), upper - lower, 1.0)
+    lo = np.where(np.isfinite(lower), 0.0, -np.inf)
+    hi = np.where(np.isfinite(upper), 1.0, np.inf)
+    lower = np.where(np.isfinite(lower), lower, 0.0)
+    Controls = np.zeros((m, N)) if guess is None else np.array(guess, dtype=float)
+    Controls = kernels.project(Controls)
+
+    # controls scaled to [0, 1] and objective to its initial value
+    J0 = gradient(kernels, Controls, h, y0, stride)[0]
+    scale = abs(J0) if J0 != 0 else 1.0
+    count = [0]
+
+    def f(z):
+        J, grad, _ = gradient(kernels, lower + width*z.reshape(m, N), h, y0, stride)
+        count[0] += 1
+        if verbose and count[0] % 10 == 0:
+            print("Gradient evaluation %d: J=%.8e" % (count[0], J))
+        return J/scale, (grad*width).ravel()/scale
+
+    result = minimize(f, ((Controls - lower)/width).ravel(), jac=True, method='L-BFGS-B',
+                      bounds=list(zip(lo.ravel(), hi.ravel())),
+                      options={'maxiter': maxIterations, 'ftol': tolerance, 'gtol': tolerance})
+    Controls = lower + width*result.x.reshape(m, N)
+
+    # error: largest component of the projected (scaled) gradient
+    z = result.x
+    error = np.abs(np.clip(z - result.jac, lo.ravel(), hi.ravel()) - z).max()
+
+    StateVar, _, _ = fbsm.initial(kernels, N, y0)
+    StateVar = fbsm.runge_forward(kernels.model, StateVar, Controls, h)
+    J, _, adjoint = gradient(kernels, Controls, h, y0, stride)
+    if verbose:
+        print("J=%.8e after %d iterations (%d gradients): %s"
+              % (J, result.nit, result.nfev, result.message))
+    return fbsm.Solution(t, StateVar, Controls, adjoint, result.nit, result.success, error)
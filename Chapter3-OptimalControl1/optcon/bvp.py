@@ -0,0 +1,167 @@
+# Optimal Control 1: Cellular Level
+# Multiple shooting for the state-adjoint boundary value problem
+#
+# With the control eliminated through the projected control law,
+# u = control_law(x, l), the optimality system is the two-point boundary
+# value problem
+#
+#     x' = f(x, u),   l' = g(x, u, l),   x(0) = y0,   l(T) = 0.
+#
+# The horizon is split into M segments. Unknowns are the values s_k of
+# (x, l) at the start of every segment, and the conditions are
+#
+#     x-part of s_0 = y0
+#     phi_k(s_k) - s_{k+1} = 0,   k = 0..M-2   (continuity)
+#     l-part of phi_{M-1}(s_{M-1}) = 0
+#
+# where phi_k is RK4 on the fine grid across segment k. The Jacobian is
+# block bidiagonal and is solved as a sparse system. Its blocks come from
+# finite differences, with the 2n+1 perturbed starts of all segments
+# integrated together as the columns of one array. The damped Newton
+# iteration converges quadratically near the solution, where the
+# FBSM only converges linearly. Away from switching points the projection
+# is smooth; at them it is only semismooth.
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import spsolve
+
+from . import models, fbsm
+
+
+def _hamiltonian(kernels, n):
+    # right-hand side of the state-adjoint system on the columns of z
+    model = kernels.model
+    glambda = kernels.glambda
+    control_law = kernels.control_law
+
+    def F(z):
+        x, l = z[:n], z[n:]
+        u = control_law(x, l)
+        return np.concatenate([model(x, 0, u), glambda(x, 0, u, l)])
+    return F
+
+
+def _propagate(F, z, h, steps, out=None):
+    # RK4 from the columns of z, column j for steps[j] steps; with out of
+    # shape (2n, B, max steps + 1) the trajectories are stored as well
+    z = z.copy()
+    if out is not None:
+        out[:,:,0] = z
+    for j in range(steps.max()):
+        k1 = F( z )
+        k2 = F( z+h*0.5*k1 )
+        k3 = F( z+h*0.5*k2 )
+        k4 = F( z+h*k3 )
+        z = np.where(j < steps, z + h*(k1+2.0*k2+2.0*k3+k4)/6.0, z)
+        if out is not None:
+            out[:,:,j+1] = z
+    return z
+
+
+def shooting(kernels, N, T=models.T, y0=None, segments=50, guess=None,
+             tolerance=1.e-10, maxIterations=30, verbose=True):
+    # guess: Solution on any grid, by default a coarse FBSM solve
+    # returns a Solution on the grid of N points; iterations are Newton
+    # iterations and error the final scaled residual (max norm)
+    if y0 is None:
+        y0 = models.Y0
+    y0 = np.asarray(y0, dtype=float)
+    n = kernels.n
+    t, h = fbsm.grid(T, N)
+    M = min(segments, N-1)
+    nodes = np.linspace(0, N-1, M+1).astype(int)
+    steps = np.diff(nodes)
+    F = _hamiltonian(kernels, n)
+
+    if guess is None:
+        guess = fbsm.FBSM(kernels, int(T)+1, T, y0, tolerance=1.e-3, verbose=False)
+    S = np.concatenate([fbsm.resample(guess.t, guess.StateVar, t[nodes[:-1]]),
+                        fbsm.resample(guess.t, guess.l_vec, t[nodes[:-1]])])
+    S[:n,0] = y0
+
+    def residual(S):
+        # trial steps of the damped iteration may leave the domain of the
+        # model (negative populations); their nan residuals are rejected
+        with np.errstate(invalid='ignore', over='ignore', divide='ignore'):
+            end = _propagate(F, S, h, steps)
+        R = np.empty_like(S)
+        R[:n,0] = S[:n,0] - y0
+        R[n:,0] = end[n:,-1]
+        R[:,1:] = end[:,:-1] - S[:,1:]
+        return R, end
+
+    # block structure: (2n x M) unknowns and residuals, stored column-major
+    # by segment; Jacobian rows of R[:,k+1] depend on S[:,k] and S[:,k+1]
+    dim = 2*n*M
+    index = np.arange(dim).reshape(M, 2*n).T
+
+    R, end = residual(S)
+    iteration = 0
+    error = np.inf
+    while True:
+        scale = np.abs(S).max(axis=1) + 1.e-300
+        error = np.abs(R/scale[:,None]).max()
+        if verbose:
+            print("Newton iteration %d: residual %.3e" % (iteration, error))
+        if not np.isfinite(error) or error < tolerance or iteration == maxIterations:
+            break
+        iteration += 1
+
+        # finite-difference blocks G_k = d phi_k / d s_k, all segments at once
+        eps = 1.e-7*np.maximum(np.abs(S), 1.e-3*scale[:,None])
+        Z = np.repeat(S[:,:,None], 2*n+1, axis=2)
+        for i in range(2*n):
+            Z[i,:,i+1] += eps[i]
+        E = _propagate(F, Z.reshape(2*n, -1), h, np.repeat(steps, 2*n+1)).reshape(2*n, M, 2*n+1)
+        G = (E[:,:,1:] - E[:,:,:1])/eps.T[None,:,:]
+
+        rows, cols, vals = [], [], []
+
+        def block(r, c, B):
+            rr, cc = np.meshgrid(r, c, indexing='ij')
+            rows.append(rr.ravel())
+            cols.append(cc.ravel())
+            vals.append(B.ravel())
+
+        block(index[:n,0], index[:n,0], np.eye(n))                  # x(0) = y0
+        block(index[n:,0], index[:,M-1], G[n:,M-1,:])               # l(T) = 0
+        for k in range(M-1):
+            block(index[:,k+1], index[:,k], G[:,k,:])
+            block(index[:,k+1], index[:,k+1], -np.eye(2*n))
+
+        # rows and columns scaled by the size of each variable
+        d = np.tile(scale, M)
+        J = sparse.csc_matrix((np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+                              shape=(dim, dim))
+        J = sparse.diags(1.0/d) @ J @ sparse.diags(d)
+        step = -spsolve(J, R.T.ravel()/d)*d
+        step = step.reshape(M, 2*n).T
+
+        # damped step: halve until the scaled residual decreases
+        lam = 1.0
+        for _ in range(20):
+            Snew = S + lam*step
+            Rnew, end = residual(Snew)
+            if np.abs(Rnew/scale[:,None]).max() < error:
+                break
+            lam *= 0.5
+        S, R = Snew, Rnew
+
+    converged = error < tolerance
+
+    # trajectories on the fine grid from the shooting nodes
+    out = np.empty((2*n, M, steps.max()+1))
+    _propagate(F, S, h, steps, out)
+    Z = np.empty((2*n, N))
+    for k in range(M):
+        Z[:,nodes[k]:nodes[k+1]+1] = out[:,k,:steps[k]+1]
+    StateVar, l_vec = Z[:n], Z[n:]
+    Controls = kernels.control_law(StateVar, l_vec)
+    if verbose:
+        print('Newton iterations:', iteration)
+    return fbsm.Solution(t, StateVar, Controls, l_vec, iteration, converged, error)
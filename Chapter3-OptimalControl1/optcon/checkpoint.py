@@ -0,0 +1,166 @@
+# Optimal Control 1: Cellular Level
+# FBSM with checkpointed state storage
+#
+# The FBSM keeps state and adjoint on the whole grid, twice (double
+# buffering), which limits the grid size or the number of samples of a
+# batch. Here only the controls are kept on the whole grid:
+#
+#   forward sweep   RK4 over the grid keeping the state every `stride`
+#                   points (checkpoints)
+#   backward sweep  segment by segment from the end: the states of the
+#                   segment are recomputed from its checkpoint, the adjoint
+#                   is integrated across it, and the relaxed control update
+#                   is computed there, while state and adjoint are at hand
+#
+# so that the state and adjoint storage is K checkpoints plus two
+# segment buffers, (K + 2*(stride+1)) columns, at the price of one more
+# forward integration per iteration. stride ~ sqrt(N/2) minimizes it;
+# when the budget allows the whole trajectory it is kept and nothing is
+# recomputed. Convergence is on the control change ('weak' in fbsm).
+#
+# A control law that depends on the whole horizon (robust.Robust in
+# 'worst' mode, kernels.horizon) would only see one segment here: its
+# sample costs are added up over the segments of the forward sweep and it
+# is reweighted once per iteration, as fbsm.FBSM does from the full state.
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+import numpy as np
+
+from . import models, fbsm
+
+
+def stride(N, column, budget=None):
+    # points per segment for a budget in bytes (None: the smallest
+    # storage); column is the size in bytes of one state column
+    full = N - 1
+    if budget is not None and 2*N*column <= budget:
+        return full
+    s = max(1, int(round(np.sqrt(full/2.0))))
+    if budget is not None and (int(np.ceil(full/float(s))) + 2*(s+1))*column > budget:
+        raise ValueError('%d bytes are not enough for N=%d; at least %d are needed'
+                         % (budget, N, (int(np.ceil(full/float(s))) + 2*(s+1))*column))
+    return s
+
+
+def FBSM_checkpointed(kernels, N, T=models.T, y0=None, convx=0.9, tolerance=0.0001,
+                      maxIterations=1000, guess=None, budget=None, trajectories=True,
+                      verbose=True):
+    # guess:        optional initial Controls on this grid
+    # budget:       bytes for state and adjoint storage, the smallest by default
+    # trajectories: compute state and adjoint of the final control; without
+    #               them the Solution has StateVar and l_vec set to None
+    if y0 is None:
+        y0 = models.Y0
+    t, h = fbsm.grid(T, N)
+    model = kernels.model
+    glambda = kernels.glambda
+    horizon = getattr(kernels, 'horizon', False)
+    control_law = kernels.law if horizon else kernels.control_law
+
+    x0, Controls0, _ = fbsm.initial(kernels, 2, y0)
+    x0 = x0[:,0]
+    shape = x0.shape
+    s = stride(N, 8*x0.size, budget)
+    starts = np.arange(0, N-1, s)
+    kept = s >= N-1
+
+    Controls = [np.zeros((kernels.m, N) + Controls0.shape[2:]), None]
+    if guess is not None:
+        Controls[0][:] = guess
+    Controls[1] = np.empty_like(Controls[0])
+    checkpoints = np.empty((len(starts),) + shape)
+    xs = np.empty((shape[0], s+1) + shape[1:])
+    ls = np.empty_like(xs)
+
+    def forward(c):
+        # checkpoints of the state under the controls c; returns the
+        # sample costs of the horizon for kernels.reweight, or None
+        if kept:
+            xs[:,0] = x0
+            fbsm.runge_forward(model, xs, c, h)
+            return kernels.state_costs(xs) if horizon else None
+        costs = 0.0 if horizon else None
+        x = x0.copy()
+        for k, i0 in enumerate(starts):
+            checkpoints[k] = x
+            i1 = min(i0 + s, N-1)
+            seg = xs[:,:i1-i0+1]
+            seg[:,0] = x
+            fbsm.runge_forward(model, seg, c[:,i0:i1+1], h)
+            if horizon:
+                costs = costs + kernels.state_costs(seg)
+            x = seg[:,-1].copy()
+        return costs
+
+    def backward(c, visit):
+        # adjoint segment by segment from the end; visit(i0, i1, x, l)
+        # receives state and adjoint on every segment
+        lT = np.zeros(shape)
+        for k in range(len(starts)-1, -1, -1):
+            i0 = starts[k]
+            i1 = min(i0 + s, N-1)
+            seg = xs[:,:i1-i0+1]
+            if not kept:
+                seg[:,0] = checkpoints[k]
+                fbsm.runge_forward(model, seg, c[:,i0:i1+1], h)
+            lseg = ls[:,:i1-i0+1]
+            lseg[:,-1] = lT
+            fbsm.runge_backward(glambda, seg, c[:,i0:i1+1], lseg, h)
+            lT = lseg[:,0].copy()
+            visit(i0, i1, seg, lseg)
+
+    def update(c, new):
+        # relaxed control update into new; returns the relative change
+        norms = [0.0, 0.0]
+
+        def visit(i0, i1, x, l):
+            # the first point of a segment is the last one of the previous
+            # segment and is updated there, except at t=0
+            j0 = i0 + 1 if i0 > 0 else 0
+            u = convx*c[:,j0:i1+1] + (1.0 - convx)*control_law(x[:,j0-i0:], l[:,j0-i0:])
+            new[:,j0:i1+1] = u
+            norms[0] += np.sum((u - c[:,j0:i1+1])**2)
+            norms[1] += np.sum(u**2)
+
+        backward(c, visit)
+        diff, size = np.sqrt(norms)
+        return diff/size if size > 0 else diff
+
+    iteration = 0
+    errorMax = np.inf
+    while True:
+        iteration += 1
+        costs = forward(Controls[0])
+        if horizon:
+            kernels.reweight(costs)
+        errorMax = update(Controls[0], Controls[1])
+        Controls.reverse()
+
+        if verbose and np.mod(iteration,10)==0:
+            print("Error at iteration " + str(iteration) + ":", errorMax)
+        if errorMax < tolerance:
+            if verbose:
+                print('Number of iterations until convergence:', iteration)
+            break
+        if iteration == maxIterations:
+            if verbose:
+                print('Failure in convergence.')
+            break
+
+    StateVar = l_vec = None
+    if trajectories:
+        StateVar = np.empty((shape[0], N) + shape[1:])
+        l_vec = np.empty_like(StateVar)
+
+        def store(i0, i1, x, l):
+            StateVar[:,i0:i1+1] = x
+            l_vec[:,i0:i1+1] = l
+
+        forward(Controls[0])
+        backward(Controls[0], store)
+
+    return fbsm.Solution(t, StateVar, Controls[0], l_vec, iteration,
+                         errorMax < tolerance, errorMax)
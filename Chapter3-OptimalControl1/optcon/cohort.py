@@ -0,0 +1,149 @@
+# Optimal Control 1: Cellular Level
+# Virtual cohort under a fixed treatment schedule
+#
+# A cohort of patients is a set of parameter arrays (one entry per
+# patient, as in optcon.robust) and optionally perturbed initial
+# conditions. The cohort is advanced with RK4 on the grid of the FBSM in
+# chunks of patients, keeping only the current state of a chunk, and the
+# statistics are accumulated on the fly:
+#
+#   x3 over time   mean, standard deviation and quantile bands at every
+#                  `every`-th grid point (histogram in log10 x3, merged
+#                  over chunks)
+#   x3(T)          exact quantiles (one value per patient is kept)
+#   time to control  first time x3 <= fraction*x3(0), inf if never
+#
+# so that memory is O(chunk*n + patients) instead of O(patients*N*n).
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+import numpy as np
+
+from . import models, fbsm, robust
+
+
+def patients(scenario=1, size=10000, spread=0.25, names=robust.UNCERTAIN,
+             y0spread=0.0, seed=None):
+    # parameters (log-normal about the scenario, see robust.sample) and
+    # (n, size) initial conditions of a cohort
+    rng = np.random.RandomState(seed)
+    pars = robust.sample(scenario, size, spread, names, seed=rng.randint(2**31))
+    y0 = np.asarray(models.Y0, dtype=float)[:,None]*np.exp(
+        y0spread*rng.standard_normal((len(models.Y0), size)))
+    return pars, y0
+
+
+class Summary(object):
+    # Streaming statistics of x3 over a cohort; add() merges one chunk
+
+    def __init__(self, t, every=10, bins=400, limits=(-4.0, 5.0)):
+        self.index  = np.arange(0, len(t), every)
+        if self.index[-1] != len(t) - 1:
+            self.index = np.append(self.index, len(t) - 1)
+        self.t      = t[self.index]
+        self.edges  = np.linspace(limits[0], limits[1], bins + 1)
+        self.count  = 0
+        self.sum    = np.zeros(len(self.index))
+        self.sum2   = np.zeros(len(self.index))
+        self.hist   = np.zeros((len(self.index), bins), dtype=np.int64)
+        self.final  = []
+        self.control = []
+
+    def record(self, k, x3):
+        # statistics of x3 (one value per patient of the chunk) at the
+        # k-th report time
+        self.sum[k] += np.sum(x3)
+        self.sum2[k] += np.sum(x3**2)
+        bins = len(self.edges) - 1
+        b = np.searchsorted(self.edges, np.log10(np.maximum(x3, 1.e-300)), side='right') - 1
+        self.hist[k] += np.bincount(np.clip(b, 0, bins - 1), minlength=bins)
+
+    def add(self, final, control):
+        # x3(T) and time to control of the patients of a chunk
+        self.count += len(final)
+        self.final.append(final)
+        self.control.append(control)
+
+    @property
+    def mean(self):
+        return self.sum/self.count
+
+    @property
+    def std(self):
+        return np.sqrt(np.maximum(self.sum2/self.count - self.mean**2, 0.0))
+
+    def bands(self, q=(0.05, 0.5, 0.95)):
+        # quantiles of x3 at the report times, (len(q), reports), exact up
+        # to the histogram bin width in log10 x3
+        cdf = np.cumsum(self.hist, axis=1)/float(self.count)
+        cdf = np.concatenate([np.zeros((len(self.t), 1)), cdf], axis=1)
+        out = np.empty((len(q), len(self.t)))
+        for k in range(len(self.t)):
+            # strictly increasing cdf for the interpolation
+            c, i = np.unique(cdf[k], return_index=True)
+            out[:,k] = 10.0**np.interp(q, c, self.edges[i])
+        return out
+
+    def quantiles(self, q=(0.05, 0.5, 0.95)):
+        # exact quantiles of x3(T)
+        return np.percentile(np.concatenate(self.final), 100.0*np.asarray(q))
+
+    def controlled(self, q=(0.05, 0.5, 0.95)):
+        # fraction of the cohort that reached control, and the quantiles
+        # of the time to control among them (nan if none did)
+        times = np.concatenate(self.control)
+        reached = times[np.isfinite(times)]
+        if len(reached) == 0:
+            return 0.0, np.full(len(q), np.nan)
+        return len(reached)/float(len(times)), np.percentile(reached, 100.0*np.asarray(q))
+
+
+def simulate(kernels, Controls, T=models.T, y0=None, fraction=0.5, chunk=8192,
+             every=10, bins=400, verbose=True):
+    # Statistics of the cohort of the kernels (bound with one axis of
+    # patients, see patients()) under the Controls on the grid of N points;
+    # y0 of shape (n,) or (n, patients)
+    if y0 is None:
+        y0 = models.Y0
+    if len(kernels.batch) != 1:
+        raise ValueError('kernels must be bound with one axis of patients')
+    S = kernels.batch[0]
+    c = np.asarray(Controls, dtype=float)
+    N = c.shape[1]
+    t, h = fbsm.grid(T, N)
+    y0 = np.broadcast_to(np.asarray(y0, dtype=float).reshape(kernels.n, -1), (kernels.n, S))
+    summary = Summary(t, every, bins)
+    report = np.full(N, -1)
+    report[summary.index] = np.arange(len(summary.index))
+
+    for s0 in range(0, S, chunk):
+        s1 = min(s0 + chunk, S)
+        pars = dict((k, v[s0:s1] if np.ndim(v) > 0 else v) for k, v in kernels.pars.items())
+        model = kernels.copy(pars).model
+        x = y0[:,s0:s1].copy()
+        level = fraction*x[2]
+        control = np.full(s1 - s0, np.inf)
+        for i in range(N):
+            if report[i] >= 0:
+                summary.record(report[i], x[2])
+            if i == N-1:
+                break
+            c_medio = 0.5*(c[:,i]+c[:,i+1])
+            k1 = model( x,          0, c[:,i] )
+            k2 = model( x+h*0.5*k1, 0, c_medio )
+            k3 = model( x+h*0.5*k2, 0, c_medio )
+            k4 = model( x+h*k3,     0, c[:,i+1] )
+            x1 = x + h*(k1+2.0*k2+2.0*k3+k4)/6.0
+
+            # first crossing of the control level, interpolated in the step
+            crossed = np.isinf(control) & (x1[2] <= level)
+            if crossed.any():
+                d0, d1 = x[2,crossed] - level[crossed], x1[2,crossed] - level[crossed]
+                control[crossed] = t[i] + h*np.clip(d0/(d0 - d1), 0.0, 1.0)
+            x = x1
+        summary.add(x[2].copy(), control)
+        if verbose:
+            print("Patients %d-%d of %d" % (s0 + 1, s1, S))
+    return summary
@@ -0,0 +1,336 @@
+# Optimal Control 1: Cellular Level
+# Forward-Backward Sweep Method (FBSM)
+#
+# Same sweeps as in the optCon scripts, with the time grid given as an
+# argument instead of module globals, plus mesh sequencing: the problem
+# is converged on a coarse grid and the solution interpolated to finer
+# grids as initial guess, so most iterations are done on cheap grids.
+#
+# Errors are relative changes in the discrete L2(0,T) norm,
+# ||new - old||/||new||, so that tolerances mean the same on every grid
+# and for variables of very different size (x1 ~ 1e-6, x3 ~ 1e3).
+#
+# Iterates are double buffered: each sweep writes into the buffer of the
+# previous iterate but one, and buffers are swapped instead of copied.
+# Convergence is either
+#   'strong'  control, state and adjoint changes (mean of the three)
+#   'weak'    control change only; state and adjoint are then updated in
+#             place, as the old iterates are not needed
+#
+# The objective and per-iteration timings are recorded when a
+# telemetry.Telemetry object is passed.
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+import time
+
+import numpy as np
+
+from . import models
+
+
+class Solution(object):
+    # Result of an FBSM run on the grid t
+
+    # levels: (N, iterations, control change) per grid of a multilevel run
+
+    def __init__(self, t, StateVar, Controls, l_vec, iterations=0,
+                 converged=False, error=np.inf):
+        self.t          = t
+        self.StateVar   = StateVar
+        self.Controls   = Controls
+        self.l_vec      = l_vec
+        self.iterations = iterations
+        self.converged  = converged
+        self.error      = error
+        self.levels     = []
+
+    @property
+    def h(self):
+        return self.t[1] - self.t[0]
+
+
+def grid(T, N):
+    # N points on [0, T] and the corresponding step
+    t = np.linspace(0, T, N)
+    return t, t[1] - t[0]
+
+
+def norm(v, h):
+    # discrete L2(0,T) norm
+    return np.sqrt(h)*np.linalg.norm(v)
+
+
+def integral(v, h):
+    # trapezoidal rule on the uniform grid, along the last axis
+    return h*(np.sum(v, axis=-1) - 0.5*(v[...,0] + v[...,-1]))
+
+
+def objective(kernels, StateVar, Controls, h):
+    # J = int L(x, u) dt of a control and its state, one value per sample
+    # for batched kernels
+    return integral(np.moveaxis(kernels.running_cost(StateVar, Controls), 0, -1), h)
+
+
+def relative(new, old, h):
+    # relative change in the discrete L2(0,T) norm
+    size = norm(new, h)
+    return norm(new-old, h)/size if size > 0 else norm(new-old, h)
+
+
+def _relative(new, old, work):
+    # relative() without temporaries; work is a scratch buffer at least as
+    # large as new, and h cancels out
+    d = work[:new.size]
+    np.subtract(new.ravel(), old.ravel(), out=d)
+    diff = np.sqrt(np.dot(d, d))
+    size = np.sqrt(np.dot(new.ravel(), new.ravel()))
+    return diff/size if size > 0 else diff
+
+
+def resample(t_old, v_old, t_new):
+    # piecewise linear interpolation of v_old (time along axis 1) onto t_new
+    i = np.clip(np.searchsorted(t_old, t_new) - 1, 0, len(t_old)-2)
+    w = (t_new - t_old[i])/(t_old[i+1] - t_old[i])
+    w = w.reshape(w.shape + (1,)*(v_old.ndim-2))
+    return v_old[:,i]*(1.0 - w) + v_old[:,i+1]*w
+
+
+def runge_forward(model, StateVar, Controls, h):
+    x = StateVar
+    c = Controls
+    N = x.shape[1]
+
+    for i in range(N-1):
+        c_medio = 0.5*(c[:,i]+c[:,i+1])
+
+        k1 = model( x[:,i],          i, c[:,i] )
+        k2 = model( x[:,i]+h*0.5*k1, i+0.5*h, c_medio)
+        k3 = model( x[:,i]+h*0.5*k2, i+0.5*h, c_medio)
+        k4 = model( x[:,i]+h*k3,     i+h, c[:,i+1])
+
+        x[:,i+1] = x[:,i] + h*(k1+2.0*k2+2.0*k3+k4)/6.0
+    return x
+
+
+def runge_backward(glambda, StateVar, Controls, l_vec, h):
+    x = StateVar
+    c = Controls
+    l = l_vec
+    N = x.shape[1]
+
+    for i in range(N-1,0,-1):
+        c_medio = 0.5*( c[:,i]+c[:,i-1] )
+        x_medio = 0.5*( x[:,i]+x[:,i-1] )
+
+        k1 = glambda( x[:,i],   i, c[:,i], l[:,i])
+        k2 = glambda( x_medio,  i-0.5*h, c_medio, l[:,i]-h*0.5*k1)
+        k3 = glambda( x_medio,  i-0.5*h, c_medio, l[:,i]-h*0.5*k2)
+        k4 = glambda( x[:,i-1], i-h,  c[:,i-1], l[:,i]-h*k3)
+
+        l[:,i-1] = l[:,i] - h*(k1+2.0*k2+2.0*k3+k4)/6.0
+    return l
+
+
+class Serial(object):
+    # Default sweeps: RK4 over the whole grid, in place.
+    # Other sweep strategies (e.g. optcon.parareal.Parareal) provide the
+    # same two methods and are passed to FBSM as `sweeps`.
+
+    def __init__(self, kernels):
+        self.kernels = kernels
+        self.nfev    = 0       # RHS evaluations of all sweeps
+        self.count   = 0       # number of sweeps
+
+    def forward(self, StateVar, Controls, h):
+        self.nfev  += 4*(StateVar.shape[1]-1)
+        self.count += 1
+        return runge_forward(self.kernels.model, StateVar, Controls, h)
+
+    def backward(self, StateVar, Controls, l_vec, h):
+        self.nfev  += 4*(StateVar.shape[1]-1)
+        self.count += 1
+        return runge_backward(self.kernels.glambda, StateVar, Controls, l_vec, h)
+
+
+def initial(kernels, N, y0=None):
+    # zero control, state at y0, adjoint with terminal condition l(T) = 0
+    if y0 is None:
+        y0 = models.Y0
+    # batched kernels (array parameters) add trailing sample axes
+    Controls0 = np.zeros((kernels.m, N) + kernels.controlBatch)
+    StateVar0 = np.zeros((kernels.n, N) + kernels.batch)
+    np.moveaxis(StateVar0[:,0], 0, -1)[...] = y0
+    l_vec0 = np.zeros_like(StateVar0)
+    return StateVar0, Controls0, l_vec0
+
+
+def FBSM(kernels, N, T=models.T, y0=None, convx=0.9, tolerance=0.0001,
+         maxIterations=1000, guess=None, convergence='strong', sweeps=None,
+         verbose=True, telemetry=None):
+    # guess:     optional (StateVar, Controls, l_vec) on this grid
+    # sweeps:    forward/backward sweep strategy, Serial(kernels) by default
+    # telemetry: optional telemetry.Telemetry recording every iteration
+    if convergence not in ('strong', 'weak'):
+        raise ValueError("convergence must be 'strong' or 'weak', not %r" % (convergence,))
+    strong = convergence == 'strong'
+    if sweeps is None:
+        sweeps = Serial(kernels)
+    t, h = grid(T, N)
+
+    if guess is None:
+        StateVar0, Controls0, l_vec0 = initial(kernels, N, y0)
+    else:
+        StateVar0, Controls0, l_vec0 = [np.array(v, dtype=float) for v in guess]
+        if y0 is not None:
+            np.moveaxis(StateVar0[:,0], 0, -1)[...] = y0
+        l_vec0[:,-1] = 0.0
+
+    # iteration buffers [current, next]
+    Controls = [Controls0, np.empty_like(Controls0)]
+    if strong:
+        StateVar = [StateVar0, np.empty_like(StateVar0)]
+        l_vec    = [l_vec0, np.empty_like(l_vec0)]
+        StateVar[1][:,0] = StateVar0[:,0]
+        l_vec[1][:,-1]   = 0.0
+    else:
+        StateVar = [StateVar0, StateVar0]
+        l_vec    = [l_vec0, l_vec0]
+    work = np.empty(max(StateVar0.size, Controls0.size))
+
+    test      = -1
+    iteration = 0
+    errorMax  = np.inf
+
+    while(test<0):
+        iteration += 1
+        if telemetry is not None:
+            telemetry.begin(sweeps)
+
+        # Forward State System
+        start = time.time()
+        sweeps.forward(StateVar[1], Controls[0], h)
+        tForward = time.time() - start
+
+        # Backward Adjoint System
+        start = time.time()
+        sweeps.backward(StateVar[1], Controls[0], l_vec[1], h)
+        tBackward = time.time() - start
+
+        # Control Update
+        start = time.time()
+        np.multiply(Controls[0], convx, out=Controls[1])
+        Controls[1] += (1.0 - convx)*kernels.control_law(StateVar[1], l_vec[1])
+        tUpdate = time.time() - start
+
+        # Convergence Criteria
+        errorControl = _relative(Controls[1], Controls[0], work)
+        errorState = errorL = None
+        errorMax = errorControl
+        if strong:
+            errorState = _relative(StateVar[1], StateVar[0], work)
+            errorL     = _relative(l_vec[1], l_vec[0], work)
+            errorMax   = (errorMax+errorState+errorL)/3.
+
+        if telemetry is not None:
+            telemetry.end(sweeps, N=N, iteration=iteration,
+                          objective=np.sum(objective(kernels, StateVar[1], Controls[0], h)),
+                          control=errorControl, state=errorState, adjoint=errorL,
+                          error=errorMax, forward=tForward, backward=tBackward,
+                          update=tUpdate)
+
+        Controls.reverse()
+        StateVar.reverse()
+        l_vec.reverse()
+
+        # progress numerics
+        if verbose and np.mod(iteration,10)==0:
+            print("Error at iteration " + str(iteration) + ":", errorMax)
+        if errorMax < tolerance:
+            test = 1
+            if verbose:
+                print('Number of iterations until convergence:', iteration)
+        elif iteration == maxIterations:
+            test = 1
+            if verbose:
+                print('Failure in convergence.')
+
+    return Solution(t, StateVar[0], Controls[0], l_vec[0], iteration,
+                    errorMax < tolerance, errorMax)
+
+
+def levels(N, coarsest, factor=4):
+    # grid sizes from about coarsest to N, each `factor` times finer
+    sizes = [N]
+    while (sizes[-1]-1)//factor + 1 > coarsest:
+        sizes.append((sizes[-1]-1)//factor + 1)
+    return sizes[::-1]
+
+
+def FBSM_multilevel(kernels, N, T=models.T, y0=None, convx=0.9,
+                    tolerance=0.0001, meshTolerance=None, maxIterations=1000,
+                    coarsest=None, factor=4, convergence='strong', sweeps=None,
+                    verbose=True, telemetry=None):
+    # Mesh-sequenced FBSM: converges on a coarse grid, interpolates state,
+    # adjoint and control to the next grid and continues from there.
+    # Refinement stops once the control changes less than meshTolerance
+    # between consecutive grids; on the remaining grids up to N the control
+    # is only interpolated and one forward and one backward sweep make
+    # state and adjoint consistent with it.
+    if meshTolerance is None:
+        meshTolerance = 10.0*tolerance
+
+    # by default the coarsest grid has a step of about one day
+    if coarsest is None:
+        coarsest = int(T) + 1
+    sizes = levels(N, coarsest, factor)
+    if sweeps is None:
+        sweeps = Serial(kernels)
+    solution = None
+    settled = False
+
+    for n in sizes:
+        t, h = grid(T, n)
+
+        if solution is None:
+            guess = None
+        else:
+            guess = [resample(solution.t, v, t) for v in
+                     (solution.StateVar, solution.Controls, solution.l_vec)]
+
+        if settled:
+            # state and adjoint consistent with the interpolated control
+            StateVar0, Controls0, l_vec0 = guess
+            StateVar0 = sweeps.forward(StateVar0, Controls0, h)
+            l_vec0 = sweeps.backward(StateVar0, Controls0, l_vec0, h)
+            new = Solution(t, StateVar0, Controls0, l_vec0, 0, solution.converged,
+                           solution.error)
+            new.levels = solution.levels + [(n, 0, 0.0)]
+            new.iterations = solution.iterations
+            solution = new
+            continue
+
+        if verbose:
+            print("Level N=%d" % n)
+
+        new = FBSM(kernels, n, T, y0, convx, tolerance, maxIterations, guess,
+                   convergence, sweeps, verbose, telemetry)
+
+        change = np.inf
+        if solution is not None:
+            change = relative(new.Controls, guess[1], h)
+            if verbose:
+                print("Control change from previous level:", change)
+
+        new.levels = (solution.levels if solution is not None else []) + [(n, new.iterations, change)]
+        if solution is not None:
+            new.iterations += solution.iterations
+        solution = new
+
+        # a level stopped at maxIterations is no reason to stop refining
+        if change < meshTolerance and new.converged:
+            settled = True
+
+    return solution
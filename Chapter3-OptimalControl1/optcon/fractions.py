@@ -0,0 +1,234 @@
+# Optimal Control 1: Cellular Level
+# Discrete dose-fraction schedules for radiotherapy
+#
+# Radiotherapy acts on every population as an extra death rate,
+# x_i' = ... - k_i*uR*x_i. A fraction delivering the dose d in a short
+# time is then an exact jump of the state,
+#
+#     x_i <- x_i*exp(-k_i*d)
+#
+# with no treatment in between. The simulator below integrates a batch of
+# schedules at once (RK4 on the columns of a (3, B) state) and the
+# optimizer searches fraction days and doses with a genetic algorithm whose
+# population is evaluated in chunks by a process pool.
+#
+# Schedules are (days, doses) arrays with one row per schedule:
+#   days     days of the fractions (whole days), 0 <= day < T
+#   doses    dose of each fraction, 0 <= dose <= maxDose
+# subject to sum(doses) <= totalDose and consecutive fractions at least
+# minGap days apart.
+#
+# The objective is the one of the continuous problem, int x3^2 dt plus
+# the wR*uR^2 cost of each fraction delivered at the rate dose/duration.
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+import multiprocessing
+
+import numpy as np
+import sympy as sp
+
+from . import models, fbsm
+
+
+def jumps(kernels, control='uR'):
+    # k_i of the jump x_i <- x_i*exp(-k_i*d) produced by a dose d
+    u = sp.Symbol(control)
+    if u not in kernels.controls:
+        raise ValueError('%s is not a control of the model' % control)
+    pars = dict((sp.Symbol(k), v) for k, v in kernels.pars.items())
+    k = []
+    for x, f in zip(kernels.states, kernels.rhs):
+        rate = sp.simplify(-sp.diff(f, u)/x)
+        if rate.free_symbols & (set(kernels.states) | set(kernels.controls)):
+            raise ValueError('%s does not act as a death rate on %s' % (control, x))
+        k.append(float(rate.subs(pars)))
+    return np.array(k)
+
+
+def simulate(kernels, days, doses, T=models.T, N=int(models.T*10), y0=None,
+             duration=1.0, control='uR', trajectories=False):
+    # objective of a batch of schedules, days and doses of shape (B, n);
+    # with trajectories=True the (B, 3, N) states are returned as well
+    days = np.atleast_2d(days)
+    doses = np.atleast_2d(doses)
+    B = len(days)
+    t, h = fbsm.grid(T, N)
+    k = jumps(kernels, control)[:,None]
+    model = kernels.model
+    cost = kernels.running_cost
+    m = kernels.controls.index(sp.Symbol(control))
+
+    # dose delivered at every grid point
+    E = np.zeros((B, N))
+    index = np.minimum(np.rint(days/h).astype(int), N-2)
+    np.add.at(E, (np.repeat(np.arange(B), days.shape[1]), index.ravel()), doses.ravel())
+    pulses = set(np.flatnonzero(E.any(axis=0)))
+
+    x = np.empty((len(kernels.states), B))
+    x[:] = np.asarray(models.Y0 if y0 is None else y0, dtype=float)[:,None]
+    c = np.zeros((len(kernels.controls), B))
+    rate = np.zeros_like(c)
+    J = np.zeros(B)
+    X = np.empty((B, x.shape[0], N)) if trajectories else None
+
+    for j in range(N):
+        if j in pulses:
+            # fraction cost at the delivery rate, then the jump
+            rate[m] = E[:,j]/duration
+            J += duration*(cost(x, rate) - cost(x, c))
+            x = x*np.exp(-k*E[:,j])
+        L = cost(x, c)
+        J += (0.5 if j in (0, N-1) else 1.0)*h*L
+        if trajectories:
+            X[:,:,j] = x.T
+        if j == N-1:
+            break
+        k1 = model( x,          0, c )
+        k2 = model( x+h*0.5*k1, 0, c )
+        k3 = model( x+h*0.5*k2, 0, c )
+        k4 = model( x+h*k3,     0, c )
+        x = x + h*(k1+2.0*k2+2.0*k3+k4)/6.0
+
+    if trajectories:
+        return J, X
+    return J
+
+
+def repair(days, doses, T, totalDose, maxDose, minGap=1.0):
+    # nearest feasible schedules: sorted days at least minGap apart inside
+    # [0, T), doses clipped to maxDose and scaled down to totalDose
+    days = np.rint(np.atleast_2d(np.asarray(days, dtype=float)))
+    doses = np.atleast_2d(np.asarray(doses, dtype=float))
+    n = days.shape[1]
+    order = np.argsort(days, axis=1)
+    days = np.take_along_axis(days, order, axis=1)
+    doses = np.take_along_axis(doses, order, axis=1)
+
+    offset = minGap*np.arange(n)
+    last = np.floor(T) - 1.0
+    days = np.maximum.accumulate(np.maximum(days, 0.0) - offset, axis=1) + offset
+    days = np.minimum.accumulate((np.minimum(days, last - offset[::-1]) + offset[::-1])[:,::-1],
+                                 axis=1)[:,::-1] - offset[::-1]
+
+    doses = np.clip(doses, 0.0, maxDose)
+    total = doses.sum(axis=1)
+    scale = np.where(total > totalDose, totalDose/np.maximum(total, 1.e-300), 1.0)
+    return days, doses*scale[:,None]
+
+
+def quantize(t, u, fractions):
+    # schedule of equal fractions following a continuous control u(t): the
+    # k-th fraction is given when the cumulative dose int u dt reaches the
+    # middle of its share of the total
+    h = t[1] - t[0]
+    dose = np.concatenate([[0.0], np.cumsum(0.5*h*(u[1:] + u[:-1]))])
+    share = dose[-1]/fractions
+    days = np.interp(share*(np.arange(fractions) + 0.5), dose, t)
+    return np.floor(days)[None,:], np.full((1, fractions), share)
+
+
+_kernels = None
+_options = None
+
+
+def _init(kernels, options):
+    # worker initializer: kernels are sent once per process
+    global _kernels, _options
+    _kernels = kernels
+    _options = options
+
+
+def _evaluate(task):
+    days, doses = task
+    return simulate(_kernels, days, doses, **_options)
+
+
+def optimize(kernels, fractions, totalDose, T=models.T, N=int(models.T*10),
+             y0=None, minGap=1.0, maxDose=None, duration=1.0, population=64,
+             generations=50, mutation=0.2, elite=2, guess=None, processes=None,
+             seed=None, verbose=True):
+    # Genetic search of a schedule of `fractions` fractions.
+    # maxDose: largest dose of a fraction, by default uRMax*duration, the
+    #          dose of the continuous control at its bound
+    # guess:   (days, doses) of schedules seeded into the initial population,
+    #          e.g. quantize() of a continuous optimal control
+    # returns (days, doses, J) of the best schedule found
+    if fractions*minGap > np.floor(T):
+        raise ValueError('%d fractions %g days apart do not fit in [0, %g)'
+                         % (fractions, minGap, T))
+    if maxDose is None:
+        maxDose = kernels.pars['uRMax']*duration
+    rng = np.random.RandomState(seed)
+    options = {'T': T, 'N': N, 'y0': y0, 'duration': duration}
+    processes = processes or multiprocessing.cpu_count()
+
+    def feasible(days, doses):
+        return repair(days, doses, T, totalDose, maxDose, minGap)
+
+    # initial population: evenly spaced equal fractions plus random schedules
+    days = rng.uniform(0, T, (population, fractions))
+    doses = rng.uniform(0, maxDose, (population, fractions))
+    days[0] = minGap*np.arange(fractions)
+    doses[0] = min(maxDose, totalDose/fractions)
+    days[1] = np.linspace(0, T-1, fractions)
+    doses[1] = doses[0]
+    if guess is not None:
+        seeds = np.atleast_2d(guess[0])
+        days[2:2+len(seeds)] = seeds[:population-2]
+        doses[2:2+len(seeds)] = np.atleast_2d(guess[1])[:population-2]
+    days, doses = feasible(days, doses)
+
+    pool = None
+    if processes > 1:
+        pool = multiprocessing.Pool(processes, _init, (kernels, options))
+    else:
+        _init(kernels, options)
+
+    def evaluate(days, doses):
+        chunks = np.array_split(np.arange(len(days)), min(processes, len(days)))
+        tasks = [(days[i], doses[i]) for i in chunks]
+        if pool is None:
+            return np.concatenate([_evaluate(task) for task in tasks])
+        return np.concatenate(pool.map(_evaluate, tasks))
+
+    try:
+        J = evaluate(days, doses)
+        for generation in range(generations):
+            best = np.argsort(J)
+            if verbose:
+                print("Generation %d: best J=%.6e" % (generation, J[best[0]]))
+
+            # tournament selection and uniform crossover of (day, dose) pairs
+            a = rng.randint(population, size=(2, population))
+            b = rng.randint(population, size=(2, population))
+            pa = np.where(J[a[0]] < J[a[1]], a[0], a[1])
+            pb = np.where(J[b[0]] < J[b[1]], b[0], b[1])
+            mask = rng.rand(population, fractions) < 0.5
+            newDays = np.where(mask, days[pa], days[pb])
+            newDoses = np.where(mask, doses[pa], doses[pb])
+
+            # mutation: shift days and perturb doses
+            mask = rng.rand(population, fractions) < mutation
+            newDays += mask*rng.normal(0, 0.05*T, (population, fractions))
+            mask = rng.rand(population, fractions) < mutation
+            newDoses += mask*rng.normal(0, 0.2*maxDose, (population, fractions))
+            newDays, newDoses = feasible(newDays, newDoses)
+
+            newDays[:elite] = days[best[:elite]]
+            newDoses[:elite] = doses[best[:elite]]
+            newJ = np.empty(population)
+            newJ[:elite] = J[best[:elite]]
+            newJ[elite:] = evaluate(newDays[elite:], newDoses[elite:])
+            days, doses, J = newDays, newDoses, newJ
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    best = np.argmin(J)
+    if verbose:
+        print("Best schedule: J=%.6e, total dose %.4f" % (J[best], doses[best].sum()))
+    return days[best], doses[best], J[best]
@@ -0,0 +1,111 @@
+# Optimal Control 1: Cellular Level
+# Bone metastasis model under denosumab, radiotherapy and mixed therapy
+#
+# Parameters, scenarios and initial condition are the ones of the
+# optCon scripts 01-11. Kernels are generated symbolically once per
+# therapy and cached; numeric values are bound afterwards.
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+from . import symbolic
+
+# ODE parameters
+BASE = {
+    'a1': 0.5,
+    'a2': 0.05,
+    'b1': 0.2,
+    'b2': 0.02,
+    'g1': -0.3,
+    'g2': 0.7,
+    'K' : 1.0e4,
+    'u1': 1.0,
+    'u2': 1.0,
+}
+
+SCENARIOS = {
+    1: {'a3': 1.5e-2, 'b3': 0.0, 'c1': 1.e-6, 'c2': 0.0, 'c3': 1.0e-3, 'c4': 0.0},
+    2: {'a3': 1.0e-4, 'b3': 0.0, 'c1': 1.e-6, 'c2': 0.0, 'c3': 1.0e-3, 'c4': 0.0},
+    3: {'a3': 1.0e-4, 'b3': 0.0, 'c1': 0.0,   'c2': 0.0, 'c3': 1.0e-8, 'c4': -1.0e-4},
+}
+
+# Control bounds
+uDMax = 0.6
+uRMax = 0.05
+
+# Temporal parameters
+T = 250.
+
+# Initial condition
+Y0 = [4.42e-06, 4.46, 1000.0]
+
+# Relaxation of the control update used by each therapy
+CONVX = {'denosumab': 0.95, 'radiotherapy': 0.9, 'mixed': 0.9}
+
+# Weights of the experiments in the optCon scripts
+WEIGHTS = {
+    'denosumab':    [{'wD': 1.0e6}, {'wD': 1.0e7}, {'wD': 1.0e8}],
+    'radiotherapy': [{'wR': 1.0e9}, {'wR': 1.0e10}, {'wR': 1.0e11}],
+    'mixed':        [{'wD': 1.0e6, 'wR': 1.0e10}, {'wD': 1.0e7, 'wR': 1.0e11}],
+}
+
+STATES = ['x1', 'x2', 'x3']
+
+# State system: denosumab (uD) blocks osteoclast formation, radiotherapy
+# (uR) kills every cell population
+RHS = {
+    'denosumab': [
+        'a1*x1*x2**g1*(1.0-uD) - b1*x1 + c1*x1*x3',
+        'a2*x1**g2*x2 - b2*x2 + c2*x2*x3',
+        'a3*x3*(1.0 - x3/K) - b3*x3 + c3*x1**g2*x3 + c4*x2**g1*x3'],
+    'radiotherapy': [
+        'a1*x1*x2**g1 - (b1+u1*uR)*x1 + c1*x1*x3',
+        'a2*x1**g2*x2 - (b2+u2*uR)*x2 + c2*x2*x3',
+        'a3*x3*(1.0 - x3/K) - (b3+uR)*x3 + c3*x1**g2*x3 + c4*x2**g1*x3'],
+    'mixed': [
+        'a1*x1*x2**g1*(1.0-uD) - (b1+u1*uR)*x1 + c1*x1*x3',
+        'a2*x1**g2*x2 - (b2+u2*uR)*x2 + c2*x2*x3',
+        'a3*x3*(1.0 - x3/K) - (b3+uR)*x3 + c3*x1**g2*x3 + c4*x2**g1*x3'],
+}
+
+CONTROLS = {
+    'denosumab':    ['uD'],
+    'radiotherapy': ['uR'],
+    'mixed':        ['uD', 'uR'],
+}
+
+# Running cost: cancer burden plus quadratic treatment cost
+COST = {
+    'denosumab':    'x3**2 + wD*uD**2',
+    'radiotherapy': 'x3**2 + wR*uR**2',
+    'mixed':        'x3**2 + wD*uD**2 + wR*uR**2',
+}
+
+BOUNDS = {
+    'denosumab':    [(0.0, 'uDMax')],
+    'radiotherapy': [(0.0, 'uRMax')],
+    'mixed':        [(0.0, 'uDMax'), (0.0, 'uRMax')],
+}
+
+_cache = {}
+
+
+def parameters(scenario=1, **kwargs):
+    # Full parameter set of a scenario; keyword arguments override values
+    pars = dict(BASE)
+    pars.update(SCENARIOS[scenario])
+    pars.update({'uDMax': uDMax, 'uRMax': uRMax})
+    pars.update(kwargs)
+    return pars
+
+
+def therapy(name, scenario=1, **kwargs):
+    # Kernels of a therapy bound to the parameters of a scenario
+    if name not in _cache:
+        _cache[name] = symbolic.generate(STATES, CONTROLS[name], RHS[name],
+                                         COST[name], BOUNDS[name])
+    kernels = _cache[name]
+    names = set(str(p) for p in kernels.parameters)
+    pars = dict((k, v) for k, v in parameters(scenario, **kwargs).items() if k in names)
+    return kernels.copy(pars)
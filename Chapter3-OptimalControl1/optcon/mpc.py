@@ -0,0 +1,119 @@
+# Optimal Control 1: Cellular Level
+# Receding-horizon (model predictive) control
+#
+# Every `replan` days the state is measured, the optimal control problem
+# is solved on the window [t, min(t + horizon, T)] from that state, and
+# the first `replan` days of the plan are applied to the plant. With
+# horizon >= T the window shrinks towards T (shrinking-horizon control).
+#
+# Re-solves are warm started: the previous plan (state, control and
+# adjoint) is shifted to the new window, the part beyond the old window
+# held at its last value, and the measured state is imposed at the start.
+# Between close measurements the plan changes little, so
+#   'fbsm'      needs few sweeps on the window grid,
+#   'shooting'  needs one or two Newton iterations (optcon.bvp).
+#
+# The plant may have parameters other than the model used for planning
+# (kernels for the plant bound with other values), and measurements may
+# carry relative (log-normal) noise.
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+import time
+
+import numpy as np
+
+from . import models, fbsm, bvp
+
+
+class MPC(object):
+
+    def __init__(self, kernels, horizon=models.T, replan=10.0, T=models.T, h=1.0,
+                 method='fbsm', plant=None, noise=0.0, seed=None, **options):
+        # h:       step of the planning grid (days)
+        # method:  'fbsm' or 'shooting'
+        # plant:   kernels simulating the true system, the model by default
+        # options: passed to fbsm.FBSM (convx, tolerance, maxIterations...)
+        #          or bvp.shooting (segments, tolerance...)
+        if method not in ('fbsm', 'shooting'):
+            raise ValueError("method must be 'fbsm' or 'shooting', not %r" % (method,))
+        self.kernels = kernels
+        self.horizon = horizon
+        self.replan  = replan
+        self.T       = T
+        self.h       = h
+        self.method  = method
+        self.plant   = plant if plant is not None else kernels
+        self.noise   = noise
+        self.options = options
+        self.rng     = np.random.RandomState(seed)
+        self.plan    = None    # last solution, times relative to self.start
+        self.start   = 0.0
+        self.log     = []      # (time, iterations, seconds) of every solve
+
+    def _window(self, t0):
+        t1 = min(t0 + self.horizon, self.T)
+        N = max(int(np.ceil((t1 - t0)/self.h - 1.e-9)), 1) + 1
+        return t1 - t0, N
+
+    def _guess(self, t0, length, N, x0):
+        # previous plan shifted to the window [t0, t0 + length]
+        t = np.linspace(0, length, N)
+        s = np.minimum(t + t0 - self.start, self.plan.t[-1])
+        guess = [fbsm.resample(self.plan.t, v, s) for v in
+                 (self.plan.StateVar, self.plan.Controls, self.plan.l_vec)]
+        guess[0][:,0] = x0
+        guess[2][:,-1] = 0.0
+        return t, guess
+
+    def solve(self, t0, x0):
+        # plan from the measured state x0 at time t0; returns the Solution
+        # with times relative to t0
+        length, N = self._window(t0)
+        start = time.time()
+        if self.method == 'fbsm':
+            guess = None
+            if self.plan is not None:
+                _, guess = self._guess(t0, length, N, x0)
+            options = dict(self.options, verbose=False)
+            sol = fbsm.FBSM(self.kernels, N, length, x0, guess=guess, **options)
+        else:
+            guess = None
+            if self.plan is not None:
+                t, (StateVar, Controls, l_vec) = self._guess(t0, length, N, x0)
+                guess = fbsm.Solution(t, StateVar, Controls, l_vec)
+            options = dict(self.options, verbose=False)
+            options.setdefault('segments', max(1, min(50, N-1)))
+            sol = bvp.shooting(self.kernels, N, length, x0, guess=guess, **options)
+        self.log.append((t0, sol.iterations, time.time() - start))
+        self.plan = sol
+        self.start = t0
+        return sol
+
+    def measure(self, x):
+        if self.noise > 0:
+            return x*np.exp(self.noise*self.rng.standard_normal(x.shape))
+        return x.copy()
+
+    def run(self, y0=None, dt=0.1):
+        # closed loop on [0, T]; the plant is integrated with RK4 of step
+        # about dt. Returns the time grid, plant state and applied control.
+        if y0 is None:
+            y0 = models.Y0
+        t, dt = fbsm.grid(self.T, int(round(self.T/dt)) + 1)
+        StateVar = np.zeros((self.plant.n, len(t)))
+        Controls = np.zeros((self.plant.m, len(t)))
+        StateVar[:,0] = y0
+        self.plan = None
+
+        times = np.append(np.arange(0.0, self.T, self.replan), self.T)
+        for t0, t1 in zip(times[:-1], times[1:]):
+            i = int(round(t0/dt))
+            j = int(round(t1/dt))
+            sol = self.solve(t[i], self.measure(StateVar[:,i]))
+            Controls[:,i:j+1] = fbsm.resample(sol.t, sol.Controls, t[i:j+1] - t[i])
+            StateVar[:,i:j+1] = fbsm.runge_forward(self.plant.model, StateVar[:,i:j+1],
+                                                   Controls[:,i:j+1], dt)
+        return t, StateVar, Controls
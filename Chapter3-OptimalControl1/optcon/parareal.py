@@ -0,0 +1,210 @@
+# Optimal Control 1: Cellular Level
+# Parallel-in-time (parareal) state and adjoint sweeps
+#
+# The grid is split into P time slices. A coarse propagator G (RK4 with
+# steps of about a day) runs serially over the whole horizon, while the fine
+# propagator F (the RK4 of runge_forward/runge_backward on the fine grid)
+# runs on every slice at once in worker processes. Slice boundary values
+# are corrected with
+#
+#     U[k+1] <- G(U_new[k]) + F(U_old[k]) - G(U_old[k])
+#
+# until they change less than `tolerance` (relative). After P corrections
+# the result equals the serial sweep exactly, so there are never more
+# than P iterations; for smooth dynamics a handful suffice.
+#
+# Parareal is used through FBSM(..., sweeps=Parareal(kernels)).
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+import multiprocessing
+
+import numpy as np
+
+from . import fbsm
+
+_kernels = None
+
+
+def _init(kernels):
+    # worker initializer: kernels are sent once per process
+    global _kernels
+    _kernels = kernels
+
+
+def _fine_forward(task):
+    x0, c, h = task
+    x = np.empty((len(x0), c.shape[1]))
+    x[:,0] = x0
+    return fbsm.runge_forward(_kernels.model, x, c, h)
+
+
+def _fine_backward(task):
+    x, c, lT, h = task
+    l = np.empty_like(x)
+    l[:,-1] = lT
+    return fbsm.runge_backward(_kernels.glambda, x, c, l, h)
+
+
+def _at(v, s):
+    # columns of v at fractional indices s, linear interpolation
+    i = np.minimum(np.floor(s).astype(int), v.shape[1]-2)
+    w = s - i
+    return v[:,i]*(1.0 - w) + v[:,i+1]*w
+
+
+class Parareal(object):
+
+    def __init__(self, kernels, slices=None, processes=None, coarseStep=1.0,
+                 tolerance=1.e-10, maxIterations=None):
+        # slices:     number of time slices, by default the number of processes
+        # coarseStep: largest step of the coarse propagator (days); a whole
+        #             slice in one step is unstable for these dynamics
+        self.kernels       = kernels
+        self.processes     = processes or multiprocessing.cpu_count()
+        self.slices        = slices or self.processes
+        self.coarseStep    = coarseStep
+        self.tolerance     = tolerance
+        self.maxIterations = maxIterations or self.slices
+        self.iterations    = 0     # parareal iterations of all sweeps
+        self.nfev          = 0     # RHS evaluations of all sweeps, fine and coarse
+        self.count         = 0     # number of sweeps
+        self.pool = None
+        if self.processes > 1:
+            self.pool = multiprocessing.Pool(self.processes, _init, (kernels,))
+        else:
+            _init(kernels)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _map(self, function, tasks):
+        if self.pool is None:
+            return [function(task) for task in tasks]
+        return self.pool.map(function, tasks)
+
+    def _bounds(self, N):
+        return np.unique(np.linspace(0, N-1, self.slices+1).astype(int))
+
+    def _steps(self, a, b, h):
+        return max(1, int(np.ceil((b - a)*h/self.coarseStep)))
+
+    def _coarse_forward(self, x0, c, a, b, h):
+        # coarse RK4 steps from index a to index b
+        model = self.kernels.model
+        M = self._steps(a, b, h)
+        s = np.linspace(a, b, M+1)
+        H = (b - a)*h/M
+        c = _at(c, np.concatenate([s, 0.5*(s[1:] + s[:-1])]))
+        cs, cm = c[:,:len(s)], c[:,len(s):]
+        x = x0
+        for j in range(M):
+            k1 = model( x,          0, cs[:,j] )
+            k2 = model( x+H*0.5*k1, 0, cm[:,j] )
+            k3 = model( x+H*0.5*k2, 0, cm[:,j] )
+            k4 = model( x+H*k3,     0, cs[:,j+1] )
+            x = x + H*(k1+2.0*k2+2.0*k3+k4)/6.0
+        return x
+
+    def _coarse_backward(self, lT, x, c, a, b, h):
+        # coarse backward RK4 steps from index b to index a
+        glambda = self.kernels.glambda
+        M = self._steps(a, b, h)
+        s = np.linspace(b, a, M+1)
+        H = (b - a)*h/M
+        sm = 0.5*(s[1:] + s[:-1])
+        xs, xm = _at(x, s), _at(x, sm)
+        cs, cm = _at(c, s), _at(c, sm)
+        l = lT
+        for j in range(M):
+            k1 = glambda( xs[:,j],   0, cs[:,j],   l )
+            k2 = glambda( xm[:,j],   0, cm[:,j],   l-H*0.5*k1 )
+            k3 = glambda( xm[:,j],   0, cm[:,j],   l-H*0.5*k2 )
+            k4 = glambda( xs[:,j+1], 0, cs[:,j+1], l-H*k3 )
+            l = l - H*(k1+2.0*k2+2.0*k3+k4)/6.0
+        return l
+
+    def _iterate(self, U, coarse, fine, order):
+        # parareal corrections of the slice boundary values U; order lists
+        # (slice, start boundary, end boundary) in propagation order
+        G = {}
+        for k, i, j in order:
+            G[k] = coarse(k, U[:,i])
+            U[:,j] = G[k]
+
+        for iteration in range(1, self.maxIterations+1):
+            segments = fine(U)
+            old = U.copy()
+            for k, i, j in order:
+                g = coarse(k, U[:,i])
+                end = segments[k][:,-1] if j > i else segments[k][:,0]
+                U[:,j] = g + end - G[k]
+                G[k] = g
+            change = np.linalg.norm(U - old)/max(np.linalg.norm(U), 1.e-300)
+            if change < self.tolerance:
+                break
+
+        return segments, iteration
+
+    def _count(self, b, h, iterations):
+        # counters of a sweep over the slices bounded by b
+        coarse = sum(self._steps(b[k], b[k+1], h) for k in range(len(b)-1))
+        self.nfev       += 4*(iterations*b[-1] + (iterations+1)*coarse)
+        self.iterations += iterations
+        self.count      += 1
+
+    def forward(self, StateVar, Controls, h):
+        x = StateVar
+        c = Controls
+        b = self._bounds(x.shape[1])
+        P = len(b) - 1
+
+        U = np.empty((x.shape[0], P+1))
+        U[:,0] = x[:,0]
+
+        def coarse(k, u):
+            return self._coarse_forward(u, c, b[k], b[k+1], h)
+
+        def fine(U):
+            return self._map(_fine_forward, [(U[:,k], c[:,b[k]:b[k+1]+1], h)
+                                             for k in range(P)])
+
+        segments, iterations = self._iterate(U, coarse, fine, [(k, k, k+1) for k in range(P)])
+        self._count(b, h, iterations)
+        for k in range(P):
+            x[:,b[k]:b[k+1]+1] = segments[k]
+        return x
+
+    def backward(self, StateVar, Controls, l_vec, h):
+        x = StateVar
+        c = Controls
+        l = l_vec
+        b = self._bounds(x.shape[1])
+        P = len(b) - 1
+
+        U = np.empty((l.shape[0], P+1))
+        U[:,P] = l[:,-1]
+
+        def coarse(k, u):
+            return self._coarse_backward(u, x, c, b[k], b[k+1], h)
+
+        def fine(U):
+            return self._map(_fine_backward, [(x[:,b[k]:b[k+1]+1], c[:,b[k]:b[k+1]+1],
+                                               U[:,k+1], h) for k in range(P)])
+
+        segments, iterations = self._iterate(U, coarse, fine, [(k, k+1, k) for k in range(P-1, -1, -1)])
+        self._count(b, h, iterations)
+        for k in range(P):
+            l[:,b[k]:b[k+1]+1] = segments[k]
+        return l
@@ -0,0 +1,162 @@
+# Optimal Control 1: Cellular Level
+# Trade-off surface of the mixed therapy over the weights (wD, wR)
+#
+# The FBSM is solved for every point of a 2-D grid of weights in a process
+# pool. Results are written as they arrive to a columnar store: one .npy
+# file per quantity in a directory, trajectories as memory-mapped arrays
+#
+#   wD.npy, wR.npy                 weights of each grid point
+#   tumour.npy                     int x3^2 dt
+#   costD.npy, costR.npy           int uD^2 dt, int uR^2 dt
+#   J.npy                          objective, tumour + wD*costD + wR*costR
+#   iterations.npy, converged.npy  FBSM statistics
+#   StateVar.npy, Controls.npy     (points, variables, N) trajectories
+#   done.npy                       points already solved
+#
+# A sweep interrupted at any point is resumed by calling sweep() again
+# with the same directory; only the missing points are solved, and with
+# retry=True also the points that did not converge (e.g. with a smaller
+# convx). The store is built in a sibling directory and moved in place
+# with done.npy last, so an interrupted creation is started again.
+# Only converged points enter the front.
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+import os
+import shutil
+import multiprocessing
+
+import numpy as np
+
+from . import models, fbsm
+
+COLUMNS = ['wD', 'wR', 'tumour', 'costD', 'costR', 'J', 'iterations', 'converged', 'done']
+
+
+def costs(t, StateVar, Controls):
+    # tumour burden and unweighted drug costs
+    h = t[1] - t[0]
+    return (fbsm.integral(StateVar[2]**2, h), fbsm.integral(Controls[0]**2, h),
+            fbsm.integral(Controls[1]**2, h))
+
+
+def _solve(task):
+    # worker: one FBSM solve, kernels are generated once per process
+    index, wD, wR, options = task
+    options = dict(options)
+    scenario = options.pop('scenario')
+    N = options.pop('N')
+    kernels = models.therapy('mixed', scenario, wD=wD, wR=wR)
+    sol = fbsm.FBSM_multilevel(kernels, N, verbose=False, **options)
+    return index, sol.t, sol.StateVar, sol.Controls, sol.iterations, sol.converged
+
+
+def _open(directory, wD, wR, N, m):
+    # creates the store, or opens it checking that it is the same sweep
+    P = len(wD)
+    if os.path.exists(os.path.join(directory, 'done.npy')):
+        store = load(directory, mode='r+')
+        if (len(store['wD']) != P or not np.allclose(store['wD'], wD)
+                or not np.allclose(store['wR'], wR) or store['StateVar'].shape[2] != N):
+            raise ValueError('%s holds a different sweep' % directory)
+        return store
+
+    partial = os.path.normpath(directory) + '.partial'
+    if os.path.isdir(partial):
+        shutil.rmtree(partial)
+    os.makedirs(partial)
+    shapes = {'StateVar': (P, 3, N), 'Controls': (P, m, N)}
+    dtypes = {'iterations': np.int64, 'converged': bool, 'done': bool}
+    names = ['StateVar', 'Controls'] + COLUMNS
+    for name in names:
+        path = os.path.join(partial, name + '.npy')
+        column = np.lib.format.open_memmap(path, mode='w+', dtype=dtypes.get(name, np.float64),
+                                           shape=shapes.get(name, (P,)))
+        if name in ('wD', 'wR'):
+            column[:] = wD if name == 'wD' else wR
+        column.flush()
+        del column
+
+    # done.npy marks a complete store, it is moved last
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    for name in names:
+        os.replace(os.path.join(partial, name + '.npy'), os.path.join(directory, name + '.npy'))
+    os.rmdir(partial)
+    return load(directory, mode='r+')
+
+
+def load(directory, mode='r'):
+    # columns of a (possibly partial) sweep as memory-mapped arrays
+    store = {}
+    for name in COLUMNS + ['StateVar', 'Controls']:
+        store[name] = np.load(os.path.join(directory, name + '.npy'), mmap_mode=mode)
+    return store
+
+
+def sweep(wD, wR, directory, scenario=1, N=int(models.T*10), processes=None,
+          retry=False, verbose=True, **options):
+    # wD, wR: 1-D arrays of weights; every pair of the grid is solved
+    # retry:   solve again the points that did not converge
+    # options: passed to fbsm.FBSM_multilevel (convx, tolerance, ...)
+    options.setdefault('convx', models.CONVX['mixed'])
+    WD, WR = np.meshgrid(np.asarray(wD, dtype=float), np.asarray(wR, dtype=float), indexing='ij')
+    WD, WR = WD.ravel(), WR.ravel()
+
+    store = _open(directory, WD, WR, N, 2)
+    options = dict(options, scenario=scenario, N=N)
+    todo = ~store['done']
+    if retry:
+        todo |= ~store['converged']
+    tasks = [(i, WD[i], WR[i], options) for i in np.flatnonzero(todo)]
+
+    if verbose:
+        print("Solving %d of %d grid points" % (len(tasks), len(WD)))
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        for count, result in enumerate(pool.imap_unordered(_solve, tasks)):
+            i, t, StateVar, Controls, iterations, converged = result
+            tumour, costD, costR = costs(t, StateVar, Controls)
+
+            # a retried point is not done while its columns are rewritten
+            if store['done'][i]:
+                store['done'][i] = False
+                store['done'].flush()
+            store['StateVar'][i] = StateVar
+            store['Controls'][i] = Controls
+            store['tumour'][i] = tumour
+            store['costD'][i] = costD
+            store['costR'][i] = costR
+            store['J'][i] = tumour + WD[i]*costD + WR[i]*costR
+            store['iterations'][i] = iterations
+            store['converged'][i] = converged
+            for name in COLUMNS[2:-1] + ['StateVar', 'Controls']:
+                store[name].flush()
+
+            # a point is marked as done only once all its columns are on disk
+            store['done'][i] = True
+            store['done'].flush()
+
+            if verbose:
+                print("[%d/%d] wD=%.1e, wR=%.1e: J=%.4e (%d iterations%s)"
+                      % (count+1, len(tasks), WD[i], WR[i], store['J'][i], iterations,
+                         '' if converged else ', not converged'))
+    finally:
+        pool.terminate()
+        pool.join()
+
+    return load(directory)
+
+
+def front(store):
+    # mask of the converged points not dominated in (tumour, costD, costR)
+    done = np.asarray(store['done']) & np.asarray(store['converged'])
+    F = np.array([store['tumour'], store['costD'], store['costR']]).T
+    mask = np.zeros(len(F), dtype=bool)
+    for i in np.flatnonzero(done):
+        dominated = (np.all(F[done] <= F[i], axis=1) & np.any(F[done] < F[i], axis=1))
+        mask[i] = not np.any(dominated)
+    return mask
@@ -0,0 +1,151 @@
+# Optimal Control 1: Cellular Level
+# Robust optimal control over uncertain parameters
+#
+# One control u(t) is designed for a sample of parameter sets. The
+# kernels are bound with array-valued parameters (one entry per sample),
+# so state and adjoint of all samples are swept at once as the trailing
+# axis of (n, N, S) arrays. The control stays (m, N) and is shared.
+#
+# Robust wraps the kernels for fbsm.FBSM / FBSM_multilevel and replaces
+# the control law by the stationary point of the weighted Hamiltonian
+# sum_s w_s H_s:
+#
+#     'expected'  fixed weights (uniform by default), minimizes E[J]
+#     'worst'     weights softmax(sharpness*J_s/mean J) recomputed every
+#                 iteration, minimizes a smooth maximum of the J_s that
+#                 tends to max_s J_s as the sharpness grows
+#
+# sum_s w_s dH_s/du = 0 is solved by averaging the unprojected stationary
+# controls, which is exact when d2H/du2 does not depend on the sample,
+# i.e. the control enters the dynamics linearly and the cost weights are
+# not sampled (checked on construction).
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+import numpy as np
+import sympy as sp
+
+from . import models, fbsm
+
+# parameters of the scenarios that are uncertain
+UNCERTAIN = ('a3', 'c1', 'c3')
+
+
+def sample(scenario=1, size=32, spread=0.25, names=UNCERTAIN, seed=None):
+    # size log-normal perturbations of the nominal values of `names`
+    # (relative standard deviation about `spread`); zero values stay zero
+    rng = np.random.RandomState(seed)
+    pars = models.parameters(scenario)
+    return dict((name, pars[name]*np.exp(spread*rng.standard_normal(size)))
+                for name in names)
+
+
+class Robust(object):
+
+    def __init__(self, kernels, mode='expected', weights=None, sharpness=20.0):
+        if mode not in ('expected', 'worst'):
+            raise ValueError("mode must be 'expected' or 'worst', not %r" % (mode,))
+        if len(kernels.batch) != 1:
+            raise ValueError('kernels must be bound with one axis of samples')
+        self.kernels   = kernels
+        self.mode      = mode
+        self.sharpness = sharpness
+        self.model     = kernels.model
+        self.glambda   = kernels.glambda
+        self.samples   = kernels.batch[0]
+        if weights is None:
+            weights = np.ones(self.samples)
+        self.base    = np.asarray(weights, dtype=float)/np.sum(weights)
+        self.weights = self.base.copy()
+        self._check()
+
+    def _check(self):
+        # the averaged stationary control is the weighted optimum only if
+        # d2H/du2 is the same for every sample
+        sampled = set(sp.Symbol(k) for k, v in self.kernels.pars.items() if np.ndim(v) > 0)
+        l = [sp.Symbol('l%d' % (i+1)) for i in range(self.kernels.n)]
+        H = self.kernels.cost + sum(li*fi for li, fi in zip(l, self.kernels.rhs))
+        u = self.kernels.controls
+        hessian = sp.hessian(H, u)
+        if hessian.free_symbols & (sampled | set(self.kernels.states) | set(l)):
+            raise ValueError('d2H/du2 depends on the sample; the control must enter '
+                             'linearly and the cost weights must not be sampled')
+        if self.mode == 'worst':
+            # sample costs are compared through L(x, 0); the control part
+            # L(x, u) - L(x, 0) must be common to all samples
+            L = self.kernels.cost
+            extra = sp.simplify(L - L.subs(dict((ui, 0) for ui in u)))
+            if extra.free_symbols & (sampled | set(self.kernels.states)):
+                raise ValueError('the control cost must not depend on the state or the sample')
+
+    @property
+    def n(self):
+        return self.kernels.n
+
+    @property
+    def m(self):
+        return self.kernels.m
+
+    @property
+    def batch(self):
+        return self.kernels.batch
+
+    @property
+    def controlBatch(self):
+        # one control for all samples
+        return ()
+
+    def _average(self, v):
+        return np.dot(v, self.weights)
+
+    @property
+    def horizon(self):
+        # the 'worst' law depends on the states of the whole horizon:
+        # solvers that see them a segment at a time add up state_costs,
+        # call reweight once per iteration and use law
+        return self.mode == 'worst'
+
+    def state_costs(self, StateVar):
+        # state part of the sample costs with unit grid step (it cancels in
+        # the normalization); additive over segments sharing end points
+        L = self.kernels.running_cost(StateVar, np.zeros(self.m))
+        return fbsm.integral(L.T, 1.0)
+
+    def reweight(self, J):
+        # softmax weights of the sample costs J
+        z = self.sharpness*J/np.mean(J)
+        w = self.base*np.exp(z - z.max())
+        self.weights = w/w.sum()
+
+    def law(self, StateVar, l_vec):
+        # control law under the current weights
+        return self.kernels.project(self._average(self.kernels.stationary(StateVar, l_vec)))
+
+    def control_law(self, StateVar, l_vec):
+        if self.mode == 'worst':
+            self.reweight(self.state_costs(StateVar))
+        return self.law(StateVar, l_vec)
+
+    def running_cost(self, StateVar, Controls):
+        # weighted running cost, so that fbsm.objective is the robust J
+        return self._average(self.kernels.running_cost(StateVar, Controls[...,None]))
+
+    def costs(self, t, Controls, y0=None):
+        # J of every sample under the control given on the grid t
+        h = t[1] - t[0]
+        StateVar, _, _ = fbsm.initial(self, len(t), y0)
+        StateVar = fbsm.runge_forward(self.model, StateVar, Controls, h)
+        return fbsm.objective(self.kernels, StateVar, Controls[...,None], h)
+
+
+def FBSM(kernels, N, T=models.T, y0=None, mode='expected', weights=None,
+         sharpness=20.0, multilevel=True, **options):
+    # Robust control of the batched kernels; options are passed to
+    # fbsm.FBSM_multilevel (or fbsm.FBSM with multilevel=False).
+    # Returns the solution, with the (n, N, S) states and adjoints of
+    # every sample, and the Robust wrapper (final weights, sample costs).
+    robust = Robust(kernels, mode, weights, sharpness)
+    solve = fbsm.FBSM_multilevel if multilevel else fbsm.FBSM
+    return solve(robust, N, T, y0, **options), robust
@@ -0,0 +1,261 @@
+# Optimal Control 1: Cellular Level
+# Arc structure of converged controls and switching-time re-optimization
+#
+# A converged control is split, for each control variable, into arcs on
+# the lower bound, on the upper bound and interior (the stationary control
+# between the bounds). The switching times are located below the grid
+# step as the crossings of the unprojected stationary control with the
+# bound, so they do not depend on the relaxation of the FBSM. Where the
+# control jumps from one bound to the other (bang-bang, no interior arc)
+# the crossing is the one with the midpoint of the bounds, where the
+# switching function changes sign.
+#
+# For nearby problems (slightly changed parameters or weights) the
+# structure is kept and only the switching times tau are optimized: bound
+# arcs stay at their bound and each interior arc keeps its shape,
+# stretched onto its new interval. The gradient of J(tau) is exact for
+# this parametrization,
+#
+#     dJ/dtau_k = int H_u du/dtau_k dt + H(tau_k, u-) - H(tau_k, u+)
+#
+# with the adjoint of one backward sweep (the jump term vanishes where
+# the control is continuous, as at the ends of interior arcs).
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+import numpy as np
+from scipy.optimize import minimize
+
+from . import models, fbsm
+
+LOWER, INTERIOR, UPPER = 0, 1, 2
+KINDS = {LOWER: 'lower', INTERIOR: 'interior', UPPER: 'upper'}
+
+
+def _bounds(kernels):
+    # numeric control bounds, from the projection of -inf and inf
+    lower = kernels.project(np.full((kernels.m, 1), -np.inf))[:,0]
+    upper = kernels.project(np.full((kernels.m, 1), np.inf))[:,0]
+    return lower, upper
+
+
+def _runs(kind):
+    # start indices and kinds of the runs of equal values
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(kind)) + 1])
+    return starts, kind[starts]
+
+
+class Structure(object):
+    # Arcs of every control: kinds[j] lists the arc kinds of control j and
+    # times[j] the switching times between them (len(kinds[j]) - 1 values).
+    # The converged control u_ref on the grid t_ref gives the shape of the
+    # interior arcs.
+
+    def __init__(self, kinds, times, t_ref, u_ref, lower, upper):
+        self.kinds = kinds
+        self.times = times
+        self.t_ref = t_ref
+        self.u_ref = u_ref
+        self.lower = lower
+        self.upper = upper
+        self.T     = t_ref[-1]
+        self._du   = np.gradient(u_ref, t_ref, axis=1)
+
+    def __repr__(self):
+        lines = []
+        for j, (kinds, times) in enumerate(zip(self.kinds, self.times)):
+            b = [0.0] + list(times) + [self.T]
+            lines.append('control %d: ' % j + ', '.join('%s [%.2f, %.2f]' % (KINDS[k], b[i], b[i+1])
+                                                        for i, k in enumerate(kinds)))
+        return '\n'.join(lines)
+
+    @property
+    def tau(self):
+        # all switching times as one vector
+        return np.concatenate([np.asarray(times, dtype=float) for times in self.times])
+
+    def split(self, tau):
+        # switching times of every control from the vector tau
+        sizes = np.cumsum([0] + [len(times) for times in self.times])
+        return [tau[sizes[j]:sizes[j+1]] for j in range(len(self.times))]
+
+    def _arc(self, j, i, b, t):
+        # control j on arc i with boundaries b, and the parts of du/dt
+        # entering du/da and du/db of the arc ends (a, b)
+        kind = self.kinds[j][i]
+        if kind == LOWER:
+            return np.full_like(t, self.lower[j]), None
+        if kind == UPPER:
+            return np.full_like(t, self.upper[j]), None
+        r = [0.0] + list(self.times[j]) + [self.T]
+        a, e = b[i], b[i+1]
+        ra, re = r[i], r[i+1]
+        sigma = ra + (t - a)*(re - ra)/(e - a)
+        u = np.interp(sigma, self.t_ref, self.u_ref[j])
+        du = np.interp(sigma, self.t_ref, self._du[j])
+        scale = (re - ra)/(e - a)**2
+        return u, (-du*scale*(e - t), -du*scale*(t - a))
+
+    def controls(self, t, tau, derivatives=False):
+        # controls on the grid t for switching times tau; with derivatives,
+        # also du_j/dtau as a list over tau of (control index, array)
+        c = np.empty((len(self.kinds), len(t)))
+        d = []
+        for j, times in enumerate(self.split(tau)):
+            b = np.concatenate([[0.0], times, [self.T]])
+            arc = np.clip(np.searchsorted(b, t, side='right') - 1, 0, len(b) - 2)
+            dj = [np.zeros(len(t)) for _ in times]
+            for i in range(len(b) - 1):
+                mask = arc == i
+                u, parts = self._arc(j, i, b, t[mask])
+                c[j, mask] = u
+                if parts is not None:
+                    if i > 0:
+                        dj[i-1][mask] += parts[0]
+                    if i < len(times):
+                        dj[i][mask] += parts[1]
+            d += [(j, v) for v in dj]
+        if derivatives:
+            return c, d
+        return c
+
+    def limits(self, tau):
+        # control values just before and after every switching time
+        values = []
+        for j, times in enumerate(self.split(tau)):
+            b = np.concatenate([[0.0], times, [self.T]])
+            for k, s in enumerate(times):
+                before = self._arc(j, k, b, np.array([s]))[0][0]
+                after = self._arc(j, k+1, b, np.array([s]))[0][0]
+                values.append((j, before, after))
+        return values
+
+
+def arcs(t, s, lower, upper, tolerance=1.e-6, minArc=1.0):
+    # arc kinds and switching times of one control from its unprojected
+    # stationary control s on the grid t; arcs shorter than minArc (days)
+    # are merged into their longest neighbour
+    width = upper - lower if np.isfinite(upper - lower) else np.abs(s).max()
+    kind = np.where(s <= lower + tolerance*width, LOWER,
+                    np.where(s >= upper - tolerance*width, UPPER, INTERIOR))
+
+    while True:
+        starts, values = _runs(kind)
+        ends = np.append(starts[1:], len(t)) - 1
+        length = t[ends] - t[starts]
+        if len(starts) == 1 or length.min() >= minArc:
+            break
+        i = np.argmin(length)
+        neighbours = [k for k in (i-1, i+1) if 0 <= k < len(starts)]
+        k = max(neighbours, key=lambda k: length[k])
+        kind[starts[i]:ends[i]+1] = values[k]
+
+    # crossing of the stationary control with the bound (with the midpoint
+    # of the bounds for a bang-bang jump) between the last point of an arc
+    # and the first of the next
+    tau = []
+    for e in starts[1:]:
+        pair = set((kind[e-1], kind[e]))
+        if pair == set((LOWER, UPPER)):
+            bound = 0.5*(lower + upper)
+        else:
+            bound = lower if LOWER in pair else upper
+        d0, d1 = s[e-1] - bound, s[e] - bound
+        f = d0/(d0 - d1) if d0 != d1 else 0.5
+        tau.append(t[e-1] + np.clip(f, 0.0, 1.0)*(t[e] - t[e-1]))
+    return list(values), tau
+
+
+def detect(kernels, solution, tolerance=1.e-6, minArc=1.0):
+    # Structure of a converged solution; arcs shorter than minArc (days)
+    # are merged into their longest neighbour
+    lower, upper = _bounds(kernels)
+    s = kernels.stationary(solution.StateVar, solution.l_vec)
+    kinds, times = [], []
+    for j in range(kernels.m):
+        values, tau = arcs(solution.t, s[j], lower[j], upper[j], tolerance, minArc)
+        kinds.append(values)
+        times.append(tau)
+    return Structure(kinds, times, solution.t, solution.Controls, lower, upper)
+
+
+def gradient(kernels, structure, tau, N, T=models.T, y0=None):
+    # J(tau) and dJ/dtau, with the trajectories of the last evaluation
+    t, h = fbsm.grid(T, N)
+    n = kernels.n
+    c, d = structure.controls(t, tau, derivatives=True)
+    x, _, l = fbsm.initial(kernels, N, y0)
+    x = fbsm.runge_forward(kernels.model, x, c, h)
+    l = fbsm.runge_backward(kernels.glambda, x, c, l, h)
+    J = fbsm.objective(kernels, x, c, h)
+
+    Hu = kernels.cost_gradient(x, c)[n:] + kernels.vjp(x, c, l)[n:]
+    grad = np.array([fbsm.integral(Hu[j]*v, h) for j, v in d])
+
+    # jumps of the control at the switching times
+    for k, (j, before, after) in enumerate(structure.limits(tau)):
+        if before != after:
+            xs = fbsm.resample(t, x, np.array([tau[k]]))
+            ls = fbsm.resample(t, l, np.array([tau[k]]))
+            cs = fbsm.resample(t, c, np.array([tau[k]]))
+            H = []
+            for u in (before, after):
+                cs[j] = u
+                H.append(kernels.running_cost(xs, cs) + np.sum(ls*kernels.model(xs, 0, cs), axis=0))
+            grad[k] += (H[0] - H[1])[0]
+    return J, grad, fbsm.Solution(t, x, c, l)
+
+
+def reoptimize(kernels, structure, N, T=models.T, y0=None, minGap=None,
+               tolerance=1.e-10, maxIterations=100, verbose=True):
+    # Optimal switching times of the structure for the kernels (SLSQP, the
+    # arcs of each control kept in order and at least minGap long).
+    # Returns the Solution and the switching times.
+    tau0 = structure.tau
+    if minGap is None:
+        minGap = T/(N - 1)
+    J0, grad0, sol = gradient(kernels, structure, tau0, N, T, y0)
+    if len(tau0) == 0:
+        sol.converged = True
+        sol.error = 0.0
+        return sol, tau0
+
+    # J is flat in tau relative to its size: the objective is scaled so
+    # that the initial gradient in z = tau/T is of order one
+    scale = max(np.abs(grad0).max()*T, 1.e-12*abs(J0), 1.e-300)
+
+    def f(z):
+        J, grad, _ = gradient(kernels, structure, z*T, N, T, y0)
+        return (J - J0)/scale, grad*T/scale
+
+    # arcs in order and at least minGap long: A z + b >= minGap/T, with
+    # rows z_0, z_k - z_(k-1) and 1 - z_last for every control
+    A, b = [], []
+    first = 0
+    for times in structure.times:
+        for k in range(len(times) + 1):
+            row = np.zeros(len(tau0))
+            if k < len(times):
+                row[first + k] = 1.0
+            if k > 0:
+                row[first + k - 1] = -1.0
+            A.append(row)
+            b.append(1.0 if k == len(times) else 0.0)
+        first += len(times)
+    A, b = np.array(A), np.array(b)
+    constraints = [{'type': 'ineq', 'fun': lambda z: A.dot(z) + b - minGap/T,
+                    'jac': lambda z: A}]
+
+    result = minimize(f, tau0/T, jac=True, method='SLSQP', constraints=constraints,
+                      options={'maxiter': maxIterations, 'ftol': tolerance})
+    tau = result.x*T
+    J, grad, sol = gradient(kernels, structure, tau, N, T, y0)
+    sol.iterations = result.nit
+    sol.converged = result.success
+    sol.error = np.abs(grad).max()*T/scale
+    if verbose:
+        print("J=%.8e after %d iterations: %s" % (J, result.nit, result.message))
+        print("Switching times:", ', '.join('%.3f' % s for s in tau))
+    return sol, tau
@@ -0,0 +1,230 @@
+# Optimal Control 1: Cellular Level
+# Symbolic generation of adjoint systems and control laws
+#
+# From the state system dx/dt = f(x,u), the running cost L(x,u) and the
+# control bounds, the Hamiltonian
+#
+#     H = L(x,u) + l1*f1(x,u) + ... + ln*fn(x,u)
+#
+# is differentiated to obtain the adjoint system dl/dt = -dH/dx and the
+# projected control law u = min(uMax, max(uMin, u*)), with u* the solution
+# of dH/du = 0. Vectorized NumPy code is generated for the state system,
+# the adjoint system, the control law (also unprojected, and the projection
+# alone), the running cost and the derivatives needed to differentiate
+# the discretized problem in reverse mode (optcon.autodiff), with common
+# subexpressions shared inside each function (sympy.cse).
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+import re
+
+import numpy as np
+import sympy as sp
+from sympy.printing.numpy import NumPyPrinter
+
+# names understood as functions (not parameters) when parsing strings
+FUNCTIONS = ('exp', 'log', 'sqrt', 'sin', 'cos', 'tanh', 'Abs', 'Min', 'Max')
+
+# time symbol (only autonomous models are supported)
+TIME = sp.Symbol('t')
+
+
+def parse(expr, names=()):
+    # Expressions may be given as strings in Python or PyDSTool syntax
+    # ('x^2' is read as 'x**2'). Every identifier becomes a plain symbol,
+    # so that names like 'K', 'N' or 'S' are not taken by sympy builtins.
+    if not isinstance(expr, str):
+        return sp.sympify(expr)
+    idents = set(re.findall(r'[A-Za-z_]\w*', expr)) | set(names)
+    local = dict((n, sp.Symbol(n)) for n in idents if n not in FUNCTIONS)
+    return sp.sympify(expr, locals=local, convert_xor=True)
+
+
+class Kernels(object):
+    # Numeric kernels of one optimal control problem.
+    #
+    # Compiled functions (parameters are looked up in self.pars):
+    #   model(StateVar, t, Controls)           state system
+    #   glambda(StateVar, t, Controls, l_vec)  adjoint system
+    #   control_law(StateVar, l_vec)           projected control (no relaxation)
+    #   running_cost(StateVar, Controls)       integrand of the objective
+    #   stationary(StateVar, l_vec)            solution of dH/du = 0, unprojected
+    #   project(Controls)                      projection onto the bounds
+    #   vjp(StateVar, Controls, w)             w^T df/dx and w^T df/du, stacked
+    #   cost_gradient(StateVar, Controls)      dL/dx and dL/du, stacked
+    #
+    # StateVar, Controls and l_vec are indexed by variable along the first
+    # axis; the remaining axes (time points, samples) are broadcast.
+
+    FUNCTIONS = ('model', 'glambda', 'control_law', 'running_cost', 'stationary',
+                 'project', 'vjp', 'cost_gradient')
+
+    def __init__(self, states, controls, parameters, rhs, cost, adjoint,
+                 control, bounds, source, pars=None):
+        self.states     = states
+        self.controls   = controls
+        self.parameters = parameters
+        self.rhs        = rhs
+        self.cost       = cost
+        self.adjoint    = adjoint
+        self.control    = control
+        self.bounds     = bounds
+        self.source     = source
+        self._code      = compile(source, '<optcon.symbolic>', 'exec')
+        self.pars       = {}
+        self.bind(pars or {})
+
+    def bind(self, pars=None, **kwargs):
+        # Sets parameter values in place (scalars, or arrays broadcasting
+        # against the trailing axes of the variables) and returns self.
+        pars = dict(self.pars, **dict(pars or {}, **kwargs))
+        unknown = set(pars) - set(str(p) for p in self.parameters)
+        if unknown:
+            raise ValueError('unknown parameters: %s' % ', '.join(sorted(unknown)))
+        namespace = {'numpy': np}
+        namespace.update(pars)
+        exec(self._code, namespace)
+        for name in self.FUNCTIONS:
+            setattr(self, name, namespace[name])
+        self.pars = pars
+        return self
+
+    def copy(self, pars=None, **kwargs):
+        # Same compiled problem with a separate set of parameter values.
+        new = object.__new__(Kernels)
+        new.__dict__.update(self.__dict__)
+        return new.bind(pars, **kwargs)
+
+    # Pickled without the compiled functions, which are rebuilt from the
+    # source, so that kernels can be sent to worker processes.
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        for name in self.FUNCTIONS + ('_code',):
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._code = compile(self.source, '<optcon.symbolic>', 'exec')
+        self.bind()
+
+    def missing(self):
+        return [str(p) for p in self.parameters if str(p) not in self.pars]
+
+    @property
+    def n(self):
+        return len(self.states)
+
+    @property
+    def m(self):
+        return len(self.controls)
+
+    @property
+    def batch(self):
+        # trailing axes of the variables implied by array-valued parameters
+        return np.broadcast_shapes(*[np.shape(v) for v in self.pars.values()])
+
+    @property
+    def controlBatch(self):
+        # the controls of a batch are independent, one per sample
+        return self.batch
+
+
+def _function(printer, name, args, exprs, wrap=None, single=False):
+    # args: list of (argument name, symbols unpacked from it by index)
+    # wrap: optional format strings applied to each printed output
+    lines = ['def %s(%s):' % (name, ', '.join(a for a, _ in args))]
+    for arg, syms in args:
+        for i, s in enumerate(syms):
+            lines.append('    %s = %s[%d]' % (s, arg, i))
+
+    replacements, reduced = sp.cse(exprs, symbols=sp.numbered_symbols('_s'))
+    for sym, e in replacements:
+        lines.append('    %s = %s' % (sym, printer.doprint(e)))
+
+    # outputs not depending on any variable are broadcast to the variable shape
+    variables = set(s for _, syms in args for s in syms) | set(s for s, _ in replacements)
+    ref = args[0][1][0]
+    out = []
+    for i, e in enumerate(reduced):
+        code = printer.doprint(e)
+        if not e.free_symbols & variables:
+            code = '(%s)*numpy.ones_like(%s)' % (code, ref)
+        if wrap is not None:
+            code = wrap[i] % code
+        out.append(code)
+
+    if single:
+        lines.append('    return %s' % out[0])
+    else:
+        lines.append('    return numpy.array([%s])' % ', '.join(out))
+    return '\n'.join(lines)
+
+
+def generate(states, controls, rhs, cost, bounds, pars=None):
+    # states, controls: variable names, e.g. ['x1','x2','x3'], ['uD']
+    # rhs:    right-hand sides of the state system (strings or sympy)
+    # cost:   running cost L(x,u), strictly convex in the controls
+    # bounds: (lower, upper) per control, numbers or expressions
+    # pars:   optional parameter values bound to the returned kernels
+    x = [sp.Symbol(s) for s in states]
+    u = [sp.Symbol(c) for c in controls]
+    l = [sp.Symbol('l%d' % (i+1)) for i in range(len(x))]
+
+    names = list(states) + list(controls)
+    rhs    = [parse(e, names) for e in rhs]
+    cost   = parse(cost, names)
+    bounds = [(parse(lo, names), parse(hi, names)) for lo, hi in bounds]
+
+    if len(rhs) != len(x):
+        raise ValueError('expected %d right-hand sides, got %d' % (len(x), len(rhs)))
+    if len(bounds) != len(u):
+        raise ValueError('expected %d control bounds, got %d' % (len(u), len(bounds)))
+
+    printer = NumPyPrinter({'fully_qualified_modules': True})
+
+    # Hamiltonian
+    H = cost + sum(li*fi for li, fi in zip(l, rhs))
+
+    # Adjoint system
+    adjoint = [-sp.diff(H, xi) for xi in x]
+
+    # Stationary control dH/du = 0
+    solution = sp.solve([sp.diff(H, ui) for ui in u], u, dict=True)
+    if len(solution) != 1 or set(solution[0]) != set(u):
+        raise ValueError('dH/du = 0 has no unique solution; the running cost '
+                         'must be strictly convex in the controls')
+    control = [solution[0][ui] for ui in u]
+
+    # Parameters: every free symbol which is not a variable
+    variables = set(x) | set(u) | set(l)
+    free = set().union(*[e.free_symbols for e in rhs + [cost]])
+    for lo, hi in bounds:
+        free |= lo.free_symbols | hi.free_symbols
+    if TIME in free:
+        raise ValueError('only autonomous models are supported')
+    parameters = sorted(free - variables, key=str)
+
+    # Projection onto the admissible set, as in control_new
+    wrap = ['numpy.maximum(%s, numpy.minimum(%s, %%s))' % (printer.doprint(lo), printer.doprint(hi))
+            for lo, hi in bounds]
+
+    source = '\n\n'.join([
+        '# Generated by optcon.symbolic -- do not edit',
+        _function(printer, 'model', [('StateVar', x), ('t', []), ('Controls', u)], rhs),
+        _function(printer, 'glambda', [('StateVar', x), ('t', []), ('Controls', u), ('l_vec', l)], adjoint),
+        _function(printer, 'control_law', [('StateVar', x), ('l_vec', l)], control, wrap=wrap),
+        _function(printer, 'running_cost', [('StateVar', x), ('Controls', u)], [cost], single=True),
+        _function(printer, 'stationary', [('StateVar', x), ('l_vec', l)], control),
+        _function(printer, 'project', [('Controls', u)], u, wrap=wrap),
+        _function(printer, 'vjp', [('StateVar', x), ('Controls', u), ('w', l)],
+                  [sum(li*sp.diff(fi, v) for li, fi in zip(l, rhs)) for v in x + u]),
+        _function(printer, 'cost_gradient', [('StateVar', x), ('Controls', u)],
+                  [sp.diff(cost, v) for v in x + u]),
+    ]) + '\n'
+
+    return Kernels(states=x, controls=u, parameters=parameters, rhs=rhs,
+                   cost=cost, adjoint=adjoint, control=control, bounds=bounds,
+                   source=source, pars=pars)
@@ -0,0 +1,90 @@
+# Optimal Control 1: Cellular Level
+# Per-iteration telemetry of the FBSM
+#
+# A Telemetry object passed to FBSM / FBSM_multilevel records, for every
+# iteration:
+#
+#   N, iteration                   grid size and iteration on that grid
+#   objective                      J of the control entering the iteration,
+#                                  int L(x, u) dt with its state
+#   control, state, adjoint        relative changes (state and adjoint
+#                                  only with convergence='strong')
+#   error                          the convergence measure
+#   forward, backward, update      wall time of the sweeps and the
+#                                  control update (s)
+#   rhs                            model + adjoint evaluations, for sweeps
+#                                  that count them (an `nfev` total)
+#   allocated                      peak bytes allocated during the
+#                                  iteration, only with memory=True
+#
+# The log is kept as a list of dicts and written as JSON lines, one
+# record per line, or read back as columns of arrays.
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+import json
+import tracemalloc
+
+import numpy as np
+
+FIELDS = ['N', 'iteration', 'objective', 'control', 'state', 'adjoint', 'error',
+          'forward', 'backward', 'update', 'rhs', 'allocated']
+
+
+def _evaluations(sweeps):
+    return getattr(sweeps, 'nfev', None)
+
+
+class Telemetry(object):
+
+    def __init__(self, memory=False):
+        # memory: trace allocations with tracemalloc; this slows the
+        #         sweeps down noticeably, so it is off by default
+        self.memory  = memory
+        self.records = []
+        self._rhs    = None
+        self._base   = 0
+
+    def begin(self, sweeps):
+        # marks the start of an iteration
+        self._rhs = _evaluations(sweeps)
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            self._base = tracemalloc.get_traced_memory()[0]
+
+    def end(self, sweeps, **fields):
+        # closes the iteration started by begin() with the given fields
+        record = dict.fromkeys(FIELDS)
+        record.update(fields)
+        rhs = _evaluations(sweeps)
+        if rhs is not None and self._rhs is not None:
+            record['rhs'] = rhs - self._rhs
+        if self.memory:
+            record['allocated'] = tracemalloc.get_traced_memory()[1] - self._base
+        self.records.append(record)
+
+    def stop(self):
+        if self.memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def columns(self):
+        # the log as arrays, missing values as nan
+        return dict((name, np.array([np.nan if r[name] is None else r[name]
+                                     for r in self.records], dtype=float))
+                    for name in FIELDS)
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            for record in self.records:
+                f.write(json.dumps(dict((k, getattr(v, 'item', lambda: v)())
+                                        for k, v in record.items())) + '\n')
+
+
+def read(path):
+    # records of a log written by Telemetry.write
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
@@ -11,67 +11,16 @@ import pylab as plt
 from mpl_toolkits.mplot3d import Axes3D
 import sympy as sp
 
+from cellmol import parameters
+
 plt.rc('text', usetex=True)
 plt.rc('font', family='serif')
 
 # name of system
 DSargs = PyDSTool.args(name='ode')
 
-# parameters
-DSargs.pars = {
-        
-# aC up -> OCs down but controlled, OBs up, period same?
-#'aC': 3.2e-1, #farhat (check: OBs)
-'aC': 3.0e0, #komarova
-#'aC': 1.0e-2, #---estimate---#
-#'aC': 2.0e-1, #---estimate---#  
-
-# bC up -> OCs flat, OBs down and flat, period down
-'bC': 3.0e-1, #farhat (same)
-#'bC': 2.0e-1, #komarova (same)
-#'bC': 5.0e-1, #--estimate--#
-#'bC': 1.0e0, #--estimate--#
- 
-# bCT up -> OCs down, OBs down, period down
-#'bCT': 1.2, #farhat (check: mass action)
-'bCT': 1.3e-1, #ross
-#'bCT': 1.0e-3, #--estimate--#
-#'bCT': 5.0e-2, #--estimate--#
-
-# aBW up -> OCs down, OBs up, period up
-'aBW': 2.6e-1, #farhat (check: Wnt)
-#'aBW': 1.0e-2, #--estimate--#
-#'aBW': 2.0e0, #--estimate--#
-#'aBW': 1.0e0, #--estimate--#
-
-# bB up -> OCs up, OBs down, period down
-#'bB': 3.0e-1, #farhat (same)
-#'bB': 1.0e-2, #--estimate--#
-#'bB': 1.0e-1, #--estimate--#
-#'bB': 7.0e-1, #--estimate--#
-'bB': 1.0e0, #--estimate--#
-
-# aT up -> OCs down, OBs down, period down
-#'aT': 1.0e0, #pivonka2008 (same)
-#'aT': 1.0e1, #--estimate--#
-'aT': 1.0e2, #--estimate--#
-
-# bT up -> OCs up, OBs up, period up
-'bT': 499.1, #farhat (same)
-#'bT': 2.0e2, #--estimate--#
-#'bT': 1.0e1, #--estimate--#
-
-# aW up -> OCs down, OBs up, period up 
-#'aW': 5.0e-1, #--estimate--#
-'aW': 1.0e0, #--estimate--#
-#'aW': 1.0e2, #--estimate--#
-
-# bW up -> OCs up, OBs down, period down
-#'bW': 2.0e0, #farhat, buenzli (same)
-'bW': 1.0e0, #--estimate--#
-#'bW': 5.0e0, #--estimate--#
-#'bW': 1.0e1, #--estimate--#
-}
+# parameters (literature values and sources in cellmol.parameters)
+DSargs.pars = parameters.values('remodeling')
 
 # model equations                   
 DSargs.varspecs = {
@@ -11,69 +11,16 @@ import pylab as plt
 from mpl_toolkits.mplot3d import Axes3D
 import sympy as sp
 
+from cellmol import parameters
+
 plt.rc('text', usetex=True)
 plt.rc('font', family='serif')
 
 # name of system
 DSargs = PyDSTool.args(name='ode')
 
-# parameters
-DSargs.pars = {
-#'aC': 3.2e-1, #farhat (check: OBs)
-'aC': 3.0e0, #komarova
-#'aC': 1.0e-2, #---estimate---#
-#'aC': 2.0e-1, #---estimate---#  
-
-'bC': 3.0e-1, #farhat (same)
-#'bC': 2.0e-1, #komarova (same)
-#'bC': 5.0e-1, #--estimate--#
-#'bC': 1.0e0, #--estimate--#
-
-#'bCT': 1.2, #farhat (check: mass action)
-'bCT': 1.3e-1, #ross
-#'bCT': 1.0e-3, #--estimate--#
-#'bCT': 5.0e-2, #--estimate--#
-
-'aBW': 2.6e-1, #farhat (check: Wnt)
-#'aBW': 1.0e-2, #--estimate--#
-#'aBW': 2.0e0, #--estimate--#
-#'aBW': 1.0e0, #--estimate--#
-
-# bB up -> frequency up
-#'bB': 3.0e-1, #farhat (same)
-#'bB': 1.0e-2, #--estimate--#
-#'bB': 1.0e-1, #--estimate--#
-#'bB': 7.0e-1, #--estimate--#
-'bB': 1.0e0, #--estimate--#
-
-#'aT': 1.0e0, #pivonka2008 (same)
-#'aT': 1.0e1, #--estimate--#
-'aT': 1.0e2, #--estimate--#
-
-# bT up -> OBs up
-'bT': 499.1, #farhat (same)
-#'bT': 2.0e2, #--estimate--#
-#'bT': 1.0e1, #--estimate--#
-
-#'aW': 5.0e-1, #--estimate--#
-'aW': 1.0e0, #--estimate--#
-#'aW': 1.0e2, #--estimate--#
-
-#'bW': 2.0e0, #farhat, buenzli (same)
-'bW': 1.0e0, #--estimate--#
-#'bW': 5.0e0, #--estimate--#
-#'bW': 1.0e1, #--estimate--#
-
-'KC': 0.5,
-'KB': 0.2,
-
-'aCM': 1.5,
-
-#'aM' : 2.3e-3, #farhat (check: logistic)
-'aM' : 1.0e-3,
-'KM' : 1.0,
-'aMT': 1.0e-1
-}
+# parameters (literature values and sources in cellmol.parameters)
+DSargs.pars = parameters.values('metastasis')
 
 # model equations                   
 DSargs.varspecs = {
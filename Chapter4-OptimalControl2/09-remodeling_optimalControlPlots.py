@@ -6,13 +6,14 @@
 # Guanajuato, Mexico, 2019
 
 import matplotlib.pyplot as plt
-import csv
 
 plt.rc('text', usetex=True)
 plt.rc('font', family='serif')
 
 import PyDSTool
 
+from cellmol import exports, parameters
+
 plt.rcParams['text.usetex'] = True
 
 #---ODE Simulation---#
@@ -20,54 +21,8 @@ plt.rcParams['text.usetex'] = True
 # name of system
 DSargs = PyDSTool.args(name='ode')
 
-# parameters
-DSargs.pars = {
-#'aC': 3.2e-1, #farhat (check: OBs)
-'aC': 3.0e0, #komarova
-#'aC': 1.0e-2, #---estimate---#
-#'aC': 2.0e-1, #---estimate---#  
-
-'bC': 3.0e-1, #farhat (same)
-#'bC': 2.0e-1, #komarova (same)
-#'bC': 5.0e-1, #--estimate--#
-#'bC': 1.0e0, #--estimate--#
-
-#'bCT': 1.2, #farhat (check: mass action)
-'bCT': 1.3e-1, #ross
-#'bCT': 1.0e-3, #--estimate--#
-#'bCT': 5.0e-2, #--estimate--#
-
-'aBW': 2.6e-1, #farhat (check: Wnt)
-#'aBW': 1.0e-2, #--estimate--#
-#'aBW': 2.0e0, #--estimate--#
-#'aBW': 1.0e0, #--estimate--#
-
-# bB up -> frequency up
-#'bB': 3.0e-1, #farhat (same)
-#'bB': 1.0e-2, #--estimate--#
-#'bB': 1.0e-1, #--estimate--#
-#'bB': 7.0e-1, #--estimate--#
-'bB': 1.0e0, #--estimate--#
-
-#'aT': 1.0e0, #pivonka2008 (same)
-#'aT': 1.0e1, #--estimate--#
-'aT': 1.0e2, #--estimate--#
-
-# bT up -> OBs up
-'bT': 499.1, #farhat (same)
-#'bT': 2.0e2, #--estimate--#
-#'bT': 1.0e1, #--estimate--#
-
-#'aW': 5.0e-1, #--estimate--#
-'aW': 1.0e0, #--estimate--#
-#'aW': 1.0e2, #--estimate--#
-
-#'bW': 2.0e0, #farhat, buenzli (same)
-'bW': 1.0e0, #--estimate--#
-#'bW': 5.0e0, #--estimate--#
-#'bW': 1.0e1, #--estimate--#
-
-}
+# parameters (literature values and sources in cellmol.parameters)
+DSargs.pars = parameters.values('remodeling')
 
 # model equations                   
 DSargs.varspecs = {
@@ -99,63 +54,11 @@ xBM0 = pd['xB']
 plt.close('all')
 
 def extract_ctrl():
-    x  = []
-    u1 = []
-    u2 = []
-    u3 = []
-    
     folderName = './rem_exp3/gauss_10/' # <--- change name for corresponding folder
-    
-    with open(folderName + 'discretization_times.export','r') as csvfile:
-        plots = csv.reader(csvfile)
-        for row in plots:
-            x.append(float(row[0]))
-    
-    with open(folderName + 'u1.export','r') as csvfile:
-        plots = csv.reader(csvfile)
-        for row in plots:
-            u1.append(float(row[0]))
-    
-    with open(folderName + 'u2.export','r') as csvfile:
-        plots = csv.reader(csvfile)
-        for row in plots:
-            u2.append(float(row[0]))
-            
-    with open(folderName + 'u3.export','r') as csvfile:
-        plots = csv.reader(csvfile)
-        for row in plots:
-            u3.append(float(row[0]))
-            
-    xC = []
-    
-    with open(folderName + 'xC.export','r') as csvfile:
-        plots = csv.reader(csvfile)
-        for row in plots:
-            xC.append(float(row[0]))
-    
-    xB = []
-    
-    with open(folderName + 'xB.export','r') as csvfile:
-        plots = csv.reader(csvfile)
-        for row in plots:
-            xB.append(float(row[0]))
-    
-    xT = []
-    
-    with open(folderName + 'xT.export','r') as csvfile:
-        plots = csv.reader(csvfile)
-        for row in plots:
-            xT.append(float(row[0]))
-    
-    xW = []
-    
-    with open(folderName + 'xW.export','r') as csvfile:
-        plots = csv.reader(csvfile)
-        for row in plots:
-            xW.append(float(row[0]))
-
-            
-    return x, u1, u2, u3, xC, xB, xT, xW
+
+    # parsed once, then read from the binary cache of the folder
+    data = exports.load(folderName)
+    return tuple(data[name] for name in ['discretization_times', 'u1', 'u2', 'u3', 'xC', 'xB', 'xT', 'xW'])
 
 
 x, u1, u2, u3, xC, xB, xT, xW = extract_ctrl()
@@ -0,0 +1,81 @@
+# Optimal Control 2: Cellular-Molecular Level
+# Bone remodeling model, global sensitivity analysis
+#
+# The nine parameters of script 02 are varied at once over the ranges of
+# its hand-picked values (cellmol.sensitivity.RANGES). Sobol indices of
+# the mean OC/OB densities and of the persistence of the oscillations over
+# [100, 200], and Morris elementary effects of the OC/OB period.
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+import numpy as np
+import pylab as plt
+import time
+
+from cellmol import models, sensitivity
+
+plt.rc('text', usetex=True)
+plt.rc('font', family='serif')
+
+N = 512                  # Saltelli base sample, N*(d+2) runs
+r = 50                   # Morris trajectories, r*(d+1) runs
+
+if __name__ == '__main__':
+    ode = models.system('remodeling')
+    names = sorted(sensitivity.RANGES)
+    d = len(names)
+
+    #--- Sobol indices
+    U = sensitivity.saltelli(N, d, seed=0)
+    start = time.time()
+    Y = sensitivity.evaluate(ode, names, sensitivity.scale(U, sensitivity.RANGES, names))
+    print("%d runs in %.1f s" % (len(U), time.time() - start))
+
+    outputs = [('OCs mean', Y['xC']['mean']),
+               ('OBs mean', Y['xB']['mean']),
+               ('oscillating', (Y['xC']['amplitude'] > 0).astype(float))]
+    print("Oscillating in [100, 200]: %.1f%% of the runs" % (100*outputs[2][1].mean()))
+
+    indices = []
+    for label, y in outputs:
+        S1, ST, c1, cT = sensitivity.sobol(y, d, seed=0)
+        indices.append((label, S1, ST, cT))
+        print(label)
+        for name, s1, st, ct in zip(names, S1, ST, cT):
+            print("  %-4s S1=%6.3f ST=%6.3f +- %.3f" % (name, s1, st, ct))
+
+    #--- Morris elementary effects of the period, where it oscillates
+    Um = sensitivity.morris(r, d, seed=0)
+    start = time.time()
+    Ym = sensitivity.evaluate(ode, names, sensitivity.scale(Um, sensitivity.RANGES, names))
+    print("%d runs in %.1f s" % (len(Um), time.time() - start))
+    morris = [sensitivity.elementary(Ym[x]['period'], Um, d) for x in ('xC', 'xB')]
+
+    # plots
+    plt.figure(figsize=(8,2))
+    x = np.arange(d)
+    for k, (label, S1, ST, cT) in enumerate(indices):
+        plt.subplot(1,3,k+1)
+        plt.bar(x - 0.2, S1, width=0.4, color='#1f77b4')
+        plt.bar(x + 0.2, ST, width=0.4, color='#ff7f0e', yerr=cT)
+        plt.xticks(x, names, fontsize=7, rotation=90)
+        plt.title(label, fontsize=10)
+        plt.ylim([0,1])
+    plt.subplot(1,3,1)
+    plt.legend(['S1','ST'], fontsize=8, loc='upper left')
+    plt.tight_layout()
+
+    plt.figure(figsize=(6,2))
+    for k, (mu, sigma) in enumerate(morris):
+        plt.subplot(1,2,k+1)
+        plt.scatter(mu, sigma, color=['#1f77b4','#ff7f0e'][k], s=10)
+        for name, m, s in zip(names, mu, sigma):
+            if np.isfinite(m):
+                plt.annotate(name, (m, s), fontsize=7)
+        plt.xlabel(r'$\mu^*$', fontsize=10)
+        plt.ylabel(r'$\sigma$', fontsize=10)
+        plt.title(['OCs period','OBs period'][k], fontsize=10)
+    plt.tight_layout()
+    plt.show()
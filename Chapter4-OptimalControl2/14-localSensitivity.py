@@ -0,0 +1,47 @@
+# Optimal Control 2: Cellular-Molecular Level
+# Remodeling and metastasis models, local sensitivities
+#
+# Normalized sensitivities p/x dx/dp of OCs and OBs to every parameter
+# from one integration of the forward sensitivity equations
+# (cellmol.forward), instead of re-simulating with perturbed values as in
+# scripts 02 and 06.
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+import numpy as np
+import pylab as plt
+import time
+
+from cellmol import models, forward
+
+plt.rc('text', usetex=True)
+plt.rc('font', family='serif')
+
+for name in ['remodeling', 'metastasis']:
+    ode = models.system(name)
+    names = sorted(ode.pars)
+
+    start = time.time()
+    t, X, D = forward.sensitivities(ode, names, tdomain=(0, 200), relative=True)
+    print("%s: %d parameters in %.2f s" % (name, len(names), time.time() - start))
+
+    # mean absolute normalized sensitivity over [100, 200]
+    window = t >= 100
+    mean = np.nanmean(np.abs(D[...,0,window]), axis=-1)
+    for k in np.argsort(-mean[0])[:5]:
+        print("  %-4s OCs %8.3f  OBs %8.3f" % (names[k], mean[0,k], mean[1,k]))
+
+    plt.figure(figsize=(8,2))
+    for i, label in enumerate(['OCs', 'OBs']):
+        plt.subplot(1,2,i+1)
+        for k in np.argsort(-mean[i])[:4]:
+            plt.plot(t[window], D[i,k,0,window], linewidth=1, label=names[k])
+        plt.legend(ncol=4, fontsize=7, loc='upper center')
+        plt.xlabel('Time (days)', fontsize=10)
+        plt.ylabel(label + r' $\frac{p}{x}\frac{\partial x}{\partial p}$', fontsize=10)
+        plt.xlim([100,200])
+    plt.tight_layout()
+
+plt.show()
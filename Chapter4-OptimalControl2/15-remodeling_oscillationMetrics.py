@@ -0,0 +1,60 @@
+# Optimal Control 2: Cellular-Molecular Level
+# Bone remodeling model, oscillation metrics along parameter sweeps
+#
+# Period, amplitude and OB phase of the OC/OB oscillations over [100, 200]
+# as functions of each parameter of script 02, over the range of its
+# hand-picked values (cellmol.sensitivity.RANGES). The maxima and minima
+# are located during the integration (cellmol.metrics.events), so the
+# "period down / period up" notes of script 02 are read from the curves.
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+import numpy as np
+import pylab as plt
+import time
+
+from cellmol import models, metrics, sensitivity
+
+plt.rc('text', usetex=True)
+plt.rc('font', family='serif')
+
+ode = models.system('remodeling')
+names = sorted(sensitivity.RANGES)
+points = 32
+
+sweeps = {}
+start = time.time()
+for name in names:
+    lo, hi = sensitivity.RANGES[name]
+    values = np.geomspace(lo, hi, points)
+    sweeps[name] = (values, metrics.events(ode, {name: values}))
+print("%d sweeps of %d values in %.1f s" % (len(names), points, time.time() - start))
+
+for name in names:
+    values, m = sweeps[name]
+    period = m['xC']['period']
+    valid = np.isfinite(period)
+    trend = 'steady state'
+    if valid.sum() >= 2:
+        trend = 'period up' if period[valid][-1] > period[valid][0] else 'period down'
+    print("%-4s oscillating for %2d of %d values, %s" % (name, valid.sum(), points, trend))
+
+# plots
+for metric, label in [('period', 'Period (days)'), ('amplitude', 'OCs amplitude')]:
+    plt.figure(figsize=(8,5))
+    for k, name in enumerate(names):
+        values, m = sweeps[name]
+        plt.subplot(3,3,k+1)
+        plt.plot(values, m['xC'][metric], color='#1f77b4', linewidth=1)
+        if metric == 'period':
+            plt.plot(values, m['xB']['phase']*m['xC']['period'], color='#ff7f0e',
+                     linestyle='--', linewidth=1)
+        plt.xscale('log')
+        plt.xlabel(name, fontsize=10)
+        if k % 3 == 0:
+            plt.ylabel(label, fontsize=8)
+    plt.tight_layout()
+
+plt.show()
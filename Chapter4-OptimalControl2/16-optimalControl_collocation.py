@@ -0,0 +1,52 @@
+# Optimal Control 2: Cellular-Molecular Level
+# Remodeling and metastasis optimal control by direct collocation
+#
+# The BOCOP problems of 11-remodeling-optimalControl and 12-metastasis-
+# optimalControl solved in Python (cellmol.collocation), several cost
+# weights at once over a process pool. Every experiment is written as
+# .export files to its folder, so scripts 09 and 10 plot them by setting
+# folderName (e.g. './rem_colloc/C3_7.2/').
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+import numpy as np
+import pylab as plt
+import time
+
+from cellmol import collocation, exports
+
+plt.rc('text', usetex=True)
+plt.rc('font', family='serif')
+
+if __name__ == '__main__':
+    # folder: (problem, constants different from the BOCOP ones)
+    experiments = {
+        './rem_colloc/C3_7.2/': ('remodeling', {}),
+        './rem_colloc/C3_3.6/': ('remodeling', {'C3': 3.6}),
+        './rem_colloc/C2_0.1/': ('remodeling', {'C2': 0.1}),
+        './met_colloc/C4_7000/': ('metastasis', {}),
+        './met_colloc/C4_3500/': ('metastasis', {'C4': 3500.0}),
+    }
+
+    start = time.time()
+    solutions = collocation.solve_all(experiments, steps=500)
+    print("%d of %d problems solved in %.1f s" % (len(solutions), len(experiments),
+                                                  time.time() - start))
+
+    # controls of every solved experiment, read back from the .export files
+    plt.figure(figsize=(8,4))
+    for k, name in enumerate(['u2', 'u3', 'u4']):
+        plt.subplot(1,3,k+1)
+        for folder in sorted(solutions):
+            data = exports.load(folder)
+            if name in data and np.any(data[name]):
+                plt.plot(data['discretization_times'], data[name], linewidth=1,
+                         label=folder.strip('./').replace('_', ' '))
+        plt.xlabel('Time (days)', fontsize=12)
+        plt.ylabel(name, fontsize=12)
+        plt.legend(fontsize=6)
+    plt.tight_layout()
+
+    plt.show()
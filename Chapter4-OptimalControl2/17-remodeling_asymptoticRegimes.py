@@ -0,0 +1,59 @@
+# Optimal Control 2: Cellular-Molecular Level
+# Bone remodeling model, asymptotic regimes over (bB, aT)
+#
+# Every run is integrated only until it reaches its equilibrium or limit
+# cycle (cellmol.settle) instead of over a fixed tdomain, and the regime
+# is the result: equilibrium, oscillation (with its period) or unsettled
+# after 2000 days, which marks the slow dynamics near the Hopf
+# bifurcations of scripts 03 and 04.
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+import numpy as np
+import pylab as plt
+import time
+
+from cellmol import models, settle
+
+plt.rc('text', usetex=True)
+plt.rc('font', family='serif')
+
+ode = models.system('remodeling')
+bB = np.geomspace(0.1, 3.0, 20)
+aT = np.geomspace(10.0, 200.0, 20)
+B, T = np.meshgrid(bB, aT)
+
+start = time.time()
+result = settle.settle(ode, {'bB': B.ravel(), 'aT': T.ravel()}, tdomain=(0, 2000))
+print("%d runs in %.1f s" % (B.size, time.time() - start))
+for k, regime in enumerate(settle.REGIMES):
+    done = result['regime'] == k
+    print("%-12s %4d runs, settled at t = %.0f on average" % (
+        regime, done.sum(), result['time'][done].mean() if done.any() else np.nan))
+
+# plots
+regime = result['regime'].reshape(B.shape)
+period = result['period'].reshape(B.shape)
+
+plt.figure(figsize=(8,3))
+
+plt.subplot(1,2,1)
+plt.pcolormesh(bB, aT, regime, cmap='Greys', vmin=0, vmax=2, shading='nearest')
+plt.xscale('log')
+plt.yscale('log')
+plt.xlabel('bB', fontsize=12)
+plt.ylabel('aT', fontsize=12)
+plt.title('unsettled / equilibrium / cycle', fontsize=10)
+
+plt.subplot(1,2,2)
+plt.pcolormesh(bB, aT, period, shading='nearest')
+plt.colorbar(label='Period (days)')
+plt.xscale('log')
+plt.yscale('log')
+plt.xlabel('bB', fontsize=12)
+plt.ylabel('aT', fontsize=12)
+
+plt.tight_layout()
+plt.show()
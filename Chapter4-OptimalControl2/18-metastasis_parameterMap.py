@@ -0,0 +1,42 @@
+# Optimal Control 2: Cellular-Molecular Level
+# Bone metastasis model, final tumour burden over (aMT, KC)
+#
+# Final xM, OCs and OBs at t = 200 on a 100x100 grid of the tumour growth
+# stimulated by TGF (aMT) and the OCs inhibition by the tumour (KC),
+# integrated in batches (cellmol.grid) instead of one PyDSTool generator
+# per point as in scripts 05-06.
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+import numpy as np
+import pylab as plt
+import time
+
+from cellmol import models, grid
+
+plt.rc('text', usetex=True)
+plt.rc('font', family='serif')
+
+if __name__ == '__main__':
+    ode = models.system('metastasis')
+    aMT = np.linspace(0.0, 0.05, 100)
+    KC = np.linspace(0.0, 1.0, 100)
+
+    start = time.time()
+    X = grid.scan(ode, [('aMT', aMT), ('KC', KC)], tdomain=(0, 200))
+    print("%d runs in %.1f s" % (X[0].size, time.time() - start))
+
+    # plots
+    plt.figure(figsize=(9,3))
+    for k, (name, label) in enumerate([('xM', 'Tumour'), ('xC', 'OCs'), ('xB', 'OBs')]):
+        plt.subplot(1,3,k+1)
+        plt.pcolormesh(KC, aMT, X[ode.names.index(name)], shading='nearest')
+        plt.colorbar()
+        plt.xlabel('KC', fontsize=12)
+        plt.ylabel('aMT', fontsize=12)
+        plt.title(label + ' at t = 200', fontsize=10)
+    plt.tight_layout()
+
+    plt.show()
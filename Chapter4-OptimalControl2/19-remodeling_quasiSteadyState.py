@@ -0,0 +1,65 @@
+# Optimal Control 2: Cellular-Molecular Level
+# Bone remodeling model, quasi-steady-state TGF-beta
+#
+# The full model against the reduced one with xT = aT*xC/bT
+# (cellmol.reduction), integrated with the explicit DOP853, along the bB
+# range of script 02: time-scale separation, error relative to the range
+# of every state and run times. Eliminating xW as well is shown to be
+# invalid (bW = 1 is not fast).
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+import numpy as np
+import pylab as plt
+import time
+
+from cellmol import models, reduction
+
+plt.rc('text', usetex=True)
+plt.rc('font', family='serif')
+
+ode = models.system('remodeling')
+bB = np.geomspace(0.3, 3.0, 64)
+pars = {'bB': bB}
+
+for fast in [('xT',), ('xT', 'xW')]:
+    reduced = reduction.reduce(ode, fast)
+    print("%s eliminated: %s" % (', '.join(fast), reduced.quasi))
+    error, (t, X, Y) = reduction.error(ode, reduced, pars, method='DOP853')
+    separation = reduction.separation(ode, reduced, X, pars)
+    worst = np.max([error[name] for name in ode.names], axis=0)
+    print("  separation >= %.1f, error: median %.3f, max %.3f, below 5%% for %d of %d runs" % (
+        separation.min(), np.median(worst), worst.max(), (worst < 0.05).sum(), len(bB)))
+
+reduced = reduction.reduce(ode, ['xT'])
+start = time.time()
+models.integrate(ode, pars)
+full = time.time() - start
+start = time.time()
+models.integrate(reduced, pars, method='DOP853')
+print("full model (BDF) %.2f s, reduced (DOP853, explicit) %.2f s" % (full, time.time() - start))
+
+# plots
+error, (t, X, Y) = reduction.error(ode, reduced, pars, method='DOP853')
+plt.figure(figsize=(8,3))
+
+plt.subplot(1,2,1)
+for name, color in [('xC', '#1f77b4'), ('xB', '#ff7f0e')]:
+    plt.plot(bB, error[name], color=color, linewidth=1, label=name)
+plt.xscale('log')
+plt.yscale('log')
+plt.xlabel('bB', fontsize=12)
+plt.ylabel('Relative error', fontsize=12)
+plt.legend(fontsize=8)
+
+plt.subplot(1,2,2)
+k = np.argmin(np.abs(bB - 1.0))
+plt.plot(t, X[0,k], color='#1f77b4', linewidth=1)
+plt.plot(t, Y[0,k], ':', color='k', linewidth=1)
+plt.xlabel('Time (days)', fontsize=12)
+plt.ylabel('OCs', fontsize=12)
+
+plt.tight_layout()
+plt.show()
@@ -0,0 +1,8 @@
+# Optimal Control 2: Cellular-Molecular Level
+# Shared tools for the Chapter 4 scripts
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+from .models import System, system, integrate
@@ -0,0 +1,441 @@
+# Optimal Control 2: Cellular-Molecular Level
+# Direct collocation for the optimal control problems of the BOCOP runs
+#
+# The problems of 11-remodeling-optimalControl and 12-metastasis-
+# optimalControl (dynamics.tpp, criterion.tpp, problem.constants,
+# problem.bounds) are transcribed with Hermite-Simpson collocation on
+# `steps` intervals: states and controls at the nodes and at the interval
+# midpoints, the defects
+#
+#     x_m - (x_k + x_k+1)/2 - h/8 (f_k - f_k+1) = 0
+#     x_k+1 - x_k - h/6 (f_k + 4 f_m + f_k+1)   = 0
+#
+# and the running cost integrated by Simpson's rule. The constraint
+# Jacobian and the Hessian of the Lagrangian are generated symbolically
+# and assembled as sparse matrices (banded, one block per point), and
+# the NLP is solved by scipy's trust-constr (interior point for the
+# bounds, x(0) = ics fixed). The first guess holds the controls at the
+# middle of their bounds with the states simulated by the same scheme, so
+# it is feasible (the fast xT makes the ODE solution infeasible on the
+# grid). The iterates keep the controls inside their bounds, as IPOPT in
+# BOCOP does: the cost is linear in the controls, and with the bounds
+# only enforced at convergence the solver follows the cost to negative
+# controls and diverges (metastasis with C4 = 3500).
+#
+# solve() raises RuntimeError when trust-constr stops without a feasible
+# optimum, so an iterate is never returned as a solution; grids coarser
+# than MIN_STEPS intervals (h = 0.5 days for T = 100, against 1/bT = 0.002
+# days for xT) do not converge and are refused. solve_all() runs several
+# experiments over a process pool and export() writes .export files as
+# the BOCOP ones read by scripts 09-10; experiments that fail are
+# reported and not exported.
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+import multiprocessing
+import os
+
+import numpy as np
+import scipy.sparse as sps
+import sympy as sp
+from scipy.optimize import minimize, Bounds, NonlinearConstraint
+
+from . import models
+
+# problems of the BOCOP folders: dynamics with the controls, running cost
+# (the J state), constants, control bounds and horizon
+PROBLEMS = {
+    'remodeling': {
+        'varspecs': {
+            'xC': 'aC*xB^(-1.0) - bC*xC - u1*xC - bCT*xC*xT',
+            'xB': 'aBW*xB*xW - bB*xB',
+            'xT': 'aT*xC - bT*xT + u2',
+            'xW': 'aW*xT*xC - bW*xW + u3'},
+        'controls': ['u1', 'u2', 'u3'],
+        'cost': 'C1*u1 + C2*u2 + C3*u3 + C4*(xC-xB)^2 + C5*(xC-1)^2',
+        'pars': dict(models.REMODELING, C1=0.0, C2=0.05, C3=7.2, C4=1.0, C5=1.0),
+        'bounds': {'u1': (0.0, 0.0), 'u2': (0.0, 100.0), 'u3': (0.0, 2.0)},
+        'ics': models.ICS['remodeling'],
+        'T': 100.0,
+    },
+    'metastasis': {
+        'varspecs': {
+            'xC': '(1.0 - KC*xM/KM)*aC*xB^(-1.0) - bC*xC - u1*xC - bCT*xC*xT + aCM*xM',
+            'xB': 'aBW*xB*xW - bB*xB',
+            'xT': 'aT*xC - (bT + u2)*xT',
+            'xW': '(1.0 - KB*xM/KM)*aW*xT*xC - bW*xW + u3',
+            'xM': '(aM + aMT*xT)*xM*(1.0 - xM/KM) - u4*xM'},
+        'controls': ['u1', 'u2', 'u3', 'u4'],
+        'cost': 'C1*u1 + C2*u2 + C3*u3 + C4*u4 + C5*xM^2 + C6*(xC-xB)^2',
+        'pars': dict(models.METASTASIS, C1=50.0, C2=0.25, C3=100.0, C4=7000.0,
+                     C5=1000.0, C6=5.0),
+        'bounds': {'u1': (0.0, 0.0), 'u2': (0.0, 200.0), 'u3': (0.0, 0.0), 'u4': (0.0, 0.1)},
+        'ics': models.ICS['metastasis'],
+        'T': 100.0,
+    },
+}
+
+
+# coarsest grid that converges for the BOCOP problems
+MIN_STEPS = 200
+
+# distance of the first controls to their bounds, relative to the box
+MARGIN = 1.e-3
+
+
+class Problem(object):
+    # Symbolic optimal control problem: min int L(x, u) dt, x' = f(x, u),
+    # x(0) = ics, bounds on u, x >= 0
+
+    def __init__(self, varspecs, controls, cost, pars, bounds, ics, T):
+        self.definition = (varspecs, controls, cost, pars, bounds, ics, T)
+        self.varspecs = dict(varspecs)
+        self.names    = list(varspecs)
+        self.controls = list(controls)
+        self.pars     = dict(pars)
+        self.ics      = np.array([ics[name] for name in self.names], dtype=float)
+        self.lower    = np.array([bounds[u][0] for u in self.controls], dtype=float)
+        self.upper    = np.array([bounds[u][1] for u in self.controls], dtype=float)
+        self.T        = T
+        self._names   = sorted(pars)
+        z = [sp.Symbol(name) for name in self.names + self.controls]
+        f = [models.parse(varspecs[name]) for name in self.names]
+        L = models.parse(cost)
+        args = z + [sp.Symbol(name) for name in self._names]
+        self._f  = sp.lambdify(args, f, 'numpy')
+        self._L  = sp.lambdify(args, L, 'numpy')
+        self._fz = sp.lambdify(args, sp.Matrix(f).jacobian(z).tolist(), 'numpy')
+        self._Lz = sp.lambdify(args, [sp.diff(L, v) for v in z], 'numpy')
+        self._fzz = sp.lambdify(args, [sp.hessian(fi, z).tolist() for fi in f], 'numpy')
+        self._Lzz = sp.lambdify(args, sp.hessian(L, z).tolist(), 'numpy')
+
+    def __reduce__(self):
+        # the compiled functions are not picklable, rebuild them
+        return (Problem, self.definition)
+
+    @property
+    def n(self):
+        return len(self.names)
+
+    @property
+    def m(self):
+        return len(self.controls)
+
+    def _eval(self, function, Z, shape):
+        # function of the points Z (n+m, K) as an array of shape + (K,);
+        # constant entries of the symbolic arrays are broadcast
+        values = function(*(list(Z) + [self.pars[name] for name in self._names]))
+        if not shape:
+            values = [values]
+        for _ in shape[1:]:
+            values = [v for row in values for v in row]
+        out = np.empty((len(values), Z.shape[1]))
+        for i, value in enumerate(values):
+            out[i] = value
+        return out.reshape(shape + (Z.shape[1],))
+
+    def f(self, Z):
+        return self._eval(self._f, Z, (self.n,))
+
+    def L(self, Z):
+        return self._eval(self._L, Z, ())
+
+    def fz(self, Z):
+        return self._eval(self._fz, Z, (self.n, self.n + self.m))
+
+    def Lz(self, Z):
+        return self._eval(self._Lz, Z, (self.n + self.m,))
+
+    def fzz(self, Z):
+        d = self.n + self.m
+        return self._eval(self._fzz, Z, (self.n, d, d))
+
+    def Lzz(self, Z):
+        d = self.n + self.m
+        return self._eval(self._Lzz, Z, (d, d))
+
+
+def problem(name, **pars):
+    # Problem of the 'remodeling' or 'metastasis' BOCOP folder; keyword
+    # arguments override constants (e.g. cost weights)
+    definition = dict(PROBLEMS[name])
+    definition['pars'] = dict(definition['pars'], **pars)
+    return Problem(**definition)
+
+
+class Solution(object):
+
+    def __init__(self, t, StateVar, Controls, J, iterations, converged, message):
+        self.t          = t
+        self.StateVar   = StateVar
+        self.Controls   = Controls
+        self.J          = J
+        self.iterations = iterations
+        self.converged  = converged
+        self.message    = message
+
+
+class Transcription(object):
+    # Hermite-Simpson NLP of prob on `steps` intervals: variables z of the
+    # 2*steps+1 nodes and midpoints (point-major, states then controls),
+    # constraints D1, D2 of every interval; x_0 = ics is a bound
+
+    def __init__(self, prob, steps):
+        self.prob  = prob
+        self.steps = steps
+        self.d     = prob.n + prob.m
+        self.P     = 2*steps + 1
+        self.h     = prob.T/steps
+        self.t     = np.linspace(0.0, prob.T, self.P)
+        k = np.arange(steps)
+        self.left, self.mid, self.right = 2*k, 2*k + 1, 2*k + 2
+        # Simpson weights of the points
+        self.w = np.zeros(self.P)
+        self.w[self.left] += self.h/6.0
+        self.w[self.mid] += 4.0*self.h/6.0
+        self.w[self.right] += self.h/6.0
+        self._pattern()
+
+    def points(self, z):
+        # variables (P*d,) -> points (d, P)
+        return z.reshape(self.P, self.d).T
+
+    def objective(self, z):
+        return np.dot(self.w, self.prob.L(self.points(z)))
+
+    def gradient(self, z):
+        return (self.prob.Lz(self.points(z))*self.w).T.ravel()
+
+    def hessian(self, z):
+        return _blocks(self.prob.Lzz(self.points(z))*self.w)
+
+    def constraints(self, z):
+        n, h = self.prob.n, self.h
+        l, c, r = self.left, self.mid, self.right
+        Z = self.points(z)
+        x = Z[:n]
+        F = self.prob.f(Z)
+        out = np.empty((n, 2*self.steps))
+        out[:,0::2] = x[:,c] - 0.5*(x[:,l] + x[:,r]) - h/8.0*(F[:,l] - F[:,r])
+        out[:,1::2] = x[:,r] - x[:,l] - h/6.0*(F[:,l] + 4.0*F[:,c] + F[:,r])
+        return out.T.ravel()
+
+    def _pattern(self):
+        # rows and columns of the (n, d) blocks of the constraint Jacobian:
+        # block row b, point j -> rows b*n + i, columns j*d + v
+        n, d = self.prob.n, self.d
+        k = np.arange(self.steps)
+        blocks = []
+        for b in (2*k, 2*k + 1):
+            blocks += [(b, self.left), (b, self.right), (b, self.mid)]
+        i = np.arange(n)[:,None,None]
+        v = np.arange(d)[None,:,None]
+        self._rows = np.concatenate([np.broadcast_to(b*n + i, (n, d, len(b))).ravel()
+                                     for b, _ in blocks])
+        self._cols = np.concatenate([np.broadcast_to(j*d + v, (n, d, len(j))).ravel()
+                                     for _, j in blocks])
+        self.shape = (2*n*self.steps, self.P*d)
+
+    def jacobian(self, z):
+        n, h = self.prob.n, self.h
+        l, c, r = self.left, self.mid, self.right
+        G = self.prob.fz(self.points(z))             # (n, d, P)
+        I = np.eye(n, self.d)[:,:,None]
+        values = [-0.5*I - h/8.0*G[:,:,l], -0.5*I + h/8.0*G[:,:,r], I + 0.0*G[:,:,c],
+                  -I - h/6.0*G[:,:,l], I - h/6.0*G[:,:,r], -4.0*h/6.0*G[:,:,c]]
+        return sps.csr_matrix((np.concatenate([v.ravel() for v in values]),
+                               (self._rows, self._cols)), shape=self.shape)
+
+    def constraint_hessian(self, z, y):
+        # sum of the multipliers y times the Hessians of the defects
+        n, h = self.prob.n, self.h
+        y = np.asarray(y).reshape(2*self.steps, n)
+        y1, y2 = y[0::2].T, y[1::2].T                # (n, steps)
+        coef = np.zeros((n, self.P))
+        coef[:,self.left] += -h/8.0*y1 - h/6.0*y2
+        coef[:,self.right] += h/8.0*y1 - h/6.0*y2
+        coef[:,self.mid] += -4.0*h/6.0*y2
+        return _blocks(np.einsum('ip,iabp->abp', coef, self.prob.fzz(self.points(z))))
+
+    def bounds(self):
+        # states >= 0 (= ics at t = 0), controls in their box
+        lo = np.tile(np.concatenate([np.zeros(self.prob.n), self.prob.lower]), self.P)
+        hi = np.tile(np.concatenate([np.full(self.prob.n, np.inf), self.prob.upper]), self.P)
+        lo[:self.prob.n] = hi[:self.prob.n] = self.prob.ics
+        return lo, hi
+
+    def simulate(self, U, tolerance=1.e-12, iterations=50):
+        # states (n, P) solving the defects for the controls U (m, P),
+        # interval by interval (Hermite-Simpson as an implicit integrator)
+        prob = self.prob
+        n, h = prob.n, self.h
+        X = np.empty((n, self.P))
+        X[:,0] = prob.ics
+        I = np.eye(n)
+        for k in range(self.steps):
+            j = 2*k
+            Z = np.vstack([np.repeat(X[:,j:j+1], 3, axis=1), U[:,j:j+3]])
+            for _ in range(iterations):
+                F = prob.f(Z)
+                G = prob.fz(Z)[:,:n]
+                x0, xm, x1 = Z[:n].T
+                c = np.concatenate([xm - 0.5*(x0 + x1) - h/8.0*(F[:,0] - F[:,2]),
+                                    x1 - x0 - h/6.0*(F[:,0] + 4.0*F[:,1] + F[:,2])])
+                if np.abs(c).max() < tolerance:
+                    break
+                A = np.block([[I, -0.5*I + h/8.0*G[:,:,2]],
+                              [-4.0*h/6.0*G[:,:,1], I - h/6.0*G[:,:,2]]])
+                dx = np.linalg.solve(A, c)
+                Z[:n,1] -= dx[:n]
+                Z[:n,2] -= dx[n:]
+            X[:,j+1:j+3] = Z[:n,1:]
+        return X
+
+    def guess(self, solution=None):
+        # controls of a Solution interpolated to the points, or the middle
+        # of their bounds; the states are simulated with the controls so
+        # that the guess is feasible
+        prob = self.prob
+        if solution is not None:
+            U = np.array([np.interp(self.t, solution.t, u) for u in solution.Controls])
+        else:
+            U = np.repeat(0.5*(prob.lower + prob.upper)[:,None], self.P, axis=1)
+        lo, hi = self.bounds()
+        U = np.clip(U, lo.reshape(self.P, self.d).T[prob.n:], hi.reshape(self.P, self.d).T[prob.n:])
+        return np.vstack([self.simulate(U), U]).T.ravel()
+
+
+def solve(prob, steps=500, guess=None, tolerance=1.e-8, barrier=1.e-3, maxIterations=3000,
+          verbose=True):
+    # Hermite-Simpson transcription of prob on `steps` intervals solved by
+    # trust-constr; guess is a Solution (e.g. of other constants). Returns
+    # a Solution on the 2*steps+1 nodes and midpoints, raises RuntimeError
+    # if the NLP is not solved.
+    if steps < MIN_STEPS:
+        raise ValueError('%d steps, the NLP does not converge below %d' % (steps, MIN_STEPS))
+    nlp = Transcription(prob, steps)
+    z0 = nlp.guess(guess)
+    lo, hi = nlp.bounds()
+
+    # initial states and controls with equal bounds are kept out of the NLP;
+    # the controls start inside their bounds and stay there
+    free = lo != hi
+    control = np.tile(np.arange(nlp.d) >= prob.n, nlp.P)
+    inside = MARGIN*np.where(control, hi - lo, 0.0)
+    z0[free] = np.clip(z0[free], (lo + inside)[free], (hi - inside)[free])
+
+    def full(y):
+        z = z0.copy()
+        z[free] = y
+        return z
+
+    result = minimize(
+        lambda y: nlp.objective(full(y)), z0[free], method='trust-constr',
+        jac=lambda y: nlp.gradient(full(y))[free],
+        hess=lambda y: nlp.hessian(full(y))[free][:,free],
+        bounds=Bounds(lo[free], hi[free], keep_feasible=control[free]),
+        constraints=[NonlinearConstraint(
+            lambda y: nlp.constraints(full(y)), 0.0, 0.0,
+            jac=lambda y: nlp.jacobian(full(y))[:,free],
+            hess=lambda y, v: nlp.constraint_hessian(full(y), v)[free][:,free])],
+        options={'maxiter': maxIterations, 'gtol': tolerance, 'xtol': tolerance**2,
+                 'initial_barrier_parameter': barrier, 'initial_barrier_tolerance': barrier,
+                 'verbose': 2 if verbose else 0})
+
+    z = full(result.x)
+    Z = nlp.points(z)
+    J = nlp.objective(z)
+    if verbose:
+        print("J=%.8e after %d iterations: %s" % (J, result.nit, result.message))
+    # trust-constr reports an infeasible stop as status 4
+    if result.status not in (1, 2) or result.constr_violation > tolerance:
+        raise RuntimeError('no solution after %d iterations: %s (J=%.6e, constraint violation %.1e)'
+                           % (result.nit, result.message, J, result.constr_violation))
+    return Solution(nlp.t, Z[:prob.n].copy(), Z[prob.n:].copy(), J, result.nit, True,
+                    result.message)
+
+
+def export(folder, prob, solution):
+    # .export files of a solution (one value per line, as the BOCOP ones):
+    # discretization_times, the controls and the states, plus J
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+    columns = [('discretization_times', solution.t)]
+    columns += list(zip(prob.controls, solution.Controls))
+    columns += [('J', _cost(prob, solution))] + list(zip(prob.names, solution.StateVar))
+    for name, data in columns:
+        np.savetxt(os.path.join(folder, name + '.export'), data, fmt='%.15g')
+
+
+def _cost(prob, solution):
+    # running cost integrated from 0 to every point: Simpson's rule to the
+    # nodes, the integral of the same parabola to the midpoints
+    L = prob.L(np.vstack([solution.StateVar, solution.Controls]))
+    h = solution.t[2] - solution.t[0]
+    L0, Lm, L1 = L[:-1:2], L[1::2], L[2::2]
+    nodes = np.concatenate([[0.0], np.cumsum(h/6.0*(L0 + 4.0*Lm + L1))])
+    J = np.empty_like(L)
+    J[::2] = nodes
+    J[1::2] = nodes[:-1] + h/24.0*(5.0*L0 + 8.0*Lm - L1)
+    return J
+
+
+def _init(options):
+    # worker initializer: solver options are sent once per process
+    global _options
+    _options = options
+
+
+def _solve(task):
+    # solution and message; the solution is None (and nothing is exported)
+    # if the NLP was not solved
+    folder, name, pars = task
+    prob = problem(name, **pars)
+    try:
+        solution = solve(prob, **_options)
+    except RuntimeError as error:
+        return None, str(error)
+    if folder is not None:
+        export(folder, prob, solution)
+    return solution, solution.message
+
+
+def solve_all(experiments, steps=500, processes=None, verbose=True, **options):
+    # solutions of experiments {folder: (problem name, constants)} solved
+    # in parallel, each exported to its folder (None: not exported); the
+    # experiments without a solution are reported and left out
+    processes = processes or multiprocessing.cpu_count()
+    options = dict(options, steps=steps, verbose=False)
+    tasks = [(folder, name, pars) for folder, (name, pars) in sorted(
+        experiments.items(), key=lambda item: str(item[0]))]
+
+    if processes > 1:
+        pool = multiprocessing.Pool(min(processes, len(tasks)), _init, (options,))
+        results = pool.imap(_solve, tasks)
+    else:
+        _init(options)
+        results = map(_solve, tasks)
+    solutions = {}
+    for (folder, name, _), (solution, message) in zip(tasks, results):
+        if solution is None:
+            print("%s (%s): not solved, not exported: %s" % (folder, name, message))
+            continue
+        solutions[folder] = solution
+        if verbose:
+            print("%s (%s): J=%.6e, %d iterations, %s" % (
+                folder, name, solution.J, solution.iterations, message))
+    if processes > 1:
+        pool.close()
+        pool.join()
+    return solutions
+
+
+def _blocks(H):
+    # block-diagonal sparse matrix of the blocks H (d, d, P)
+    d, _, P = H.shape
+    i = np.arange(d)[:,None,None] + d*np.arange(P)
+    j = np.arange(d)[None,:,None] + d*np.arange(P)
+    return sps.csr_matrix((H.ravel(), (np.broadcast_to(i, H.shape).ravel(),
+                                       np.broadcast_to(j, H.shape).ravel())), shape=(d*P, d*P))
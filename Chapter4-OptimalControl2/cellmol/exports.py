@@ -0,0 +1,137 @@
+# Optimal Control 2: Cellular-Molecular Level
+# Cached loading of the BOCOP .export files
+#
+# An experiment folder has one .export file per quantity
+# (discretization_times, u1..u4, xC, xB, ...), one value per line (the
+# first column is read, as csv.reader and row[0] in scripts 09-10). The
+# files of a folder are parsed once with numpy's text reader and written
+# to one binary cache file in the folder:
+#
+#   magic, header length, JSON header (per column: offset, length, crc32
+#   of the data and size/mtime of the source file), then the float64
+#   columns, each aligned to 64 bytes
+#
+# Later loads map the cache (np.memmap) and return views of it, without
+# parsing or copying. The cache is rebuilt when a source file changes
+# (size or mtime), appears or disappears; verify=True also checks the
+# crc32 of every column, which reads the data.
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+import glob
+import json
+import os
+import struct
+import zlib
+
+import numpy as np
+
+MAGIC = b'CMEXPORT'
+VERSION = 1
+CACHE = 'exports.cache'
+ALIGN = 64
+
+
+def _sources(folder):
+    # export files of a folder, name -> (path, size, mtime)
+    out = {}
+    for path in sorted(glob.glob(os.path.join(folder, '*.export'))):
+        st = os.stat(path)
+        name = os.path.basename(path)[:-len('.export')]
+        out[name] = (path, st.st_size, st.st_mtime_ns)
+    return out
+
+
+def parse(path):
+    # first column of an .export file
+    return np.loadtxt(path, delimiter=',', usecols=0, ndmin=1, dtype=float)
+
+
+def _write(cache, sources):
+    # parse the sources and write the cache atomically; returns the columns
+    columns = dict((name, parse(path)) for name, (path, _, _) in sources.items())
+    header = {'version': VERSION, 'columns': {}}
+    offset = 0
+    for name, data in columns.items():
+        header['columns'][name] = {
+            'offset': offset, 'length': len(data),
+            'crc32': zlib.crc32(data.tobytes()),
+            'size': sources[name][1], 'mtime': sources[name][2]}
+        offset += -(-data.nbytes//ALIGN)*ALIGN
+    text = json.dumps(header).encode()
+    start = -(-(len(MAGIC) + 4 + len(text))//ALIGN)*ALIGN
+    text = text.ljust(start - len(MAGIC) - 4)
+
+    tmp = cache + '.tmp%d' % os.getpid()
+    with open(tmp, 'wb') as f:
+        f.write(MAGIC + struct.pack('<I', len(text)) + text)
+        for name, data in columns.items():
+            f.seek(start + header['columns'][name]['offset'])
+            f.write(data.astype('<f8').tobytes())
+        f.truncate(start + offset)
+    os.replace(tmp, cache)
+    return columns
+
+
+def _read(cache):
+    # header and start of the data of a cache file, None if unreadable
+    try:
+        with open(cache, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                return None
+            size, = struct.unpack('<I', f.read(4))
+            header = json.loads(f.read(size).decode())
+    except (IOError, OSError, ValueError, struct.error):
+        return None
+    if header.get('version') != VERSION:
+        return None
+    return header, len(MAGIC) + 4 + size
+
+
+def _fresh(header, sources):
+    columns = header['columns']
+    return set(columns) == set(sources) and all(
+        columns[name]['size'] == size and columns[name]['mtime'] == mtime
+        for name, (_, size, mtime) in sources.items())
+
+
+def load(folder, cache=CACHE, verify=False):
+    # {name: array} of the .export files of a folder, from the cache when
+    # it is up to date (read-only memory-mapped views), otherwise parsed
+    # and cached; cache=None disables the cache
+    sources = _sources(folder)
+    if not sources:
+        raise IOError('no .export files in %s' % folder)
+    if cache is None:
+        return dict((name, parse(path)) for name, (path, _, _) in sources.items())
+    path = os.path.join(folder, cache)
+    entry = _read(path)
+    if entry is None or not _fresh(entry[0], sources):
+        try:
+            return _write(path, sources)
+        except (IOError, OSError):
+            # read-only folder: parse without caching
+            return dict((name, parse(p)) for name, (p, _, _) in sources.items())
+    header, start = entry
+    if os.path.getsize(path) == start:
+        data = np.zeros(0)
+    else:
+        data = np.memmap(path, dtype='<f8', mode='r', offset=start)
+    out = {}
+    for name, column in header['columns'].items():
+        i = column['offset']//8
+        out[name] = data[i:i + column['length']]
+        if verify and zlib.crc32(out[name].tobytes()) != column['crc32']:
+            return _write(path, sources)
+    return out
+
+
+def load_all(root, cache=CACHE, verify=False):
+    # {folder: columns} of every folder under root with .export files
+    out = {}
+    for folder, _, files in sorted(os.walk(root)):
+        if any(name.endswith('.export') for name in files):
+            out[folder] = load(folder, cache, verify)
+    return out
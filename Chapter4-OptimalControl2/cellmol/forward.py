@@ -0,0 +1,78 @@
+# Optimal Control 2: Cellular-Molecular Level
+# Forward sensitivity equations
+#
+# The local sensitivities S_k = dx/dp_k of all the parameters p_k come out
+# of one integration of the state together with the variational equations
+#
+#     dS_k/dt = J(x) S_k + df/dp_k(x),    S_k(0) = 0
+#
+# where J = df/dx and df/dp are generated from the varspecs (models.System),
+# instead of 2p extra simulations with perturbed values. The augmented
+# system is stiff like the state; BDF gets the block-diagonal Jacobian
+# with J on every block (the coupling of S_k to x through dJ/dx is left
+# out of the Newton matrix, as in staggered corrector methods), which
+# keeps the cost of the linear algebra linear in p.
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+import numpy as np
+import scipy.sparse as sps
+from scipy.integrate import solve_ivp
+
+from . import models
+
+
+def sensitivities(system, names=None, pars=None, tdomain=(0.0, 200.0), ics=None, dt=0.1,
+                  rtol=1.e-6, atol=1.e-9, relative=False):
+    # t, states (n, S, len(t)) and sensitivities (n, p, S, len(t)) for the
+    # parameters `names` (all by default) of a batch of parameter sets as in
+    # models.integrate. relative=True returns p_k/x dx/dp_k instead
+    # (nan where x = 0).
+    if names is None:
+        names = sorted(system.pars)
+    names = list(names)
+    S = models._batch(pars)
+    n = system.n
+    p = len(names)
+    blocks = p + 1
+    x0 = system.ics if ics is None else np.asarray(ics, dtype=float)
+    y0 = np.zeros((blocks, n, S))
+    y0[0] = np.broadcast_to(x0.reshape(n, -1), (n, S))
+    t = np.arange(tdomain[0], tdomain[1] + 0.5*dt, dt)
+    rows = np.arange(blocks*n*S).reshape(blocks, n, S)
+
+    def f(_, y):
+        y = y.reshape(blocks, n, S)
+        x = y[0]
+        J = system.jacobian(x, pars)
+        dy = np.empty_like(y)
+        dy[0] = system.f(x, pars)
+        dy[1:] = np.einsum('ijs,kjs->kis', J, y[1:]) + np.moveaxis(
+            system.parameter_jacobian(x, names, pars), 1, 0)
+        return dy.ravel()
+
+    def jac(_, y):
+        J = system.jacobian(y.reshape(blocks, n, S)[0], pars)
+        i = np.broadcast_to(rows[:,:,None,:], (blocks, n, n, S))
+        j = np.broadcast_to(rows[:,None,:,:], (blocks, n, n, S))
+        v = np.broadcast_to(J, (blocks, n, n, S))
+        return sps.csc_matrix((v.ravel(), (i.ravel(), j.ravel())),
+                              shape=(blocks*n*S, blocks*n*S))
+
+    # the error norm of solve_ivp is the RMS over all the components
+    scale = 1.0/np.sqrt(blocks*S)
+    sol = solve_ivp(f, (t[0], t[-1]), y0.ravel(), method='BDF', jac=jac, t_eval=t,
+                    rtol=rtol*scale, atol=atol*scale)
+    if sol.status != 0:
+        raise RuntimeError(sol.message)
+    y = sol.y.reshape(blocks, n, S, -1)
+    X = y[0]
+    D = np.moveaxis(y[1:], 0, 1)
+    if relative:
+        values = dict(system.pars, **(pars or {}))
+        factor = np.array([np.broadcast_to(values[name], (S,)) for name in names])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            D = D*factor[None,:,:,None]/np.where(X == 0, np.nan, X)[:,None]
+    return sol.t, X, D
@@ -0,0 +1,138 @@
+# Optimal Control 2: Cellular-Molecular Level
+# Final states over parameter grids
+#
+# Maps such as the final xM of the metastasis model over (aMT, KC) are a
+# batch of independent runs. Integrated as one system (models.integrate)
+# they share the step size, and the fast transients of a few runs slow
+# down all: here every run keeps its own time and step size in a
+# vectorized Rosenbrock method (stiff, one batched (n, n) inverse per
+# step), only the final state is kept, and chunks of the grid are spread
+# over a process pool.
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+import multiprocessing
+
+import numpy as np
+
+from . import models
+
+
+# 4th order Rosenbrock method with 3rd order error estimate (Kaps-Rentrop
+# form, Shampine's coefficients), for autonomous systems
+GAMMA = 0.5
+A21 = 2.0
+A31, A32 = 48.0/25.0, 6.0/25.0
+C21 = -8.0
+C31, C32 = 372.0/25.0, 12.0/5.0
+C41, C42, C43 = -112.0/125.0, -54.0/125.0, -2.0/5.0
+B1, B2, B3, B4 = 19.0/9.0, 1.0/2.0, 25.0/108.0, 125.0/108.0
+E1, E2, E3, E4 = 17.0/54.0, 7.0/36.0, 0.0, 125.0/108.0
+
+
+def _subset(pars, samples):
+    # parameters of some trajectories of the batch
+    return dict((k, v[samples] if np.ndim(v) > 0 else v) for k, v in pars.items())
+
+
+def final(system, pars=None, tdomain=(0.0, 200.0), ics=None, rtol=1.e-6, atol=1.e-9,
+          maxSteps=100000):
+    # states (n, S) at tdomain[1] of a batch of parameter sets (as in
+    # models.integrate), without sampling the trajectories. Every run has
+    # its own time and step size (error norm of its n states, as a single
+    # solve_ivp run), so a stiff run does not slow down the others; all
+    # runs take one step per iteration with batched (n, n) solves, and the
+    # finished ones leave the batch
+    S = models._batch(pars)
+    n = system.n
+    pars = dict((name, np.asarray(v, dtype=float)) for name, v in (pars or {}).items())
+    x0 = system.ics if ics is None else np.asarray(ics, dtype=float)
+    y = np.array(np.broadcast_to(x0.reshape(n, -1), (n, S)))
+    t0, t1 = float(tdomain[0]), float(tdomain[1])
+    t = np.full(S, t0)
+    h = np.full(S, 1.e-4*(t1 - t0))
+    I = np.eye(n)
+
+    active = np.arange(S)
+    for _ in range(maxSteps):
+        if len(active) == 0:
+            return y
+        p = _subset(pars, active)
+        x = y[:,active]
+        step = np.minimum(h[active], t1 - t[active])
+
+        F = system.f(x, p)
+        J = np.moveaxis(system.jacobian(x, p), -1, 0)
+        W = np.linalg.inv(I/(GAMMA*step)[:,None,None] - J)
+
+        def solve(b):
+            return np.einsum('sij,js->is', W, b)
+
+        g1 = solve(F)
+        F = system.f(x + A21*g1, p)
+        g2 = solve(F + C21*g1/step)
+        F = system.f(x + A31*g1 + A32*g2, p)
+        g3 = solve(F + (C31*g1 + C32*g2)/step)
+        g4 = solve(F + (C41*g1 + C42*g2 + C43*g3)/step)
+        new = x + B1*g1 + B2*g2 + B3*g3 + B4*g4
+        error = E1*g1 + E2*g2 + E3*g3 + E4*g4
+
+        scale = atol + rtol*np.maximum(np.abs(x), np.abs(new))
+        norm = np.sqrt(np.mean((error/scale)**2, axis=0))
+        norm[~np.isfinite(norm) | ~np.all(np.isfinite(new), axis=0)] = np.inf
+        accept = norm <= 1.0
+        done = active[accept]
+        t[done] = np.where(step[accept] >= t1 - t[done], t1, t[done] + step[accept])
+        y[:,done] = new[:,accept]
+        with np.errstate(divide='ignore'):
+            factor = np.clip(0.9*norm**-0.25, 0.2, 5.0)
+        h[active] = step*np.where(accept, factor, np.minimum(factor, 0.5))
+        active = active[t[active] < t1]
+    raise RuntimeError('%d runs not finished after %d steps' % (len(active), maxSteps))
+
+
+def _init(system, options):
+    # worker initializer: the system is sent once per process
+    global _system, _options
+    _system = system
+    _options = options
+
+
+def _evaluate(task):
+    return final(_system, task, **_options)
+
+
+def scan(system, axes, tdomain=(0.0, 200.0), chunk=None, processes=None, verbose=True,
+         **options):
+    # final states over the grid of axes, a list of (parameter, values):
+    # returns an array (n, len(values 1), len(values 2), ...) with the
+    # grid as np.meshgrid(..., indexing='ij'); options go to final(). The
+    # grid is split in `chunk` runs, by default one chunk per process
+    names = [name for name, _ in axes]
+    grids = np.meshgrid(*[np.asarray(values, dtype=float) for _, values in axes], indexing='ij')
+    shape = grids[0].shape
+    points = np.array([g.ravel() for g in grids])
+    processes = processes or multiprocessing.cpu_count()
+    chunk = chunk or -(-points.shape[1]//processes)
+    options = dict(options, tdomain=tdomain)
+    tasks = [dict(zip(names, points[:,i0:i0+chunk])) for i0 in range(0, points.shape[1], chunk)]
+
+    if processes > 1:
+        pool = multiprocessing.Pool(processes, _init, (system, options))
+        results = []
+        for k, result in enumerate(pool.imap(_evaluate, tasks)):
+            results.append(result)
+            if verbose:
+                print("Chunk %d of %d" % (k + 1, len(tasks)))
+        pool.close()
+        pool.join()
+    else:
+        _init(system, options)
+        results = []
+        for k, task in enumerate(tasks):
+            results.append(_evaluate(task))
+            if verbose:
+                print("Chunk %d of %d" % (k + 1, len(tasks)))
+    return np.concatenate(results, axis=1).reshape((system.n,) + shape)
@@ -0,0 +1,217 @@
+# Optimal Control 2: Cellular-Molecular Level
+# Oscillation metrics of sampled trajectories and during integration
+#
+# Period, amplitude and mean of every state over a time window, for a
+# batch of trajectories (n, S, len(t)) as returned by models.integrate.
+# Maxima are the local maxima of the samples refined by a parabola
+# through the three neighbouring points; the period is the mean distance
+# between maxima and the amplitude the mean of max - min per cycle. A
+# trajectory without two maxima in the window, or with an amplitude below
+# `tolerance` relative to its mean, is at a steady state: amplitude 0 and
+# period nan.
+#
+# events() computes the metrics while integrating, without sampling: the
+# maxima and minima are the roots of dx/dt = f(x) (from + to - and from -
+# to +), bracketed after every BDF step and located by the Illinois
+# method on the dense output of the step, for all the trajectories of a batch at once.
+# It adds the phase of every state behind the first one (fraction of its
+# period, circular mean over the cycles) and the convergence to the limit
+# cycle (relative change of period and maxima over the last two cycles,
+# small on the cycle, nan with fewer than three maxima).
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+import numpy as np
+
+from . import models
+
+METRICS = ('period', 'amplitude', 'mean')
+EVENTS = METRICS + ('phase', 'convergence')
+
+
+def maxima(t, x):
+    # times and values of the local maxima of x (samples on the last axis,
+    # uniform t); returns two lists of arrays, one entry per trajectory
+    x = np.atleast_2d(x)
+    dt = t[1] - t[0]
+    times, values = [], []
+    for y in x:
+        i = np.flatnonzero((y[1:-1] > y[:-2]) & (y[1:-1] >= y[2:])) + 1
+        a, b, c = y[i-1], y[i], y[i+1]
+        d = a - 2.0*b + c
+        s = np.where(d < 0, 0.5*(a - c)/np.where(d < 0, d, 1.0), 0.0)
+        times.append(t[i] + s*dt)
+        values.append(b - 0.25*(a - c)*s)
+    return times, values
+
+
+def oscillation(t, X, window=(100.0, 200.0), names=None, tolerance=1.e-6):
+    # metrics[name][metric] arrays of shape (S,) for the states of X
+    # (n, S, len(t)); names defaults to x0, x1, ...
+    X = np.asarray(X)
+    n, S = X.shape[:2]
+    if names is None:
+        names = ['x%d' % i for i in range(n)]
+    inside = (t >= window[0]) & (t <= window[1])
+    t = t[inside]
+    X = X[...,inside]
+    out = {}
+    for k, name in enumerate(names):
+        period = np.full(S, np.nan)
+        amplitude = np.full(S, np.nan)
+        times, values = maxima(t, X[k])
+        mins = maxima(t, -X[k])[1]
+        mean = X[k].mean(axis=-1)
+        for s in range(S):
+            if len(times[s]) >= 2 and len(mins[s]) >= 1:
+                period[s] = np.mean(np.diff(times[s]))
+                amplitude[s] = np.mean(values[s]) + np.mean(mins[s])
+        flat = ~(amplitude > tolerance*np.abs(mean))
+        period[flat] = np.nan
+        amplitude[flat] = 0.0
+        out[name] = {'period': period, 'amplitude': amplitude, 'mean': mean}
+    return out
+
+
+def _states(dense, tau, samples, n, S):
+    # states (n, len(samples)) of some trajectories of a batch, each at its
+    # own time tau, from the dense output of a step
+    return dense(tau).reshape(n, S, len(samples))[:, samples, np.arange(len(samples))]
+
+
+def _roots(g, g0, g1, t0, t1, iterations=50):
+    # roots in [t0, t1] of the trajectories where g goes from + (g0 at
+    # t0) to - or 0 (g1 at t1); g(tau, samples) evaluates g of some
+    # trajectories, each at its own time. Illinois (modified regula falsi)
+    # on all the brackets at once; returns the trajectories and the roots
+    hit = np.flatnonzero((g0 > 0) & (g1 <= 0))
+    if len(hit) == 0:
+        return hit, np.zeros(0)
+    lo, glo = np.full(len(hit), t0), g0[hit]
+    hi, ghi = np.full(len(hit), t1), g1[hit]
+    side = np.zeros(len(hit))
+    for _ in range(iterations):
+        tau = np.where(glo != ghi, (lo*ghi - hi*glo)/np.where(glo != ghi, ghi - glo, 1.0),
+                       0.5*(lo + hi))
+        tau = np.clip(tau, lo, hi)
+        value = g(tau, hit)
+        right = value > 0
+        lo = np.where(right, tau, lo)
+        hi = np.where(right, hi, tau)
+        glo = np.where(right, value, np.where(side < 0, 0.5*glo, glo))
+        ghi = np.where(right, np.where(side > 0, 0.5*ghi, ghi), value)
+        side = np.where(right, 1.0, -1.0)
+        if np.all(np.abs(value) <= 1.e-12*(np.abs(g1[hit]) + np.abs(g0[hit]))) \
+                or np.all(hi - lo <= 1.e-12*(t1 - t0)):
+            break
+    return hit, tau
+
+
+def events(system, pars=None, tdomain=(0.0, 200.0), window=(100.0, 200.0),
+           names=('xC', 'xB'), ics=None, rtol=1.e-6, atol=1.e-9, tolerance=1.e-6,
+           iterations=50):
+    # metrics[name][metric] arrays of shape (S,) for a batch of parameter
+    # sets (as in models.integrate); metrics are EVENTS, the phase is
+    # relative to names[0]
+    S = models._batch(pars)
+    n = system.n
+    index = [system.names.index(name) for name in names]
+    x0 = system.ics if ics is None else np.asarray(ics, dtype=float)
+    x0 = np.broadcast_to(x0.reshape(n, -1), (n, S)).ravel()
+    f, jac = models.problem(system, pars, S)
+    scale = 1.0/np.sqrt(S)
+    solver = models.BlockBDF(f, tdomain[0], x0, tdomain[1], jac=jac, rtol=rtol*scale,
+                             atol=atol*scale, blocks=(n, S))
+
+    def subset(samples):
+        # parameters of some trajectories of the batch
+        return dict((k, v[samples] if np.ndim(v) > 0 else v) for k, v in (pars or {}).items())
+
+    def slope(states, samples):
+        # dx/dt of the recorded states, (len(index), len(samples))
+        return system.f(states, subset(samples))[index]
+
+    maxT = [[[] for _ in range(S)] for _ in index]
+    maxV = [[[] for _ in range(S)] for _ in index]
+    minV = [[[] for _ in range(S)] for _ in index]
+    total = np.zeros((len(index), S))
+    samples = np.arange(S)
+    g0 = slope(x0.reshape(n, S), samples)
+
+    while solver.status == 'running':
+        t0 = solver.t
+        solver.step()
+        if solver.status == 'failed':
+            raise RuntimeError('integration failed at t=%g' % solver.t)
+        t1 = solver.t
+        if t1 <= window[0]:
+            g0 = slope(solver.y.reshape(n, S), samples)
+            continue
+        dense = solver.dense_output()
+        g1 = slope(solver.y.reshape(n, S), samples)
+
+        # mean over the window: Simpson's rule on the part of the step inside
+        a, b = max(t0, window[0]), min(t1, window[1])
+        if b > a:
+            y = dense(np.array([a, 0.5*(a + b), b])).reshape(n, S, 3)[index]
+            total += (b - a)*(y[...,0] + 4.0*y[...,1] + y[...,2])/6.0
+
+        for k in range(len(index)):
+            for kind in (1, -1):
+                # kind 1: maxima (slope from + to -), -1: minima
+                hit, tau = _roots(
+                    lambda tau, hit: kind*slope(_states(dense, tau, hit, n, S), hit)[k],
+                    kind*g0[k], kind*g1[k], t0, t1, iterations)
+                if len(hit) == 0:
+                    continue
+                value = _states(dense, tau, hit, n, S)[index[k]]
+                for s, tk, v in zip(hit, tau, value):
+                    if window[0] <= tk <= window[1]:
+                        if kind == 1:
+                            maxT[k][s].append(tk)
+                            maxV[k][s].append(v)
+                        else:
+                            minV[k][s].append(v)
+        g0 = g1
+        if t1 >= window[1]:
+            break
+
+    out = {}
+    length = min(window[1], solver.t) - window[0]
+    for k, name in enumerate(names):
+        metrics = dict((m, np.full(S, np.nan)) for m in EVENTS)
+        metrics['mean'] = total[k]/length
+        for s in range(S):
+            times = np.array(maxT[k][s])
+            if len(times) >= 2 and len(minV[k][s]) >= 1:
+                periods = np.diff(times)
+                amplitude = np.mean(maxV[k][s]) - np.mean(minV[k][s])
+                if not amplitude > tolerance*abs(metrics['mean'][s]):
+                    metrics['amplitude'][s] = 0.0
+                    continue
+                metrics['period'][s] = np.mean(periods)
+                metrics['amplitude'][s] = amplitude
+                if len(times) >= 3:
+                    values = maxV[k][s]
+                    metrics['convergence'][s] = max(
+                        abs(periods[-1] - periods[-2])/periods[-1],
+                        abs(values[-1] - values[-2])/amplitude)
+            else:
+                metrics['amplitude'][s] = 0.0
+        out[name] = metrics
+
+    # phase behind the first state, circular mean over the cycles
+    reference = out[names[0]]['period']
+    for k, name in enumerate(names):
+        phase = out[name]['phase']
+        for s in range(S):
+            first = np.array(maxT[0][s])
+            if not np.isfinite(reference[s]) or len(first) == 0:
+                continue
+            lags = [tk - first[first <= tk][-1] for tk in maxT[k][s] if np.any(first <= tk)]
+            if lags:
+                angle = 2.0*np.pi*np.array(lags)/reference[s]
+                phase[s] = np.mod(np.angle(np.mean(np.exp(1j*angle)))/(2.0*np.pi), 1.0)
+    return out
@@ -0,0 +1,206 @@
+# Optimal Control 2: Cellular-Molecular Level
+# Remodeling and metastasis models without PyDSTool
+#
+# Parameters, equations and initial conditions are the DSargs of the
+# scripts 01 and 05. The varspecs strings are parsed with sympy and
+# compiled to numpy functions that take the state as (n, ...) arrays and
+# parameters as scalars or arrays with the trailing shape of the state,
+# so a batch of parameter sets is integrated as one system.
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+import numpy as np
+import scipy.sparse as sps
+import sympy as sp
+from scipy.integrate import BDF, solve_ivp
+
+# parameters of the remodeling model (script 01)
+REMODELING = {
+    'aC' : 3.0e0,
+    'bC' : 3.0e-1,
+    'bCT': 1.3e-1,
+    'aBW': 2.6e-1,
+    'bB' : 1.0e0,
+    'aT' : 1.0e2,
+    'bT' : 499.1,
+    'aW' : 1.0e0,
+    'bW' : 1.0e0,
+}
+
+# parameters of the metastasis model (script 05)
+METASTASIS = dict(REMODELING, **{
+    'KC' : 0.5,
+    'KB' : 0.2,
+    'aCM': 1.5,
+    'aM' : 1.0e-3,
+    'KM' : 1.0,
+    'aMT': 1.0e-1,
+})
+
+VARSPECS = {
+    'remodeling': {
+        'xC': 'aC*xB^(-1.0) - bC*xC - bCT*xC*xT',
+        'xB': 'aBW*xB*xW - bB*xB',
+        'xT': 'aT*xC - bT*xT',
+        'xW': 'aW*xT*xC - bW*xW'},
+    'metastasis': {
+        'xC': '(1.0 - KC*xM/KM)*aC*xB^(-1.0) - bC*xC - bCT*xC*xT + aCM*xM',
+        'xB': 'aBW*xB*xW - bB*xB',
+        'xT': 'aT*xC - bT*xT',
+        'xW': '(1.0 - KB*xM/KM)*aW*xT*xC - bW*xW',
+        'xM': 'xM*(aM + aMT*xT)*(1.0 - xM/KM)'},
+}
+
+ICS = {
+    'remodeling': {'xC': 5.0e0, 'xB': 1.0e0, 'xT': 0.0, 'xW': 0.0},
+    'metastasis': {'xC': 5.0e0, 'xB': 1.0e0, 'xT': 0.0, 'xW': 0.0, 'xM': 1.0e-2},
+}
+
+PARS = {'remodeling': REMODELING, 'metastasis': METASTASIS}
+
+
+def parse(expr):
+    # sympy expression of a varspecs string ('^' is the power)
+    return sp.sympify(expr.replace('^', '**'))
+
+
+class System(object):
+    # ODE system of a varspecs dictionary; pars are the default values
+
+    def __init__(self, varspecs, pars, ics):
+        self.varspecs   = dict(varspecs)
+        self.names      = list(varspecs)
+        self.states     = [sp.Symbol(name) for name in self.names]
+        self.rhs        = [parse(varspecs[name]) for name in self.names]
+        self.pars       = dict(pars)
+        self.parameters = [sp.Symbol(name) for name in sorted(pars)]
+        self._names     = sorted(pars)
+        self.ics        = np.array([ics[name] for name in self.names], dtype=float)
+        args = self.states + self.parameters
+        self._rhs = sp.lambdify(args, self.rhs, 'numpy')
+        jacobian = sp.Matrix(self.rhs).jacobian(self.states)
+        self._jacobian = sp.lambdify(args, jacobian.tolist(), 'numpy')
+        self._parameter_jacobians = {}
+
+    def __reduce__(self):
+        # the compiled functions are not picklable, rebuild them
+        return (System, (self.varspecs, self.pars, dict(zip(self.names, self.ics))))
+
+    @property
+    def n(self):
+        return len(self.states)
+
+    def _args(self, x, pars):
+        values = dict(self.pars, **(pars or {}))
+        return list(x) + [values[name] for name in self._names]
+
+    def f(self, x, pars=None):
+        # right-hand side, shape of x
+        x = np.asarray(x, dtype=float)
+        out = np.empty(x.shape)
+        for i, v in enumerate(self._rhs(*self._args(x, pars))):
+            out[i] = v
+        return out
+
+    def jacobian(self, x, pars=None):
+        # df/dx, shape (n, n) + x.shape[1:]
+        x = np.asarray(x, dtype=float)
+        J = self._jacobian(*self._args(x, pars))
+        return np.array([[np.broadcast_to(v, x.shape[1:]) for v in row] for row in J])
+
+
+    def parameter_jacobian(self, x, names, pars=None):
+        # df/dp for the parameters `names`, shape (n, len(names)) + x.shape[1:]
+        names = tuple(names)
+        if names not in self._parameter_jacobians:
+            jacobian = sp.Matrix(self.rhs).jacobian([sp.Symbol(name) for name in names])
+            self._parameter_jacobians[names] = sp.lambdify(
+                self.states + self.parameters, jacobian.tolist(), 'numpy')
+        x = np.asarray(x, dtype=float)
+        J = self._parameter_jacobians[names](*self._args(x, pars))
+        return np.array([[np.broadcast_to(v, x.shape[1:]) for v in row] for row in J])
+
+
+def system(name):
+    # System of the 'remodeling' or 'metastasis' model
+    return System(VARSPECS[name], PARS[name], ICS[name])
+
+
+def _batch(pars):
+    # number of parameter sets of a dictionary of scalars and 1-d arrays
+    sizes = set(np.size(v) for v in (pars or {}).values() if np.ndim(v) > 0)
+    if len(sizes) > 1:
+        raise ValueError('parameter arrays of different sizes: %s' % sorted(sizes))
+    return sizes.pop() if sizes else 1
+
+
+def problem(system, pars, S):
+    # right-hand side and sparse block-diagonal Jacobian of a batch of S
+    # parameter sets as one system of n*S components (state-major)
+    n = system.n
+    rows = np.arange(n*S).reshape(n, S)
+    i = np.broadcast_to(rows[:,None,:], (n, n, S)).ravel()
+    j = np.broadcast_to(rows[None,:,:], (n, n, S)).ravel()
+
+    def f(_, y):
+        return system.f(y.reshape(n, S), pars).ravel()
+
+    def jac(_, y):
+        J = system.jacobian(y.reshape(n, S), pars)
+        return sps.csc_matrix((J.ravel(), (i, j)), shape=(n*S, n*S))
+
+    return f, jac
+
+
+class BlockBDF(BDF):
+    # BDF for a batch of S independent systems of n states (the layout of
+    # problem()): the Newton matrices I - c*J are block diagonal, so they
+    # are inverted as S (n, n) blocks at once and solved by a batched
+    # product instead of a sparse LU of the whole batch
+
+    def __init__(self, fun, t0, y0, t_bound, blocks=None, **options):
+        super(BlockBDF, self).__init__(fun, t0, y0, t_bound, **options)
+        n, S = blocks
+
+        def lu(A):
+            self.nlu += 1
+            A = sps.coo_matrix(A)
+            M = np.zeros((S, n, n))
+            M[A.row % S, A.row//S, A.col//S] = A.data
+            return np.linalg.inv(M)
+
+        def solve_lu(inverse, b):
+            return np.einsum('sij,js->is', inverse, b.reshape(n, S)).ravel()
+
+        self.lu = lu
+        self.solve_lu = solve_lu
+
+
+def integrate(system, pars=None, tdomain=(0.0, 200.0), ics=None, dt=0.1,
+              rtol=1.e-6, atol=1.e-9, method='BDF'):
+    # Trajectories of a batch of parameter sets (pars values of shape (S,)
+    # or scalars) sampled every dt, as traj.sample(dt=dt); returns t and
+    # the states (n, S, len(t)). The batch is one stiff system for BDF with
+    # the block-diagonal Jacobian (BlockBDF); the tolerances are scaled by 1/sqrt(S)
+    # since the error norm of solve_ivp is the RMS over all components.
+    # Other methods of solve_ivp (e.g. 'RK45' for non-stiff reduced
+    # systems) are called without the Jacobian.
+    S = _batch(pars)
+    n = system.n
+    x0 = system.ics if ics is None else np.asarray(ics, dtype=float)
+    x0 = np.broadcast_to(x0.reshape(n, -1), (n, S)).ravel()
+    t = np.arange(tdomain[0], tdomain[1] + 0.5*dt, dt)
+    f, jac = problem(system, pars, S)
+
+    scale = 1.0/np.sqrt(S)
+    if method == 'BDF':
+        sol = solve_ivp(f, (t[0], t[-1]), x0, method=BlockBDF, jac=jac, t_eval=t,
+                        rtol=rtol*scale, atol=atol*scale, blocks=(n, S))
+    else:
+        sol = solve_ivp(f, (t[0], t[-1]), x0, method=method, t_eval=t,
+                        rtol=rtol*scale, atol=atol*scale)
+    if sol.status != 0:
+        raise RuntimeError(sol.message)
+    return sol.t, sol.y.reshape(n, S, -1)
@@ -0,0 +1,148 @@
+# Optimal Control 2: Cellular-Molecular Level
+# Named parameter sets with their sources
+#
+# The DSargs.pars of the scripts 01-10 are the defaults of models.PARS;
+# the literature values left as comments next to them (farhat, komarova,
+# ross, pivonka2008 and the estimates) are kept here with their source.
+# A set is a model and a list of preferred sources: every parameter takes
+# the value of the first source that gives one, the default otherwise.
+#
+# The equations of a model do not depend on the set, so its compiled
+# System (system()) is built once per model and shared by all its sets:
+# switching sets only passes other pars, models.integrate(system(name),
+# values(name)). generator() builds a new PyDSTool generator per call, a
+# shared one would keep the tdomain of its first caller.
+#
+# Used by the Python 3 scripts 01, 02, 05, 06, 09 and 10; the bifurcation
+# scripts 03, 04, 07 and 08 are Python 2 (PyCont) and keep their own pars.
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+from . import models
+
+# source of the default values (models.PARS)
+SOURCES = {
+    'aC' : 'komarova',
+    'bC' : 'farhat',
+    'bCT': 'ross',
+    'aBW': 'farhat',
+    'bB' : 'estimate',
+    'aT' : 'estimate',
+    'bT' : 'farhat',
+    'aW' : 'estimate',
+    'bW' : 'estimate',
+    'KC' : 'estimate',
+    'KB' : 'estimate',
+    'aCM': 'estimate',
+    'aM' : 'estimate',
+    'KM' : 'estimate',
+    'aMT': 'estimate',
+}
+
+# other values of the scripts, (value, source); notes of the scripts:
+# farhat aC (check: OBs), bCT (check: mass action), aBW (check: Wnt),
+# aM (check: logistic); bW = 2 also in buenzli; bB up -> frequency up;
+# bT up -> OBs up
+ALTERNATIVES = {
+    'aC' : [(3.2e-1, 'farhat'), (1.0e-2, 'estimate'), (2.0e-1, 'estimate')],
+    'bC' : [(2.0e-1, 'komarova'), (5.0e-1, 'estimate'), (1.0e0, 'estimate')],
+    'bCT': [(1.2, 'farhat'), (1.0e-3, 'estimate'), (5.0e-2, 'estimate')],
+    'aBW': [(1.0e-2, 'estimate'), (2.0e0, 'estimate'), (1.0e0, 'estimate')],
+    'bB' : [(3.0e-1, 'farhat'), (1.0e-2, 'estimate'), (1.0e-1, 'estimate'), (7.0e-1, 'estimate')],
+    'aT' : [(1.0e0, 'pivonka2008'), (1.0e1, 'estimate')],
+    'bT' : [(2.0e2, 'estimate'), (1.0e1, 'estimate')],
+    'aW' : [(5.0e-1, 'estimate'), (1.0e2, 'estimate')],
+    'bW' : [(2.0e0, 'farhat'), (5.0e0, 'estimate'), (1.0e1, 'estimate')],
+    'aM' : [(2.3e-3, 'farhat')],
+}
+
+# name: (model, preferred sources)
+SETS = {
+    'remodeling'         : ('remodeling', ()),
+    'metastasis'         : ('metastasis', ()),
+    'farhat'             : ('remodeling', ('farhat',)),
+    'komarova'           : ('remodeling', ('komarova',)),
+    'pivonka2008'        : ('remodeling', ('pivonka2008',)),
+    'metastasis-farhat'  : ('metastasis', ('farhat',)),
+}
+
+_FIXED = {}
+_SYSTEMS = {}
+
+
+def register(name, model, sources=(), **values):
+    # new set of the model; values are fixed parameters, tagged 'user'
+    if model not in models.PARS:
+        raise KeyError('unknown model %r' % model)
+    unknown = set(values) - set(models.PARS[model])
+    if unknown:
+        raise KeyError('parameters %s not in the %s model' % (sorted(unknown), model))
+    SETS[name] = (model, tuple(sources))
+    _FIXED[name] = dict((par, float(value)) for par, value in values.items())
+
+
+def model(name):
+    # model of the set
+    if name not in SETS:
+        raise KeyError('unknown parameter set %r, one of %s' % (name, sorted(SETS)))
+    return SETS[name][0]
+
+
+def table(name):
+    # {parameter: (value, source)} of the set
+    key, sources = model(name), SETS[name][1]
+    fixed = _FIXED.get(name, {})
+    out = {}
+    for par, default in models.PARS[key].items():
+        out[par] = (default, SOURCES[par])
+        for source in sources:
+            if SOURCES[par] == source:
+                break
+            found = [value for value, s in ALTERNATIVES.get(par, []) if s == source]
+            if found:
+                out[par] = (found[0], source)
+                break
+        if par in fixed:
+            out[par] = (fixed[par], 'user')
+    return out
+
+
+def values(name):
+    # {parameter: value} of the set, the DSargs.pars of the scripts
+    return dict((par, value) for par, (value, _) in table(name).items())
+
+
+def provenance(name):
+    # {parameter: source} of the set
+    return dict((par, source) for par, (_, source) in table(name).items())
+
+
+def differences(name, reference=None):
+    # {parameter: (reference value, value)} where the set departs from
+    # reference (by default the defaults of its model)
+    reference = reference or model(name)
+    a, b = values(reference), values(name)
+    return dict((par, (a.get(par), b[par])) for par in b if a.get(par) != b[par])
+
+
+def system(name):
+    # compiled models.System of the model of the set, built once per
+    # model; its pars are the model defaults, pass values(name) to it
+    key = model(name)
+    if key not in _SYSTEMS:
+        _SYSTEMS[key] = models.system(key)
+    return _SYSTEMS[key]
+
+
+def generator(name, tdomain=(0, 200)):
+    # new PyDSTool generator of the set on tdomain
+    import PyDSTool
+    key = model(name)
+    DSargs = PyDSTool.args(name='ode')
+    DSargs.pars = values(name)
+    DSargs.varspecs = models.VARSPECS[key]
+    DSargs.ics = models.ICS[key]
+    DSargs.tdomain = list(tdomain)
+    return PyDSTool.Generator.Vode_ODEsystem(DSargs)
@@ -0,0 +1,116 @@
+# Optimal Control 2: Cellular-Molecular Level
+# Quasi-steady-state reduction of the fast molecular variables
+#
+# TGF-beta decays with bT = 499.1, hundreds of times faster than the
+# cells, so xT follows its quasi-steady state xT = aT*xC/bT after an
+# initial layer of a few 1/bT days, and its equation only makes the
+# system stiff. reduce() solves f_fast = 0 for the fast states (sympy)
+# and substitutes them into the other equations: the reduced System has
+# slow time scales only and can be integrated with an explicit method at
+# large steps (models.integrate(..., method='RK45')).
+#
+# separation() is the ratio of the slowest decay rate of the fast states
+# to the fastest rate of the reduced system along a trajectory: the
+# reduction is valid when it is large (xT: hundreds; xW, with bW = 1, is
+# not fast). error() integrates the full and the reduced models on the
+# same grid and returns the error of every state relative to its range,
+# the fast states rebuilt from their quasi-steady states and compared
+# after the initial layer.
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+import numpy as np
+import sympy as sp
+
+from . import models
+
+
+class Reduced(models.System):
+    # System of the slow states; quasi is {fast state: expression in the
+    # slow states and the parameters}, names are the states of the full
+    # system in their order
+
+    def __init__(self, varspecs, pars, ics, quasi, names):
+        super(Reduced, self).__init__(varspecs, pars, ics)
+        self.quasi = dict(quasi)
+        self.full_names = list(names)
+        self._quasi = sp.lambdify(self.states + self.parameters,
+                                  [models.parse(quasi[name]) for name in self.quasi], 'numpy')
+
+    def __reduce__(self):
+        return (Reduced, (self.varspecs, self.pars, dict(zip(self.names, self.ics)),
+                          self.quasi, self.full_names))
+
+    def full(self, x, pars=None):
+        # states of the full system (in full_names order) from the slow
+        # states x (n, ...), the fast ones at their quasi-steady states;
+        # parameters with the trailing shape of x
+        x = np.asarray(x, dtype=float)
+        values = dict(zip(self.names, x))
+        for name, v in zip(self.quasi, self._quasi(*self._args(x, pars))):
+            values[name] = np.broadcast_to(v, x.shape[1:])
+        return np.array([values[name] for name in self.full_names])
+
+
+def reduce(system, fast=('xT',)):
+    # Reduced system with the states `fast` at their quasi-steady states
+    fast = list(fast)
+    symbols = [sp.Symbol(name) for name in fast]
+    equations = [system.rhs[system.names.index(name)] for name in fast]
+    solutions = sp.solve(equations, symbols, dict=True)
+    if len(solutions) != 1:
+        raise ValueError('%d quasi-steady states for %s, expected one' % (len(solutions), fast))
+    solution = solutions[0]
+    slow = [name for name in system.names if name not in fast]
+    varspecs = dict((name, str(sp.simplify(system.rhs[system.names.index(name)].subs(solution))))
+                    for name in slow)
+    quasi = dict((name, str(solution[symbol])) for name, symbol in zip(fast, symbols))
+    ics = dict((name, system.ics[system.names.index(name)]) for name in slow)
+    return Reduced(varspecs, system.pars, ics, quasi, system.names)
+
+
+def _expand(pars, X):
+    # parameters of shape (S,) broadcast against states X (n, S, ...)
+    return dict((k, np.reshape(v, np.shape(v) + (1,)*(np.ndim(X) - 2)) if np.ndim(v) > 0 else v)
+                for k, v in (pars or {}).items())
+
+
+def _rates(system, reduced, X, pars):
+    # slowest decay rate of the fast states (eigenvalues of their block of
+    # the full Jacobian) and fastest rate of the reduced system, at the
+    # full states X (n, S, ...)
+    fast = [system.names.index(name) for name in reduced.quasi]
+    slow = [system.names.index(name) for name in reduced.names]
+    pars = _expand(pars, X)
+    J = np.moveaxis(system.jacobian(X, pars), (0, 1), (-2, -1))[..., fast, :][..., fast]
+    Jr = np.moveaxis(reduced.jacobian(X[slow], pars), (0, 1), (-2, -1))
+    return -np.linalg.eigvals(J).real.max(axis=-1), np.abs(np.linalg.eigvals(Jr)).max(axis=-1)
+
+
+def separation(system, reduced, X, pars=None):
+    # time-scale separation at the full states X (n, S, ...), see above
+    fast, slow = _rates(system, reduced, X, pars)
+    return fast/slow
+
+
+def error(system, reduced, pars=None, tdomain=(0.0, 200.0), dt=0.1, method='RK45',
+          layer=10.0, **options):
+    # error of the reduced model integrated with `method`: max over time
+    # of |x_reduced - x_full| relative to the range of x_full, {state:
+    # (S,)}, the fast states after `layer` times their time scale at t0;
+    # also returns t, the full states and the rebuilt reduced ones
+    t, X = models.integrate(system, pars, tdomain, dt=dt, **options)
+    _, Y = models.integrate(reduced, pars, tdomain, dt=dt, method=method, **options)
+    Y = reduced.full(Y, _expand(pars, Y))
+    rate, _ = _rates(system, reduced, X[..., 0], pars)
+    out = {}
+    for i, name in enumerate(system.names):
+        keep = np.ones((X.shape[1], len(t)), dtype=bool)
+        if name in reduced.quasi:
+            keep = t >= t[0] + layer/np.reshape(rate, (-1, 1))
+        diff = np.where(keep, np.abs(Y[i] - X[i]), 0.0).max(axis=-1)
+        span = X[i].max(axis=-1) - X[i].min(axis=-1)
+        out[name] = diff/np.where(span > 0, span, 1.0)
+    return out, (t, X, Y)
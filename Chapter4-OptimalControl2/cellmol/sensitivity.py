@@ -0,0 +1,183 @@
+# Optimal Control 2: Cellular-Molecular Level
+# Global sensitivity analysis of the oscillation metrics
+#
+# Instead of three values of one parameter at a time (script 02), all the
+# parameters are varied over RANGES at once (log-uniform) and the effect
+# on the period, amplitude and mean of every state is measured by
+#
+#   sobol    first order and total Sobol indices, Saltelli design of
+#            N*(d+2) runs (quasi-random Sobol points), Saltelli 2010 and
+#            Jansen estimators, bootstrap confidence intervals
+#   morris   elementary effects over r trajectories of d+1 runs,
+#            mu* (importance) and sigma (interactions, nonlinearity)
+#
+# Runs are integrated in batches (models.integrate) and the batches are
+# distributed over a process pool.
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+import multiprocessing
+
+import numpy as np
+from scipy.stats import qmc
+
+from . import models, metrics
+
+# parameter ranges: the values tried in script 02 (bT from its comments)
+RANGES = {
+    'aC' : (1.0, 3.0),
+    'bC' : (0.3, 1.0),
+    'bCT': (0.07, 0.14),
+    'aBW': (0.1, 0.5),
+    'bB' : (0.1, 1.0),
+    'aT' : (10.0, 100.0),
+    'bT' : (200.0, 499.1),
+    'aW' : (0.1, 2.0),
+    'bW' : (1.0, 5.0),
+}
+
+
+def scale(U, ranges, names):
+    # points of the unit cube to parameter values, log-uniform in ranges
+    lo = np.log([ranges[name][0] for name in names])
+    hi = np.log([ranges[name][1] for name in names])
+    return np.exp(lo + U*(hi - lo))
+
+
+def saltelli(N, d, seed=None):
+    # Saltelli design in the unit cube: rows [A; B; AB_1; ...; AB_d], AB_i
+    # is A with column i from B; N*(d+2) rows
+    AB = qmc.Sobol(2*d, scramble=True, seed=seed).random(N)
+    A, B = AB[:,:d], AB[:,d:]
+    blocks = [A, B]
+    for i in range(d):
+        C = A.copy()
+        C[:,i] = B[:,i]
+        blocks.append(C)
+    return np.vstack(blocks)
+
+
+def sobol(Y, d, resamples=100, minimum=32, seed=None):
+    # first order and total indices from the outputs Y of a saltelli
+    # design, (S1, ST, S1 confidence, ST confidence); groups with a nan
+    # output (e.g. the period of a run at a steady state) are dropped and
+    # with fewer than `minimum` groups left the indices are nan
+    Y = np.asarray(Y, dtype=float).reshape(d+2, -1)
+    Y = Y[:,np.all(np.isfinite(Y), axis=0)]
+    fA, fB, fAB = Y[0], Y[1], Y[2:]
+
+    def indices(k):
+        V = np.var(np.concatenate([fA[k], fB[k]]))
+        if V == 0:
+            return np.zeros(d), np.zeros(d)
+        S1 = np.mean(fB[k]*(fAB[:,k] - fA[k]), axis=1)/V
+        ST = 0.5*np.mean((fA[k] - fAB[:,k])**2, axis=1)/V
+        return S1, ST
+
+    N = len(fA)
+    if N < max(minimum, 1):
+        nan = np.full(d, np.nan)
+        return nan, nan, nan, nan
+    S1, ST = indices(np.arange(N))
+    rng = np.random.RandomState(seed)
+    boot = [indices(rng.randint(N, size=N)) for _ in range(resamples)]
+    z = 1.96
+    return (S1, ST, z*np.std([b[0] for b in boot], axis=0),
+            z*np.std([b[1] for b in boot], axis=0))
+
+
+def morris(r, d, levels=4, seed=None):
+    # r Morris trajectories in the unit cube, (r*(d+1), d): each starts
+    # on the grid of `levels` values and moves one coordinate at a time by
+    # delta = levels/(2*(levels-1))
+    rng = np.random.RandomState(seed)
+    delta = levels/(2.0*(levels - 1))
+    start = np.arange(levels//2)/(levels - 1.0)
+    design = []
+    for _ in range(r):
+        x = rng.choice(start, size=d)
+        signs = rng.choice([-1.0, 1.0], size=d)
+        x = np.where(signs < 0, x + delta, x)
+        points = [x.copy()]
+        for i in rng.permutation(d):
+            x[i] += signs[i]*delta
+            points.append(x.copy())
+        design.append(points)
+    return np.array(design).reshape(-1, d)
+
+
+def elementary(Y, design, d):
+    # mu* and sigma of the elementary effects of the morris design, nan
+    # effects (from nan outputs) are dropped
+    Y = np.asarray(Y, dtype=float).reshape(-1, d+1)
+    X = design.reshape(-1, d+1, d)
+    step = np.diff(X, axis=1)
+    i = np.argmax(np.abs(step), axis=2)
+    dx = np.take_along_axis(step, i[...,None], axis=2)[...,0]
+    E = np.full((len(Y), d), np.nan)
+    np.put_along_axis(E, i, np.diff(Y, axis=1)/dx, axis=1)
+    mu = np.array([np.mean(np.abs(e[np.isfinite(e)])) if np.isfinite(e).any() else np.nan
+                   for e in E.T])
+    sigma = np.array([np.std(e[np.isfinite(e)]) if np.isfinite(e).any() else np.nan
+                      for e in E.T])
+    return mu, sigma
+
+
+def _init(system, options):
+    # worker initializer: the system is sent once per process
+    global _system, _options
+    _system = system
+    _options = options
+
+
+def _evaluate(task):
+    # metrics of one batch of parameter sets; a failed batch is retried
+    # one run at a time and failed runs give nan
+    pars = task
+    options = dict(_options)
+    window = options.pop('window')
+    names = options.pop('outputs')
+    index = [_system.names.index(name) for name in names]
+    try:
+        t, X = models.integrate(_system, pars, **options)
+    except RuntimeError:
+        S = models._batch(pars)
+        if S == 1:
+            return dict((name, dict((m, np.full(1, np.nan)) for m in metrics.METRICS))
+                        for name in names)
+        parts = [_evaluate(dict((k, v[s:s+1]) for k, v in pars.items())) for s in range(S)]
+        return dict((name, dict((m, np.concatenate([p[name][m] for p in parts]))
+                                for m in metrics.METRICS)) for name in names)
+    return metrics.oscillation(t, X[index], window, names)
+
+
+def evaluate(system, names, values, outputs=('xC', 'xB'), tdomain=(0.0, 200.0),
+             window=(100.0, 200.0), chunk=128, processes=None, verbose=True, **options):
+    # metrics[output][metric] of the runs with parameters `names` set to
+    # the rows of values, in batches of `chunk` runs
+    values = np.atleast_2d(values)
+    processes = processes or multiprocessing.cpu_count()
+    options = dict(options, tdomain=tdomain, window=window, outputs=list(outputs))
+    tasks = [dict((name, values[i0:i0+chunk, k]) for k, name in enumerate(names))
+             for i0 in range(0, len(values), chunk)]
+
+    if processes > 1:
+        pool = multiprocessing.Pool(processes, _init, (system, options))
+        results = []
+        for k, result in enumerate(pool.imap(_evaluate, tasks)):
+            results.append(result)
+            if verbose:
+                print("Batch %d of %d" % (k + 1, len(tasks)))
+        pool.close()
+        pool.join()
+    else:
+        _init(system, options)
+        results = []
+        for k, task in enumerate(tasks):
+            results.append(_evaluate(task))
+            if verbose:
+                print("Batch %d of %d" % (k + 1, len(tasks)))
+    return dict((name, dict((m, np.concatenate([r[name][m] for r in results]))
+                            for m in metrics.METRICS)) for name in outputs)
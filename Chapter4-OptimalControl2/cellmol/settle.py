@@ -0,0 +1,153 @@
+# Optimal Control 2: Cellular-Molecular Level
+# Integration until the equilibrium or the limit cycle is reached
+#
+# Instead of a fixed tdomain, every trajectory of a batch is integrated
+# until its asymptotic regime is detected:
+#
+#   equilibrium  the residual max_i |f_i(x)|/(|x_i| + 1) is below
+#                `residual` at the end of `steps` consecutive BDF steps
+#   cycle        the returns to the Poincare section (the maxima of
+#                `section`, located as in metrics.events) repeat: the
+#                change of the state between consecutive returns,
+#                relative to the range of every state over the cycle, and
+#                the relative change of the return time are below
+#                `tolerance` for `cycles` returns in a row (a spiral to an
+#                equilibrium keeps a change of the order of its range)
+#
+# or until tdomain[1] (regime 'unsettled'). Settled trajectories are
+# taken out of the batch: when they are at least `shrink` of it, the
+# solver restarts with the others, so a sweep only integrates what has
+# not settled yet.
+#
+# Ariel Camacho
+# Doctorate Thesis
+# Guanajuato, Mexico, 2019
+
+import numpy as np
+
+from . import models, metrics
+
+REGIMES = ('unsettled', 'equilibrium', 'cycle')
+
+
+def _subset(pars, samples):
+    # parameters of some trajectories of the batch
+    return dict((k, v[samples] if np.ndim(v) > 0 else v) for k, v in (pars or {}).items())
+
+
+def settle(system, pars=None, tdomain=(0.0, 2000.0), ics=None, section='xC',
+           residual=1.e-8, steps=3, tolerance=1.e-5, cycles=2, shrink=0.25,
+           rtol=1.e-8, atol=1.e-10, iterations=50):
+    # asymptotic regime of a batch of parameter sets (as in
+    # models.integrate); returns a dictionary of arrays of shape (S,):
+    #   regime     index in REGIMES
+    #   time       time at which the regime was detected
+    #   period     return time of the cycle (nan otherwise)
+    #   amplitude  max - min of `section` over the last cycle (0 at an
+    #              equilibrium, nan if unsettled)
+    # and 'state' (n, S): the equilibrium, the state at the last return to
+    # the section, or the state at tdomain[1]
+    S = models._batch(pars)
+    n = system.n
+    k = system.names.index(section)
+    x0 = system.ics if ics is None else np.asarray(ics, dtype=float)
+    x0 = np.array(np.broadcast_to(x0.reshape(n, -1), (n, S)))
+    pars = dict((name, np.asarray(v, dtype=float)) for name, v in (pars or {}).items())
+
+    out = {'regime': np.zeros(S, dtype=int), 'time': np.full(S, float(tdomain[1])),
+           'period': np.full(S, np.nan), 'amplitude': np.full(S, np.nan),
+           'state': np.full((n, S), np.nan)}
+    returnT = np.full(S, np.nan)              # time and state of the last return
+    returnX = np.full((n, S), np.nan)
+    lowest = np.full(S, np.inf)               # minimum of the section and
+    high = np.full((n, S), -np.inf)           # range of the states since it
+    low = np.full((n, S), np.inf)
+    repeats = np.zeros(S, dtype=int)          # consecutive matching returns
+    still = np.zeros(S, dtype=int)            # consecutive steps at rest
+
+    active = np.arange(S)
+    t, x = float(tdomain[0]), x0
+    while len(active) and t < tdomain[1]:
+        p = _subset(pars, active)
+        A = len(active)
+        f, jac = models.problem(system, p, A)
+        scale = 1.0/np.sqrt(A)
+        solver = models.BlockBDF(f, t, x.ravel(), tdomain[1], jac=jac, rtol=rtol*scale,
+                                 atol=atol*scale, blocks=(n, A))
+        settled = np.zeros(A, dtype=bool)
+        g0 = system.f(x, p)[k]
+
+        while solver.status == 'running':
+            t0 = solver.t
+            solver.step()
+            if solver.status == 'failed':
+                raise RuntimeError('integration failed at t=%g' % solver.t)
+            t1 = solver.t
+            y = solver.y.reshape(n, A)
+            F = system.f(y, p)
+            g1 = F[k]
+            dense = solver.dense_output()
+
+            # equilibria
+            rest = np.max(np.abs(F)/(np.abs(y) + 1.0), axis=0) < residual
+            still[active] = np.where(rest, still[active] + 1, 0)
+            found = ~settled & (still[active] >= steps)
+            for i in np.flatnonzero(found):
+                s = active[i]
+                out['regime'][s] = 1
+                out['time'][s] = t1
+                out['amplitude'][s] = 0.0
+                out['state'][:,s] = y[:,i]
+            settled |= found
+
+            # ranges since the last return
+            high[:,active] = np.maximum(high[:,active], y)
+            low[:,active] = np.minimum(low[:,active], y)
+
+            # minima of the section since the last return
+            hit, tau = metrics._roots(
+                lambda tau, hit: -system.f(metrics._states(dense, tau, hit, n, A), _subset(p, hit))[k],
+                -g0, -g1, t0, t1, iterations)
+            if len(hit):
+                value = metrics._states(dense, tau, hit, n, A)[k]
+                lowest[active[hit]] = np.minimum(lowest[active[hit]], value)
+
+            # returns to the section (maxima)
+            hit, tau = metrics._roots(
+                lambda tau, hit: system.f(metrics._states(dense, tau, hit, n, A), _subset(p, hit))[k],
+                g0, g1, t0, t1, iterations)
+            for i, tk, xk in zip(hit, tau, metrics._states(dense, tau, hit, n, A).T):
+                s = active[i]
+                if settled[i]:
+                    continue
+                period = tk - returnT[s]
+                if np.isfinite(period):
+                    spread = np.maximum(high[:,s], xk) - np.minimum(low[:,s], xk)
+                    change = max(np.max(np.abs(xk - returnX[:,s])/(spread + atol)),
+                                 abs(period - out['period'][s])/period
+                                 if np.isfinite(out['period'][s]) else np.inf)
+                    repeats[s] = repeats[s] + 1 if change < tolerance else 0
+                    out['period'][s] = period
+                    out['amplitude'][s] = xk[k] - lowest[s]
+                returnT[s], returnX[:,s], lowest[s] = tk, xk, np.inf
+                high[:,s], low[:,s] = xk, xk
+                if repeats[s] >= cycles:
+                    out['regime'][s] = 2
+                    out['time'][s] = tk
+                    out['state'][:,s] = xk
+                    settled[i] = True
+
+            g0 = g1
+            if settled.sum() >= max(1, shrink*A) or settled.all():
+                break
+
+        t, y = solver.t, solver.y.reshape(n, A)
+        if solver.status == 'finished':
+            out['state'][:,active[~settled]] = y[:,~settled]
+            break
+        active, x = active[~settled], y[:,~settled]
+
+    unsettled = out['regime'] == 0
+    out['period'][unsettled | (out['regime'] == 1)] = np.nan
+    out['amplitude'][unsettled] = np.nan
+    return out